@@ -0,0 +1,195 @@
+"""
+Бенчмарк модерации: стоимость проверки одного сообщения до и после ModerationEngine.
+
+Запуск из корня репозитория: python benchmarks/bench_moderation.py [--messages N] [--repeat R]
+
+legacy_is_suspicious — копия прежней реализации из bot.py (регулярное выражение
+и список ключевых слов строились заново при каждом вызове). Вердикты
+расходятся намеренно там, где нормализация текста ловит обходы или убирает
+ложные срабатывания коротких слов; первые расхождения печатаются.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moderation import ModerationEngine
+
+def legacy_is_suspicious(message: str) -> bool:
+    russian_numbers_regex = re.compile(
+        r'\b(нол[ьяюеи]|один|одног[оа]|одним?|дв[ауе]|двух|двумя?|тр[иеяю]|трех|тремя?|'
+        r'четыр[еиьяю]|пят[иьяю]|шест[иьяю]|сем[иьяю]|восьм[иьяю]|девят[иьяю]|'
+        r'десят[иьяю]|сорок|сто|двести|триста|четыреста|пятьсот|'
+        r'тысяч[иауе]?|миллион[ауе]?)\b',
+        re.IGNORECASE
+    )
+    
+    has_russian_numbers = bool(russian_numbers_regex.search(message))
+
+    digit_count = sum(c.isdigit() for c in message)
+    has_too_many_digits = digit_count > 5
+
+    forbidden_emojis = [
+        "0️⃣", "1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", 
+        "🔟"
+        ]
+    has_forbidden_emojis = any(emoji in message for emoji in forbidden_emojis)
+    # 1) Проверка на наличие английских букв
+    has_english_letters = bool(re.search(r'[a-zA-Z]', message))
+    
+    # 2) Проверка на наличие более 3 цифр подряд
+    has_long_digit_sequence = bool(re.search(r'\d{4,}', message))
+    
+    # 3) Проверка на наличие подозрительных символов
+    suspicious_symbols = ["@", "*", "_", "#", "$"]
+    has_suspicious_symbols = any(char in message for char in suspicious_symbols)
+    
+    # 4) Проверка на вложения (ссылки, изображения, файлы)
+    has_attachments = bool(re.search(r'http[s]?://|www\.', message, re.IGNORECASE))
+    
+    # 5) Проверка на ключевые слова (соцсети и мессенджеры)
+    suspicious_keywords = [
+    # Полные названия (разные регистры)
+    "тг", "ТГ", "TГ", "Tг", "тГ",
+    "вк", "ВК", "VK", "vk", "Vк", "vК",
+    "вайбер", "Вайбер", "Viber", "viber", "VIBER",
+    "ватсап", "Ватсап", "WhatsApp", "whatsapp", "WHATSAPP", "ватс ап", "ватс-ап",
+    "телеграм", "Телеграм", "Telegram", "telegram", "TELEGRAM", "тлг", "ТЛГ", "TLG",
+    "инстаграм", "Инстаграм", "Instagram", "instagram", "INSTAGRAM", "инста", "Инста", "insta", "Insta",
+    "viber", "Viber", "VIBER",
+    "whatsapp", "WhatsApp", "WHATSAPP",
+    "telegram", "Telegram", "TELEGRAM",
+    "instagram", "Instagram", "INSTAGRAM",
+    "vk", "VK", "vK", "Vk",
+    "tg", "TG", "tG", "Tg", "лс", "директ", "ссылка"
+    
+    # Альтернативные названия и сленг
+    "тeлeграм", "т3л3грам", "тележка", "телега", "тлг", "тлгрм", "тг-канал", "тг канал",
+    "инст", "инстик", "инсту", "инстик", "инстаграмм", "инстаграмчик",
+    "вацап", "вотсап", "вотс ап", "вац ап", "watsapp", "watsap", "watsup",
+    "вайберчик", "вайберуха", "вайб", "вайбера",
+    "вконтакте", "в контакте", "вкнтакте", "вкнт", "вк-страница", "вк страница",
+    
+    # Попытки обхода (с пробелами, точками, спецсимволами)
+    "т г", "в к", "v k", "t g",
+    "т.г", "в.к", "v.k", "t.g",
+    "т_г", "в_к", "v_k", "t_g",
+    "т-г", "в-к", "v-k", "t-g",
+    "тг.", "вк.", "vk.", "tg.",
+    
+    # Другие соцсети и мессенджеры
+    "facebook", "Facebook", "FACEBOOK", "фейсбук", "Фейсбук", "фб", "ФБ", "fb", "FB",
+    "twitter", "Twitter", "TWITTER", "твиттер", "Твиттер", "твт", "ТВТ", "twt", "TWT",
+    "tiktok", "TikTok", "TIKTOK", "тикток", "ТикТок", "тик-ток", "tt", "TT",
+    "linkedin", "LinkedIn", "LINKEDIN", "линкедин", "Линкедин", "линк", "Линк",
+    "discord", "Discord", "DISCORD", "дискорд", "Дискорд", "дис", "Дис", "dc", "DC",
+    "signal", "Signal", "SIGNAL", "сигнал", "Сигнал", "sg", "SG",
+    "snapchat", "Snapchat", "SNAPCHAT", "снэпчат", "Снэпчат", "снап", "Снап", "sc", "SC",
+    "reddit", "Reddit", "REDDIT", "реддит", "Реддит", "рдт", "РДТ", "rdt", "RDT",
+    "twitch", "Twitch", "TWITCH", "твич", "Твич", "твч", "ТВЧ", "tvch", "TVCH",
+    "youtube", "YouTube", "YOUTUBE", "ютуб", "Ютуб", "ют", "ЮТ", "yt", "YT",
+    "pinterest", "Pinterest", "PINTEREST", "пинтерест", "Пинтерест", "пин", "Пин", "pt", "PT",
+    "onlyfans", "OnlyFans", "ONLYFANS", "онлифанс", "Онлифанс", "оф", "ОФ", "of", "OF",
+    "tinder", "Tinder", "TINDER", "тиндер", "Тиндер", "тинд", "Тинд", "tdr", "TDR",
+    "zoom", "Zoom", "ZOOM", "зум", "Зум", "зм", "ЗМ", "zm", "ZM",
+    "slack", "Slack", "SLACK", "слак", "Слак", "слк", "СЛК", "slk", "SLK",
+    "skype", "Skype", "SKYPE", "скайп", "Скайп", "ск", "СК", "sk", "SK",
+    
+    # Кибер-сленг и эмодзи
+    "дотуп", "дотупь", "дотyп", "дотyпь", "пиши в", "напиши в", "добавь в", "кинь ссылку",
+    "✉️", "📱", "📲", "🔗", "📧", "💬", "📨", "📩", "👾", "🤖", "🖇️", "📎", "📌", "📍", "📞", "📟", "📠", "🔌", "📡",
+    "пиши в лс", "напиши в лс", "добавь в лс", "кинь ссылку в лс", "контакты в лс", "контакт в лс",
+    ]
+    has_suspicious_keywords = any(keyword.lower() in message.lower() for keyword in suspicious_keywords)
+    
+    # Сообщение считается подозрительным, если выполняется хотя бы одно из условий
+    return (
+        has_russian_numbers or
+        has_too_many_digits or
+        has_english_letters or
+        has_long_digit_sequence or
+        has_suspicious_symbols or
+        has_attachments or
+        has_suspicious_keywords or
+        has_forbidden_emojis
+    )
+
+
+SAMPLES = [
+    "Здравствуйте! Когда будет готов макет?",
+    "Спасибо, всё отлично, правки внесу сегодня вечером",
+    "Пришлите, пожалуйста, исходники в формате PSD",
+    "Можно сделать логотип чуть темнее и увеличить шрифт заголовка?",
+    "Напишите мне в телеграм, так будет удобнее",
+    "мой номер восемь девятьсот пять",
+    "Давайте созвонимся в зуме завтра",
+    "Вот ссылка на референсы: www.example.com",
+    "Мой ник @designer_pro",
+    "Звоните 89051234567",
+    "Добавь в лс, обсудим",
+    "Готово 👍 Проверьте, пожалуйста, второй вариант баннера",
+    "Цена устраивает, жду счёт",
+    "Я в инсте есть, найдёшь",
+    "Отправил файлы 📎 посмотрите",
+    "Бюджет миллион",
+    "2 миллиона за всё",
+]
+
+# Обходы и числа, которые движок обязан ловить независимо от legacy
+MUST_FLAG = ["миллион", "Миллион", "2 миллиона", "тр1", "в1бер", "т3л3грам", "д в а"]
+# Обычные фразы, в которых предлог и начало следующего слова похожи на ключевое слово
+MUST_NOT_FLAG = ["Покрою с лаком", "Макет с напечатанным текстом", "Подпись до тупого угла"]
+
+def build_corpus(size: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = rnd.sample(SAMPLES, k=rnd.randint(1, 3))
+        corpus.append(" ".join(words))
+    return corpus
+
+def bench(check, corpus, repeat: int) -> float:
+    """Лучшее из repeat время на одно сообщение, в микросекундах."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in corpus:
+            check(message)
+        best = min(best, time.perf_counter() - started)
+    return best / len(corpus) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк модерации сообщений")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages)
+    engine = ModerationEngine.from_file()
+
+    mismatches = [message for message in corpus if legacy_is_suspicious(message) != engine.is_suspicious(message)]
+    print(f"Сообщений: {len(corpus)}, расхождений вердиктов: {len(mismatches)}")
+    for message in mismatches[:10]:
+        print(f"  legacy={legacy_is_suspicious(message)} engine={engine.is_suspicious(message)}: {message!r}")
+
+    missed = [message for message in MUST_FLAG if not engine.is_suspicious(message)]
+    print(f"Обязательных срабатываний пропущено: {len(missed)} из {len(MUST_FLAG)}")
+    for message in missed:
+        print(f"  пропущено: {message!r}")
+    false_positives = [message for message in MUST_NOT_FLAG if engine.is_suspicious(message)]
+    print(f"Ложных срабатываний на контрольных фразах: {len(false_positives)} из {len(MUST_NOT_FLAG)}")
+    for message in false_positives:
+        print(f"  сработало: {message!r} ({engine.classify(message).describe()})")
+
+    legacy_us = bench(legacy_is_suspicious, corpus, args.repeat)
+    engine_us = bench(engine.is_suspicious, corpus, args.repeat)
+    print(f"legacy_is_suspicious:         {legacy_us:8.2f} мкс/сообщение")
+    print(f"ModerationEngine.is_suspicious: {engine_us:8.2f} мкс/сообщение")
+    print(f"Ускорение: x{legacy_us / engine_us:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Бенчмарк обработки обновлений: последовательная обработка против PerChatUpdateProcessor.
+
+Запуск из корня репозитория:
+python benchmarks/bench_update_processor.py [--chats N] [--updates M] [--latency S] [--limit L]
+
+Обновления подаются так же, как их раздаёт Application при concurrent_updates:
+по задаче на обновление в порядке получения. Обработчик "ждёт" БД и Telegram
+(asyncio.sleep) и записывает порядковый номер сообщения своего чата; в конце
+проверяется, что внутри каждого чата порядок не нарушен и что упавшее
+обновление не блокирует следующие обновления своего чата. При нарушении
+скрипт завершается с ненулевым кодом.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from update_processor import PerChatUpdateProcessor
+
+def build_updates(chats: int, updates_per_chat: int, seed: int = 42) -> list:
+    """Обновления нескольких чатов вперемешку; seq — номер сообщения внутри чата."""
+    rng = random.Random(seed)
+    pending = {chat_id: 0 for chat_id in range(chats)}
+    updates = []
+    while pending:
+        chat_id = rng.choice(list(pending))
+        updates.append(SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), seq=pending[chat_id]))
+        pending[chat_id] += 1
+        if pending[chat_id] == updates_per_chat:
+            del pending[chat_id]
+    return updates
+
+async def handle(update, latency: float, seen: dict) -> None:
+    # Случайная задержка: без упорядочивания поздние сообщения чата обгоняли бы ранние
+    await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+    seen.setdefault(update.effective_chat.id, []).append(update.seq)
+
+async def run_sequential(updates, latency: float) -> tuple:
+    seen = {}
+    started = time.perf_counter()
+    for update in updates:
+        await handle(update, latency, seen)
+    return time.perf_counter() - started, seen
+
+async def run_per_chat(updates, latency: float, limit: int) -> tuple:
+    seen = {}
+    async with PerChatUpdateProcessor(limit) as processor:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            asyncio.create_task(processor.process_update(update, handle(update, latency, seen)))
+            for update in updates
+        ))
+        return time.perf_counter() - started, seen
+
+def reordered_chats(seen: dict) -> int:
+    return sum(sequence != sorted(sequence) for sequence in seen.values())
+
+async def check_failure_does_not_block_chat() -> bool:
+    """Первое обновление чата падает; второе и третье должны выполниться по порядку."""
+    seen = []
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("ошибка обработчика")
+
+    async def record(seq):
+        seen.append(seq)
+
+    updates = [SimpleNamespace(effective_chat=SimpleNamespace(id=1), seq=seq) for seq in range(3)]
+    async with PerChatUpdateProcessor(2) as processor:
+        results = await asyncio.wait_for(asyncio.gather(
+            processor.process_update(updates[0], fail()),
+            processor.process_update(updates[1], record(1)),
+            processor.process_update(updates[2], record(2)),
+            return_exceptions=True,
+        ), timeout=5)
+        return isinstance(results[0], RuntimeError) and seen == [1, 2] and processor.queued_chats == 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк параллельной обработки обновлений")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=10, help="обновлений на чат")
+    parser.add_argument("--latency", type=float, default=0.02, help="среднее время обработчика, с")
+    parser.add_argument("--limit", type=int, default=8, help="лимит одновременных обновлений")
+    args = parser.parse_args()
+
+    updates = build_updates(args.chats, args.updates)
+    total = len(updates)
+
+    sequential, _ = asyncio.run(run_sequential(updates, args.latency))
+    print(f"Последовательно:          {sequential:7.2f} с, {total / sequential:8.1f} обновлений/с")
+    failures = 0
+    for limit in sorted({1, 2, 4, args.limit}):
+        elapsed, seen = asyncio.run(run_per_chat(updates, args.latency, limit))
+        reordered = reordered_chats(seen)
+        failures += reordered
+        print(
+            f"PerChatUpdateProcessor({limit:>2}): {elapsed:7.2f} с, {total / elapsed:8.1f} обновлений/с, "
+            f"x{sequential / elapsed:.1f}, чатов с нарушенным порядком: {reordered}"
+        )
+
+    recovered = asyncio.run(check_failure_does_not_block_chat())
+    print(f"Упавшее обновление не блокирует чат: {'да' if recovered else 'НЕТ'}")
+    if failures or not recovered:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
-from telegram import Update, ReplyKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -9,14 +10,28 @@ from telegram.ext import (
     filters,
     CallbackContext
 )
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, joinedload
+from sqlalchemy import select, text, update as sql_update, literal, or_, union_all, func, tuple_, cast, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
-from models.models import Base, Client, Executor, MessageModeration, Service, OrderRequest, OrderServices, Manager
+from models.models import Base, Client, Executor, MessageModeration, Service, OrderRequest, OrderServices, Manager, hash_password_async, shutdown_hash_executor
 from decimal import Decimal
 from datetime import timedelta, datetime
-import re, uuid, json, random
-from config import TELEGRAM_TOKEN, DATABASE_URL
+from typing import NamedTuple, Optional
+import re, uuid, json, random, asyncio, itertools
+from config import TELEGRAM_TOKEN, ROLE_CACHE_SIZE, ROLE_CACHE_TTL, MANAGER_CACHE_TTL, DEFAULT_PASSWORD, ADMIN_PAGE_SIZE, USD_TO_RUB, USD_TO_BYN, MODERATION_RULES_FILE, MODERATION_RULES_POLL_SECONDS
+from config import MAX_CONCURRENT_UPDATES, BOT_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN, ALLOWED_UPDATES
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, MODERATION_ROUTING, MODERATION_REASSIGN_SECONDS, MODERATION_DIGEST_SECONDS
+from cache import TTLCache
+from catalog import service_catalog
+import keyboards
+import moderation
+from moderation import Verdict
+from metrics import metrics
+from ratelimit import OutboundScheduler, fan_out, PRIORITY_MODERATION, PRIORITY_BROADCAST
+from update_processor import PerChatUpdateProcessor
+from chunker import chunk_message
+from database import AsyncSessionLocal, async_engine, session_scope, get_current_session, on_transaction_end
 
 def is_valid_number(input_str: str) -> bool:
     try:
@@ -41,12 +56,7 @@ async def executor_button_callback(update: Update, context: CallbackContext) ->
         user_states[chat_id]["category"] = category
 
         # **Выводим кнопки выбора сложности**
-        keyboard = [
-            [InlineKeyboardButton("Лёгкая", callback_data="difficulty_1")],
-            [InlineKeyboardButton("Средняя", callback_data="difficulty_2")],
-            [InlineKeyboardButton("Сложная", callback_data="difficulty_3")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.EXECUTOR_DIFFICULTY
         await query.message.reply_text("Выберите сложность", reply_markup=reply_markup)
 
         user_states[chat_id]["action"] = "add_executor_difficulty"
@@ -60,7 +70,7 @@ async def executor_button_callback(update: Update, context: CallbackContext) ->
         category = user_states[chat_id]["category"]
 
         try:
-            executor_id = create_executor(username, category, difficulty_level)
+            executor_id = await create_executor(context.db_session, username, category, difficulty_level)
             if executor_id:
                 await query.message.reply_text(f"✅ Исполнитель {username} зарегистрирован!")
             else:
@@ -97,7 +107,7 @@ async def service_button_callback(update: Update, context: CallbackContext) -> N
             name = user_states[chat_id]["name"]
             category = user_states[chat_id]["category"]
 
-            service_id = create_service(name, category, min_price)
+            service_id = await create_service(context.db_session, name, category, min_price)
             if service_id:
                 await query.message.reply_text(f"✅ Услуга '{name}' добавлена в категорию '{category}' с ID {service_id}")
             else:
@@ -107,13 +117,13 @@ async def service_button_callback(update: Update, context: CallbackContext) -> N
         finally:
             del user_states[chat_id]
 
-def convert_currency(amount_usd, usd_to_rub=100, usd_to_byn=3.3):
+def convert_currency(amount_usd, usd_to_rub=USD_TO_RUB, usd_to_byn=USD_TO_BYN):
     """
     Конвертирует сумму из долларов в рубли и белорусские рубли.
 
     :param amount_usd: Сумма в долларах (тип decimal.Decimal).
-    :param usd_to_rub: Курс доллара к рублю (по умолчанию 100).
-    :param usd_to_byn: Курс доллара к белорусскому рублю (по умолчанию 3.3).
+    :param usd_to_rub: Курс доллара к рублю (по умолчанию USD_TO_RUB из конфигурации).
+    :param usd_to_byn: Курс доллара к белорусскому рублю (по умолчанию USD_TO_BYN из конфигурации).
     :return: Кортеж (price_rub, price_byn) — суммы в рублях и белорусских рублях.
     """
     if amount_usd is None:
@@ -127,79 +137,135 @@ def convert_currency(amount_usd, usd_to_rub=100, usd_to_byn=3.3):
 
     return price_rub, price_byn
 
-# Подключение к базе данных
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 user_states = {}
 service_id = None
 
 # Подключение к БД
 def connect_db():
     try:
-        # Создаем подключение и возвращаем его
-        return SessionLocal()
+        # Создаем асинхронную сессию и возвращаем её
+        return AsyncSessionLocal()
     except Exception as e:
         print(f"Ошибка при подключении к базе данных: {e}")
         return None
 
-def check_and_update_user(username: str, telegram_id: str) -> None:
-    with SessionLocal() as session:
-        # Проверяем, есть ли пользователь в таблице менеджеров
-        session.expire_all()  # Очистка кэша сессии
-        manager = session.query(Manager).filter(Manager.telegram_username == username).first()
-        if manager:
-            print(f"[DEBUG] Уже есть такой менеджер {username}")  # Логируем входящее сообщение
-            # Если telegram_id отсутствует, обновляем запись
-            if not manager.telegram_id:
-                manager.telegram_id = telegram_id
-                session.commit()
-            return
+# Хеш дефолтного пароля считается один раз и переиспользуется для всех
+# аккаунтов, созданных через Telegram (пароль у них одинаковый)
+_default_password_hash = None
+
+async def get_default_password_hash() -> str:
+    global _default_password_hash
+    if _default_password_hash is None:
+        _default_password_hash = await hash_password_async(DEFAULT_PASSWORD)
+    return _default_password_hash
+
+ROLE_MANAGER = "manager"
+ROLE_EXECUTOR = "executor"
+ROLE_CLIENT = "client"
+
+class RoleInfo(NamedTuple):
+    role: str
+    entity_id: int
+    telegram_id: Optional[int]
+    username: Optional[str]
+
+# Роли пользователей по Telegram ID: повторные сообщения не обращаются к БД
+role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+
+def _role_select(model, role: str, priority: int, username: str, telegram_id: int):
+    conditions = [model.telegram_id == telegram_id]
+    if username:
+        conditions.append(model.telegram_username == username)
+    return select(
+        literal(role).label("role"),
+        literal(priority).label("priority"),
+        model.id.label("entity_id"),
+        model.telegram_id.label("telegram_id"),
+    ).where(or_(*conditions))
+
+async def resolve_user_role(session, username: str, telegram_id: int) -> Optional[RoleInfo]:
+    """
+    Определяет роль пользователя одним запросом (UNION ALL по менеджерам, исполнителям и клиентам).
 
-        # Проверяем, есть ли пользователь в таблице исполнителей
-        executor = session.query(Executor).filter(Executor.telegram_username == username).first()
-        session.expire_all()  # Очистка кэша сессии
-        if executor:
-            print(f"[DEBUG] Уже есть такой исполнитель {username}")  # Логируем входящее сообщение
-            # Если telegram_id отсутствует, обновляем запись
-            if not executor.telegram_id:
-                executor.telegram_id = telegram_id
-                session.commit()
-            return
-        
-        session.expire_all()  # Очистка кэша сессии
-        # Проверяем, есть ли пользователь в таблице клиентов
-        client = session.query(Client).filter(Client.telegram_username == username).first()
-        if client:
-            print(f"[DEBUG] Найден клиент в БД: {client}")  
-            # Если telegram_id отсутствует, обновляем запись
-            if not client.telegram_id:
-                client.telegram_id = telegram_id
-                session.commit()
-            return
+    :return: RoleInfo с наивысшей ролью (менеджер > исполнитель > клиент) или None.
+    """
+    roles = union_all(
+        _role_select(Manager, ROLE_MANAGER, 1, username, telegram_id),
+        _role_select(Executor, ROLE_EXECUTOR, 2, username, telegram_id),
+        _role_select(Client, ROLE_CLIENT, 3, username, telegram_id),
+    ).subquery()
+    row = (await session.execute(
+        select(roles.c.role, roles.c.entity_id, roles.c.telegram_id)
+        .order_by(roles.c.priority)
+        .limit(1)
+    )).first()
+    if not row:
+        return None
+    return RoleInfo(row.role, row.entity_id, row.telegram_id, username)
 
-        # Если пользователя нет ни в одной из таблиц, добавляем его в таблицу клиентов
-        new_client = Client(
-            login=username,
-            telegram_username=username,
-            telegram_id=telegram_id
-        )
-        new_client.set_password("FX@&9+9№exfXRc#e)wlo")  # Дефолтный пароль
-        session.add(new_client)
-        session.commit()
-        print(f"[DEBUG] записан новый клиент {username}")  # Логируем входящее сообщение
+def invalidate_user_roles(username: str = None, role: str = None, entity_id: int = None) -> None:
+    """Сбрасывает кэш ролей для записей с указанным username или сущностью (role, entity_id)."""
+    role_cache.invalidate_where(
+        lambda _, info: (username is not None and info.username == username)
+        or (role is not None and info.role == role and info.entity_id == entity_id)
+    )
 
-async def handle_admin_commands(update: Update, context: CallbackContext, text: str, user_id: str) -> bool:
-    ADMIN_COMMANDS = {
-        "↩️Назад↩️", "Посмотреть клиентов", "Посмотреть исполнителей", "Посмотреть услуги", 
-        "Посмотреть заказы", "Посмотреть услуги в заказах", "👤Добавить клиента👤", 
-        "👨‍💻Добавить исполнителя👨‍💻", "📄Добавить услугу📄", "📋Добавить заказ📋", 
-        "➕Добавить услугу в заказ➕", "Удалить клиента", "Удалить исполнителя", 
-        "Удалить услугу", "Удалить заказ", "Удалить услугу из заказа", "Изменить исполнителя", 
-        "Изменить услугу", "Изменить заказ", "Изменить услугу в заказе", "Добавить", 
-        "Удалить", "Изменить", "Посмотреть"
-    }
+# Telegram ID менеджеров: уведомления модерации не обращаются к таблице менеджеров
+manager_ids_cache = TTLCache(maxsize=1, ttl=MANAGER_CACHE_TTL)
+
+def invalidate_manager_ids_on_commit(session) -> None:
+    """Сбрасывает список менеджеров сейчас и ещё раз после завершения внешней транзакции (как service_catalog)."""
+    manager_ids_cache.clear()
+    on_transaction_end(session, on_commit=manager_ids_cache.clear, on_rollback=manager_ids_cache.clear)
+
+def cache_user_role_on_commit(session, info: RoleInfo) -> None:
+    """
+    Кладёт роль в role_cache только после commit всего обновления.
+
+    Если обновление откатится, в кэше не останется клиента, которого нет в БД,
+    или telegram_id, который так и не был сохранён.
+    """
+    on_transaction_end(session, on_commit=lambda: role_cache.set(info.telegram_id, info))
+
+async def check_and_update_user(session, username: str, telegram_id: int) -> RoleInfo:
+    cached = role_cache.get(telegram_id)
+    if cached and cached.username == username:
+        return cached
+
+    info = await resolve_user_role(session, username, telegram_id)
+    if info:
+        print(f"[DEBUG] Пользователь {username} найден в БД с ролью {info.role}")
+        # Если telegram_id отсутствует, обновляем запись
+        if not info.telegram_id:
+            model = {ROLE_MANAGER: Manager, ROLE_EXECUTOR: Executor, ROLE_CLIENT: Client}[info.role]
+            await session.execute(sql_update(model).where(model.id == info.entity_id).values(telegram_id=telegram_id))
+            info = info._replace(telegram_id=telegram_id)
+            if info.role == ROLE_MANAGER:
+                # Менеджер впервые написал боту: теперь ему можно слать уведомления модерации
+                invalidate_manager_ids_on_commit(session)
+        cache_user_role_on_commit(session, info)
+        return info
+
+    # Если пользователя нет ни в одной из таблиц, добавляем его в таблицу клиентов
+    new_client = Client(
+        login=username,
+        telegram_username=username,
+        telegram_id=telegram_id,
+        password_hash=await get_default_password_hash()  # Дефолтный пароль
+    )
+    session.add(new_client)
+    await session.flush()
+    print(f"[DEBUG] записан новый клиент {username}")  # Логируем входящее сообщение
+    info = RoleInfo(ROLE_CLIENT, new_client.id, telegram_id, username)
+    cache_user_role_on_commit(session, info)
+    return info
 
-    if text in ADMIN_COMMANDS and user_id not in SPECIAL_USERS:
+async def get_user_role(update: Update, context: CallbackContext) -> RoleInfo:
+    user = update.effective_user
+    return await check_and_update_user(context.db_session, user.username, user.id)
+
+async def handle_admin_commands(update: Update, context: CallbackContext, text: str, user_id: str) -> bool:
+    if text in keyboards.ADMIN_BUTTONS and user_id not in SPECIAL_USERS:
         await update.message.reply_text("🚫 У вас нет доступа к этой команде.")
         return True
     return False
@@ -272,7 +338,7 @@ async def handle_edit_actions(update: Update, context: CallbackContext, state: d
 async def handle_choose_service_for_chat(update: Update, context: CallbackContext, text: str, chat_id: int):
     try:
         service_id = int(text)  # Пытаемся преобразовать текст в число (ID услуги)
-        executor_telegram_id = get_executor_id_by_service(service_id)  # Получаем ID исполнителя
+        executor_telegram_id = await get_executor_id_by_service(context.db_session, service_id)  # Получаем ID исполнителя
         
         if not executor_telegram_id:
             await update.message.reply_text("❌ Не удалось найти исполнителя для данной услуги.")
@@ -292,7 +358,7 @@ async def handle_send_message_to_executor(update: Update, context: CallbackConte
     message_text = text
     service_id = context.user_data.get("service_id")
     executor_telegram_id = context.user_data.get("executor_telegram_id")
-    executor_username = get_executor_username_by_service(service_id)
+    executor_username = await get_executor_username_by_service(context.db_session, service_id)
     
     if not service_id:
         await update.message.reply_text("❌ Ошибка: данные услуги не найдены.")
@@ -302,13 +368,12 @@ async def handle_send_message_to_executor(update: Update, context: CallbackConte
         return
     
     # Получаем информацию об услуге и заказе
-    with SessionLocal() as session:
-        service = (
-            session.query(OrderServices)
-            .options(joinedload(OrderServices.service), joinedload(OrderServices.order))
-            .filter(OrderServices.id == service_id)
-            .first()
-        )
+    session = context.db_session
+    service = await session.scalar(
+        select(OrderServices)
+        .options(joinedload(OrderServices.service), joinedload(OrderServices.order))
+        .where(OrderServices.id == service_id)
+    )
     
     if service:
         order_id = service.order_id  # ID заказа
@@ -320,10 +385,11 @@ async def handle_send_message_to_executor(update: Update, context: CallbackConte
         service_name = "Неизвестная услуга"
     
     # Проверяем сообщение на подозрительные символы
-    if is_suspicious(message_text):
-        executor_username = get_executor_username_by_service(service_id)
+    verdict = moderate(message_text)
+    if verdict.suspicious:
+        executor_username = await get_executor_username_by_service(context.db_session, service_id)
         context.user_data["service_id"] = service_id
-        await send_to_manager(update, context, message_text, executor_telegram_id, executor_username, "executor")
+        await send_to_manager(update, context, message_text, executor_telegram_id, executor_username, "executor", verdict=verdict)
         await update.message.reply_text("🔎 Сообщение отправлено на проверку менеджеру.")
     else:
         # Форматируем сообщение для исполнителя
@@ -342,7 +408,7 @@ async def handle_send_message_to_executor(update: Update, context: CallbackConte
     await start(update, context)
     context.user_data.pop("action", None)
 
-def store_message_data(session, message_id, message_text, receiver_telegram_id, receiver_username, receiver_type, sender_username, service_id):
+async def store_message_data(session, message_id, message_text, receiver_telegram_id, receiver_username, receiver_type, sender_username, service_id):
     try:
         message_data = {
             'message_id': message_id,
@@ -355,16 +421,16 @@ def store_message_data(session, message_id, message_text, receiver_telegram_id,
             'processed': False,
             'created_at': datetime.now()
         }
-        session.execute(text('''
-            INSERT INTO message_moderation 
-            (message_id, message_text, receiver_telegram_id, receiver_username, receiver_type, sender_username, service_id, processed, created_at)
-            VALUES (:message_id, :message_text, :receiver_telegram_id, :receiver_username, :receiver_type, :sender_username, :service_id, :processed, :created_at)
-        '''), message_data)
-        session.commit()
+        # Точка сохранения: ошибка вставки не откатывает остальную работу обновления
+        async with session.begin_nested():
+            await session.execute(text('''
+                INSERT INTO message_moderation 
+                (message_id, message_text, receiver_telegram_id, receiver_username, receiver_type, sender_username, service_id, processed, created_at)
+                VALUES (:message_id, :message_text, :receiver_telegram_id, :receiver_username, :receiver_type, :sender_username, :service_id, :processed, :created_at)
+            '''), message_data)
         return True
     except Exception as e:
         print(f'Error storing message data: {e}')
-        session.rollback()
         return False
 
 async def handle_send_message_to_client(update: Update, context: CallbackContext, text: str):
@@ -374,7 +440,7 @@ async def handle_send_message_to_client(update: Update, context: CallbackContext
     # Получаем все необходимые данные из состояния
     service_id = state.get("service_id")
     client_telegram_id = state.get("client_telegram_id")
-    client_username = state.get("client_username") or get_client_username_by_service(service_id)
+    client_username = state.get("client_username") or await get_client_username_by_service(context.db_session, service_id)
     sender_username = update.effective_user.username
 
     print(f"[DEBUG] service_id={service_id}, client_telegram_id={client_telegram_id}, client_username={client_username}")
@@ -384,7 +450,8 @@ async def handle_send_message_to_client(update: Update, context: CallbackContext
         return
 
     # Проверяем сообщение на подозрительность
-    if is_suspicious(message_text):
+    verdict = moderate(message_text)
+    if verdict.suspicious:
         try:
             await send_to_manager(
                 update=update,
@@ -393,7 +460,8 @@ async def handle_send_message_to_client(update: Update, context: CallbackContext
                 receiver_telegram_id=client_telegram_id,  # Важно!
                 receiver_username=client_username,
                 receiver_type="client",
-                service_id=service_id
+                service_id=service_id,
+                verdict=verdict
             )
             await update.message.reply_text("🔎 Сообщение отправлено на проверку менеджеру.")
         except Exception as e:
@@ -440,6 +508,7 @@ async def handle_edit_message(update: Update, context: CallbackContext) -> None:
     original_text = edit_data.get("original_text", "")
 
     # Формируем базовую информацию о сообщении
+    session = context.db_session
     message_header = "📨 *Сообщение от клиента* "
     service_info = ""
     order_info = ""
@@ -447,24 +516,22 @@ async def handle_edit_message(update: Update, context: CallbackContext) -> None:
     # Если есть service_id, пытаемся получить информацию о заказе
     if service_id:
         try:
-            with SessionLocal() as session:
-                service = (
-                    session.query(OrderServices)
-                    .options(
-                        joinedload(OrderServices.service),
-                        joinedload(OrderServices.order)
-                    )
-                    .filter(OrderServices.id == service_id)
-                    .first()
+            service = await session.scalar(
+                select(OrderServices)
+                .options(
+                    joinedload(OrderServices.service),
+                    joinedload(OrderServices.order)
                 )
+                .where(OrderServices.id == service_id)
+            )
                 
-                if service:
-                    order_id = service.order_id if service.order else "N/A"
-                    service_name = service.service.name if service.service else "Неизвестная услуга"
-                    service_info = (
-                        f"\n\n📋 *Заказ:* №{order_id}\n"
-                        f"📦 *Услуга:* {service_name}"
-                    )
+            if service:
+                order_id = service.order_id if service.order else "N/A"
+                service_name = service.service.name if service.service else "Неизвестная услуга"
+                service_info = (
+                    f"\n\n📋 *Заказ:* №{order_id}\n"
+                    f"📦 *Услуга:* {service_name}"
+                )
         except Exception as e:
             print(f"[ERROR] Ошибка при получении информации о заказе: {e}")
 
@@ -484,17 +551,15 @@ async def handle_edit_message(update: Update, context: CallbackContext) -> None:
         )
         
         # Обновляем запись в базе данных
-        with SessionLocal() as session:
-            session.execute(text('''
-                UPDATE message_moderation 
-                SET message_text = :message_text,
-                    processed = TRUE
-                WHERE message_id = :message_id
-            '''), {
-                'message_text': new_text,
-                'message_id': message_id
-            })
-            session.commit()
+        await session.execute(text('''
+            UPDATE message_moderation 
+            SET message_text = :message_text,
+                processed = TRUE
+            WHERE message_id = :message_id
+        '''), {
+            'message_text': new_text,
+            'message_id': message_id
+        })
             
         await update.message.reply_text("✅ Сообщение изменено и отправлено.")
             
@@ -507,71 +572,66 @@ async def handle_edit_message(update: Update, context: CallbackContext) -> None:
         # Всегда очищаем состояние, даже если возникла ошибка
         context.user_data.pop("edit_message", None)
 
-async def handle_main_menu(update: Update, context: CallbackContext, text: str):
-    if text in ["Добавить", "Изменить", "Удалить", "Посмотреть", "↩️Назад↩️"]:
-        await process_main_menu(update, context)
-        return True
-    return False
-
-async def handle_add_submenu(update: Update, context: CallbackContext, text: str, chat_id: int):
-    if text == "👤Добавить клиента👤":
+async def handle_add_submenu(update: Update, context: CallbackContext, text: str):
+    if text == keyboards.ADD_CLIENT:
         context.user_data.clear()
         context.user_data['action'] = "add_client_username"
         await update.message.reply_text("Введите Telegram username клиента:")
-    elif text == "👨‍💻Добавить исполнителя👨‍💻":
+    elif text == keyboards.ADD_EXECUTOR:
         context.user_data.clear()
         context.user_data['action'] = {"action": "add_executor_username"}
         await update.message.reply_text("Введите Telegram username исполнителя:")
-    elif text == "📄Добавить услугу📄":
+    elif text == keyboards.ADD_SERVICE:
         context.user_data.clear()
         context.user_data['action'] = {"action": "add_service_name"}
         await update.message.reply_text("Введите название услуги:")
-    elif text == "📋Добавить заказ📋":
+    elif text == keyboards.ADD_ORDER:
         context.user_data.clear()
         await add_order(update, context)
-    elif text == "➕Добавить услугу в заказ➕":
+    elif text == keyboards.ADD_SERVICE_TO_ORDER:
         context.user_data.clear()
         await add_service_to_order(update, context)
 
 async def handle_delete_submenu(update: Update, context: CallbackContext, text: str):
-    if text == "Удалить клиента":
+    if text == keyboards.DELETE_CLIENT:
         await delete_client_handler(update, context)
-    elif text == "Удалить исполнителя":
+    elif text == keyboards.DELETE_EXECUTOR:
         await delete_executor_handler(update, context)
-    elif text == "Удалить услугу":
+    elif text == keyboards.DELETE_SERVICE:
         await delete_service_handler(update, context)
-    elif text == "Удалить заказ":
+    elif text == keyboards.DELETE_ORDER:
         await delete_order_handler(update, context)
-    elif text == "Удалить услугу из заказа":
+    elif text == keyboards.DELETE_SERVICE_FROM_ORDER:
         await delete_service_from_order_handler(update, context)
 
-async def handle_edit_submenu(update: Update, context: CallbackContext, text: str, chat_id: int):
-    if text == "Изменить исполнителя":
+async def handle_edit_submenu(update: Update, context: CallbackContext, text: str):
+    if text == keyboards.EDIT_EXECUTOR:
         await edit_executor_handler(update, context)
-    elif text == "Изменить услугу":
+    elif text == keyboards.EDIT_SERVICE:
         await view_services(update, context)
         await update.message.reply_text("Введите ID услуги для изменения:")
-        user_states[chat_id] = {"action": "edit_service_select"}
-    elif text == "Изменить заказ":
+        user_states[update.message.chat_id] = {"action": "edit_service_select"}
+    elif text == keyboards.EDIT_ORDER:
         await edit_order_handler(update, context)
-    elif text == "Изменить услугу в заказе":
+    elif text == keyboards.EDIT_SERVICE_IN_ORDER:
         await edit_service_in_order_handler(update, context)
 
 async def handle_view_submenu(update: Update, context: CallbackContext, text: str):
-    if text == "Посмотреть клиентов":
+    if text == keyboards.VIEW_CLIENTS:
         await view_clients(update, context)
-    elif text == "Посмотреть исполнителей":
+    elif text == keyboards.VIEW_EXECUTORS:
         await view_executors(update, context)
-    elif text == "Посмотреть услуги в заказах":
+    elif text == keyboards.VIEW_SERVICES_IN_ORDERS:
         await view_services_in_orders(update, context)
-    elif text == "Посмотреть услуги":
+    elif text == keyboards.VIEW_SERVICES:
         await view_services(update, context)
-    elif text == "Посмотреть заказы":
+    elif text == keyboards.VIEW_ORDERS:
         await view_orders(update, context)
 
 async def handle_contact_executor(update: Update, context: CallbackContext, user_id: str, chat_id: int):
     # Получаем список услуг клиента
-    services_info = get_client_services(user_id)
+    role = await get_user_role(update, context)
+    services_info = await get_client_services(context.db_session, role)
     
     if services_info is None:
         await update.message.reply_text(
@@ -580,13 +640,11 @@ async def handle_contact_executor(update: Update, context: CallbackContext, user
         )
         return
     # Добавляем кнопку Отмена
-    keyboard = [["❌ Отмена"]]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-    
-    await update.message.reply_text(
+    await send_long(
+        update,
         services_info,
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=keyboards.CANCEL_MENU
     )
     context.user_data["action"] = "choose_service_for_chat"
 
@@ -594,36 +652,34 @@ async def handle_choose_order_for_client_chat(update: Update, context: CallbackC
     try:
         order_id = int(text)
 
-        with SessionLocal() as session:
-            order = (
-                session.query(OrderRequest)
-                .options(joinedload(OrderRequest.client))
-                .filter(OrderRequest.id == order_id)
-                .first()
-            )
+        session = context.db_session
+        order = await session.scalar(
+            select(OrderRequest)
+            .options(joinedload(OrderRequest.client))
+            .where(OrderRequest.id == order_id)
+        )
 
-            if not order or not order.client:
-                await update.message.reply_text("❌ Заказ или клиент не найдены.")
-                return
+        if not order or not order.client:
+            await update.message.reply_text("❌ Заказ или клиент не найдены.")
+            return
 
-            # Найдём первую услугу в заказе
-            service = (
-                session.query(OrderServices)
-                .filter(OrderServices.order_id == order_id)
-                .first()
-            )
-            if not service:
-                await update.message.reply_text("❌ В этом заказе нет услуг.")
-                return
+        # Найдём первую услугу в заказе
+        service = await session.scalar(
+            select(OrderServices)
+            .where(OrderServices.order_id == order_id)
+        )
+        if not service:
+            await update.message.reply_text("❌ В этом заказе нет услуг.")
+            return
 
-            # Записываем всё в context
-            context.user_data["order_id"] = order_id
-            context.user_data["client_telegram_id"] = order.client.telegram_id
-            context.user_data["client_username"] = order.client.telegram_username
-            context.user_data["service_id"] = service.id  # <-- вот этого не хватало
-            context.user_data["action"] = "send_message_to_client"
+        # Записываем всё в context
+        context.user_data["order_id"] = order_id
+        context.user_data["client_telegram_id"] = order.client.telegram_id
+        context.user_data["client_username"] = order.client.telegram_username
+        context.user_data["service_id"] = service.id  # <-- вот этого не хватало
+        context.user_data["action"] = "send_message_to_client"
 
-            await update.message.reply_text("✍️ Введите ваше сообщение для клиента:")
+        await update.message.reply_text("✍️ Введите ваше сообщение для клиента:")
 
     except ValueError:
         await update.message.reply_text("❌ Пожалуйста, введите корректный ID заказа.")
@@ -632,19 +688,18 @@ async def handle_choose_order_to_complete(update: Update, context: CallbackConte
     try:
         order_id = int(text)
         # Помечаем заказ как выполненный
-        with SessionLocal() as session:
-            service = (
-                session.query(OrderServices)
-                .filter(OrderServices.order_id == order_id)
-                .first()
-            )
+        session = context.db_session
+        service = await session.scalar(
+            select(OrderServices)
+            .where(OrderServices.order_id == order_id)
+        )
             
-            if service:
-                service.status = "Завершён"
-                session.commit()
-                await update.message.reply_text(f"✅ Заказ {order_id} отмечен как выполненный!")
-            else:
-                await update.message.reply_text("❌ Заказ не найден.")
+        if service:
+            service.status = "Завершён"
+            await session.flush()
+            await update.message.reply_text(f"✅ Заказ {order_id} отмечен как выполненный!")
+        else:
+            await update.message.reply_text("❌ Заказ не найден.")
             
         context.user_data.pop("action", None)
         
@@ -663,7 +718,7 @@ async def process_user_message(update: Update, context: CallbackContext) -> None
     print(f"[DEBUG] Текущее состояние: {context.user_data.get('action')}")
 
     # Обработка отмены
-    if text.lower() in ["отмена", "cancel", "❌ отмена"]:
+    if text.casefold() in keyboards.CANCEL_TEXTS:
         await cancel_command(update, context)
         return
 
@@ -696,48 +751,10 @@ async def process_user_message(update: Update, context: CallbackContext) -> None
             await handle_user_state(update, context, text, chat_id)
             return
     
-    # Обработка команд исполнителя
-    if text == "✉️ Связаться с клиентом":
-        await handle_contact_client(update, context, user_id, chat_id)
-        return
-    elif text == "🛫 Отправить выполненный заказ":
-        await handle_complete_order(update, context, user_id, chat_id)
-        return
-    elif text == "🪬 Посмотреть активные заказы":
-        await handle_view_orders(update, context, user_id)
-        return
-
-    # Обработка главного меню
-    if await handle_main_menu(update, context, text):
-        return
-
-    # Обработка подменю "Добавить"
-    if text in ["👤Добавить клиента👤", "👨‍💻Добавить исполнителя👨‍💻", "📄Добавить услугу📄", "📋Добавить заказ📋", "➕Добавить услугу в заказ➕"]:
-        await handle_add_submenu(update, context, text, chat_id)
-        return
-
-    # Обработка подменю "Удалить"
-    if text in ["Удалить клиента", "Удалить исполнителя", "Удалить услугу", "Удалить заказ", "Удалить услугу из заказа"]:
-        await handle_delete_submenu(update, context, text)
-        return
-
-    # Обработка подменю "Изменить"
-    if text in ["Изменить исполнителя", "Изменить услугу", "Изменить заказ", "Изменить услугу в заказе"]:
-        await handle_edit_submenu(update, context, text, chat_id)
-        return
-
-    # Обработка подменю "Посмотреть"
-    if text in ["Посмотреть клиентов", "Посмотреть исполнителей", "Посмотреть услуги", "Посмотреть заказы", "Посмотреть услуги в заказах"]:
-        await handle_view_submenu(update, context, text)
-        return
-
-    # Обработка команды "Связаться с исполнителем"
-    if text == "✉️ Связаться с исполнителем":
-        await handle_contact_executor(update, context, user_id, chat_id)
-        return
-        
-    if text == "🛎 Сделать заказ":
-        await handle_create_order(update, context)
+    # Кнопки меню
+    handler = MENU_ROUTES.get(text)
+    if handler is not None:
+        await handler(update, context, text)
         return
 
     # Если ни одно условие не сработало
@@ -745,28 +762,26 @@ async def process_user_message(update: Update, context: CallbackContext) -> None
 
 async def handle_contact_client(update: Update, context: CallbackContext, user_id: str, chat_id: int):
     # Получаем список заказов исполнителя
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.telegram_username == user_id).first()
-        if not executor:
-            await update.message.reply_text("❌ Вы не зарегистрированы как исполнитель.")
-            return
+    session = context.db_session
+    role = await get_user_role(update, context)
+    if role.role != ROLE_EXECUTOR:
+        await update.message.reply_text("❌ Вы не зарегистрированы как исполнитель.")
+        return
 
-        services = (
-            session.query(OrderServices)
-            .options(
-                joinedload(OrderServices.order).joinedload(OrderRequest.client),
-                joinedload(OrderServices.service)
-            )
-            .filter(OrderServices.executor_id == executor.id)
-            .all()
+    services = (await session.scalars(
+        select(OrderServices)
+        .options(
+            joinedload(OrderServices.order).joinedload(OrderRequest.client),
+            joinedload(OrderServices.service)
         )
+        .where(OrderServices.executor_id == role.entity_id)
+    )).all()
 
     if not services:
         await update.message.reply_text("ℹ️ У вас нет активных заказов для связи с клиентами.")
         return
     
-    keyboard = [["❌ Отмена"]]
-    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    reply_markup = keyboards.CANCEL_MENU
 
     message_text = "Выберите заказ для связи с клиентом (Введите ID заказа):\n"
     for service in services:
@@ -787,11 +802,10 @@ async def handle_contact_client(update: Update, context: CallbackContext, user_i
 MANAGER_CONTACT = "@PixelHUB_Manager"
 async def handle_complete_order(update: Update, context: CallbackContext, user_id: str, chat_id: int):
     # Получаем информацию об исполнителе
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.telegram_username == user_id).first()
-        if not executor:
-            await update.message.reply_text("❌ Вы не зарегистрированы как исполнитель.")
-            return
+    role = await get_user_role(update, context)
+    if role.role != ROLE_EXECUTOR:
+        await update.message.reply_text("❌ Вы не зарегистрированы как исполнитель.")
+        return
 
     # Формируем приятное сообщение с похвалой
     praise_messages = [
@@ -821,90 +835,86 @@ async def handle_complete_order(update: Update, context: CallbackContext, user_i
     if chat_id in user_states:
         del user_states[chat_id]
 
-def get_client_orders(username: str):
-    with SessionLocal() as session:
-        client = session.query(Client).filter(Client.telegram_username == username).first()
-        if not client:
-            return None
+async def get_client_orders(session, role: RoleInfo):
+    if role.role != ROLE_CLIENT:
+        return None
 
-        orders = (
-            session.query(OrderRequest)
-            .options(
-                joinedload(OrderRequest.order_services).joinedload(OrderServices.service)
-            )
-            .filter(OrderRequest.client_id == client.id)
-            .order_by(OrderRequest.id)
-            .all()
+    orders = (await session.scalars(
+        select(OrderRequest)
+        .options(
+            joinedload(OrderRequest.order_services).joinedload(OrderServices.service)
         )
+        .where(OrderRequest.client_id == role.entity_id)
+        .order_by(OrderRequest.id)
+    )).unique().all()
 
-        return orders
+    return orders
 
 async def handle_view_orders(update: Update, context: CallbackContext, user_id: str):
     # Проверяем, является ли пользователь исполнителем
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.telegram_username == user_id).first()
-        if executor:
-            # Логика для исполнителя
-            services = (
-                session.query(OrderServices)
-                .options(
-                    joinedload(OrderServices.order).joinedload(OrderRequest.client),
-                    joinedload(OrderServices.service)
-                )
-                .filter(OrderServices.executor_id == executor.id)
-                .all()
+    session = context.db_session
+    role = await get_user_role(update, context)
+    if role.role == ROLE_EXECUTOR:
+        # Логика для исполнителя
+        services = (await session.scalars(
+            select(OrderServices)
+            .options(
+                joinedload(OrderServices.order).joinedload(OrderRequest.client),
+                joinedload(OrderServices.service)
             )
+            .where(OrderServices.executor_id == role.entity_id)
+        )).all()
 
-            if not services:
-                await update.message.reply_text("❌ У вас нет активных заказов.")
-                return
+        if not services:
+            await update.message.reply_text("❌ У вас нет активных заказов.")
+            return
 
-            message_text = "📋 Ваши активные заказы:\n\n"
-            for service in services:
-                price_rub, price_byn = convert_currency(service.service_price)
-
-                message_text += (
-                    f"📍 *ID заказа:* {service.order_id}\n"
-                    f"📌 *Услуга:* {service.service.name if service.service else 'N/A'}\n"
-                    f"📦 *Количество:* {service.quantity}\n"
-                    f"📅 *Дата создания:* {service.created_at.strftime('%d.%m.%y %H:%M') if service.created_at else 'N/A'}\n"
-                    f"⏳ *Дата завершения:* {service.estimated_completion.strftime('%d.%m.%y %H:%M') if service.estimated_completion else 'N/A'}\n"
-                    f"📌 *Статус:* {service.status}\n"
-                    "———————————————\n"
-                )
+        message_text = "📋 Ваши активные заказы:\n\n"
+        for service in services:
+            price_rub, price_byn = convert_currency(service.service_price)
+
+            message_text += (
+                f"📍 *ID заказа:* {service.order_id}\n"
+                f"📌 *Услуга:* {service.service.name if service.service else 'N/A'}\n"
+                f"📦 *Количество:* {service.quantity}\n"
+                f"📅 *Дата создания:* {service.created_at.strftime('%d.%m.%y %H:%M') if service.created_at else 'N/A'}\n"
+                f"⏳ *Дата завершения:* {service.estimated_completion.strftime('%d.%m.%y %H:%M') if service.estimated_completion else 'N/A'}\n"
+                f"📌 *Статус:* {service.status}\n"
+                "———————————————\n"
+            )
             
-            await update.message.reply_text(message_text, parse_mode="Markdown")
-        else:
-            # Логика для клиента
-            orders = get_client_orders(user_id)
-            if not orders:
-                await update.message.reply_text("❌ У вас нет активных заказов.")
-                return
+        await send_long(update, message_text, parse_mode="Markdown")
+    else:
+        # Логика для клиента
+        orders = await get_client_orders(session, role)
+        if not orders:
+            await update.message.reply_text("❌ У вас нет активных заказов.")
+            return
 
-            message_text = "📋 Ваши активные заказы:\n\n"
-            for order in orders:
-                total_rub, total_byn = convert_currency(order.price) if order.price else (None, None)
-                message_text += f"🛒 *Заказ №{order.id}*\n"
-                message_text += f"📅 *Дата создания:* {order.created_at.strftime('%d.%m.%y %H:%M') if order.created_at else 'N/A'}\n"
-                message_text += f"⏳ *Дата завершения:* {order.estimated_completion.strftime('%d.%m.%y %H:%M') if order.estimated_completion else 'N/A'}\n"
-                message_text += f"📌 *Статус:* {order.status}\n"
-                message_text += f"💰 *Общая стоимость:* "
-                message_text += f"{int(order.price)} USD | {int(total_rub)} RUB | {total_byn:.2f} BYN\n" if order.price else "N/A\n"
+        message_text = "📋 Ваши активные заказы:\n\n"
+        for order in orders:
+            total_rub, total_byn = convert_currency(order.price) if order.price else (None, None)
+            message_text += f"🛒 *Заказ №{order.id}*\n"
+            message_text += f"📅 *Дата создания:* {order.created_at.strftime('%d.%m.%y %H:%M') if order.created_at else 'N/A'}\n"
+            message_text += f"⏳ *Дата завершения:* {order.estimated_completion.strftime('%d.%m.%y %H:%M') if order.estimated_completion else 'N/A'}\n"
+            message_text += f"📌 *Статус:* {order.status}\n"
+            message_text += f"💰 *Общая стоимость:* "
+            message_text += f"{int(order.price)} USD | {int(total_rub)} RUB | {total_byn:.2f} BYN\n" if order.price else "N/A\n"
                 
-                # Добавляем информацию об услугах в заказе
-                if order.order_services:
-                    message_text += "\n📋 *Услуги в заказе:*\n"
-                    for service in order.order_services:
-                        price_rub, price_byn = convert_currency(service.service_price)
-                        message_text += (
-                            f"  • {service.service.name if service.service else 'N/A'} "
-                            f"(x{service.quantity}) - {int(service.service_price)} USD | {int(price_rub)} RUB | {price_byn:.2f} BYN\n"
-                            f"    Статус: {service.status}\n"
-                        )
+            # Добавляем информацию об услугах в заказе
+            if order.order_services:
+                message_text += "\n📋 *Услуги в заказе:*\n"
+                for service in order.order_services:
+                    price_rub, price_byn = convert_currency(service.service_price)
+                    message_text += (
+                        f"  • {service.service.name if service.service else 'N/A'} "
+                        f"(x{service.quantity}) - {int(service.service_price)} USD | {int(price_rub)} RUB | {price_byn:.2f} BYN\n"
+                        f"    Статус: {service.status}\n"
+                    )
                 
-                message_text += "———————————————\n"
+            message_text += "———————————————\n"
 
-            await update.message.reply_text(message_text, parse_mode="Markdown")
+        await send_long(update, message_text, parse_mode="Markdown")
 
 async def process_client_message(update: Update, context: CallbackContext, state: dict) -> None:
     chat_id = update.message.chat_id
@@ -912,7 +922,7 @@ async def process_client_message(update: Update, context: CallbackContext, state
 
     try:
         # Обработка отмены
-        if text.lower() in ["отмена", "cancel"]:
+        if text.casefold() in keyboards.CANCEL_TEXTS:
             context.user_data.clear()
             await update.message.reply_text("✅ Добавление клиента отменено.")
             await start(update, context)
@@ -930,7 +940,7 @@ async def process_client_message(update: Update, context: CallbackContext, state
                 return  # Состояние сохраняется
 
             try:
-                client_id = create_client(text)
+                client_id = await create_client(context.db_session, text)
                 if client_id:
                     await update.message.reply_text(f"✅ Клиент @{text} успешно зарегистрирован!")
                     # Только при успешном добавлении очищаем состояние
@@ -959,13 +969,7 @@ async def process_executor_message(update: Update, context: CallbackContext, sta
         user_states[chat_id]["username"] = update.message.text
 
         # **Кнопки выбора категории**
-        keyboard = [
-            [InlineKeyboardButton("Montage", callback_data="category_Montage")],
-            [InlineKeyboardButton("Design", callback_data="category_Design")],
-            [InlineKeyboardButton("IT", callback_data="category_IT")],
-            [InlineKeyboardButton("Record", callback_data="category_Record")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.EXECUTOR_CATEGORY
         await update.message.reply_text("Выберите категорию:", reply_markup=reply_markup)
 
         user_states[chat_id]["action"] = "add_executor_category"
@@ -977,13 +981,7 @@ async def process_service_message(update: Update, context: CallbackContext, stat
         user_states[chat_id]["name"] = update.message.text
 
         # **Кнопки выбора категории**
-        keyboard = [
-            [InlineKeyboardButton("Montage", callback_data="service_category_Montage")],
-            [InlineKeyboardButton("Design", callback_data="service_category_Design")],
-            [InlineKeyboardButton("IT", callback_data="service_category_IT")],
-            [InlineKeyboardButton("Record", callback_data="service_category_Record")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.SERVICE_CATEGORY
         await update.message.reply_text("Выберите категорию:", reply_markup=reply_markup)
 
         user_states[chat_id]["action"] = "add_service_category"
@@ -996,7 +994,7 @@ async def process_service_message(update: Update, context: CallbackContext, stat
             name = user_states[chat_id]["name"]
             category = user_states[chat_id]["category"]
 
-            service_id = create_service(name, category, min_price)
+            service_id = await create_service(context.db_session, name, category, min_price)
             if service_id:
                 await update.message.reply_text(f"✅ Услуга '{name}' добавлена в категорию '{category}' с ID {service_id}")
             else:
@@ -1016,7 +1014,7 @@ async def process_order_message(update: Update, context: CallbackContext, state:
         client_username = user_states[chat_id]["client_username"]
         try:
             # Добавляем заказ в базу данных
-            order_id = create_order(client_username, order_status)
+            order_id = await create_order(context.db_session, client_username, order_status)
             if order_id:
                 await update.message.reply_text(f"✅ Заказ добавлен с ID {order_id}, статус: {order_status}")
             else:
@@ -1039,8 +1037,8 @@ async def process_service_to_order_message(update: Update, context: CallbackCont
             user_states[chat_id]["order_id"] = int(order_id)
 
             # Получаем список всех услуг
-            with SessionLocal() as session:
-                services = session.query(Service).order_by(Service.category).all()
+            session = context.db_session
+            services = await get_all_services(session)
 
             if not services:
                 await update.message.reply_text("❌ В базе нет доступных услуг.")
@@ -1124,7 +1122,7 @@ async def process_service_to_order_message(update: Update, context: CallbackCont
                 quantity = user_states[chat_id]["quantity"]
                 service_price = user_states[chat_id]["service_price"]
 
-                service_to_order_id = create_service_to_order(order_id, service_id, quantity, service_price, estimated_completion)
+                service_to_order_id = await create_service_to_order(context.db_session, order_id, service_id, quantity, service_price, estimated_completion)
                 if service_to_order_id:
                     await update.message.reply_text(f"✅ Услуга добавлена в заказ с ID {service_to_order_id}, срок: {estimated_completion.strftime('%d.%m.%y %H:%M')}")
                 else:
@@ -1141,33 +1139,31 @@ async def process_service_to_order_message(update: Update, context: CallbackCont
     if chat_id in user_states and state["action"] == "add_service_to_order_end":
         del user_states[chat_id]
 
-def create_client(username: str):
-    with SessionLocal() as session:
-        # Проверяем, существует ли клиент с таким Telegram username
-        existing_client = session.query(Client).filter(Client.telegram_username == username).first()
-        if existing_client:
-            print(f"Клиент с Telegram username {username} уже существует.")
-            return None
+async def create_client(session, username: str):
+    # Проверяем, существует ли клиент с таким Telegram username
+    existing_client = await session.scalar(select(Client).where(Client.telegram_username == username))
+    if existing_client:
+        print(f"Клиент с Telegram username {username} уже существует.")
+        return None
 
-        try:
-            # Создаем нового клиента
-            new_client = Client(
-                login=username,  # Логин = Telegram username
-                telegram_username=username,
-                telegram_id=None
-            )
-            new_client.set_password("FX@&9+9№exfXRc#e)wlo")  # Дефолтный пароль
+    try:
+        # Создаем нового клиента
+        new_client = Client(
+            login=username,  # Логин = Telegram username
+            telegram_username=username,
+            telegram_id=None,
+            password_hash=await get_default_password_hash()  # Дефолтный пароль
+        )
 
+        async with session.begin_nested():
             session.add(new_client)
-            session.commit()
-            session.refresh(new_client)
-            print(f"Клиент с Telegram username {username} добавлен с ID {new_client.id}")
-            return new_client.id
-
-        except IntegrityError:
-            session.rollback()
-            print(f"Ошибка: Клиент с Telegram username '{username}' уже существует.")
-            return None
+        invalidate_user_roles(username=username)
+        print(f"Клиент с Telegram username {username} добавлен с ID {new_client.id}")
+        return new_client.id
+
+    except IntegrityError:
+        print(f"Ошибка: Клиент с Telegram username '{username}' уже существует.")
+        return None
        
 async def add_client(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1181,35 +1177,34 @@ async def add_client(update: Update, context: CallbackContext) -> None:
     print(f"[DEBUG] Sending message to user {chat_id}")
     await update.message.reply_text("Введите Telegram username клиента:")
 
-def create_executor(username: str, category: str, difficulty_level: int):
-    with SessionLocal() as session:
-        # Проверяем, существует ли исполнитель с таким Telegram username
-        existing_executor = session.query(Executor).filter(Executor.telegram_username == username).first()
-        if existing_executor:
-            print(f"Исполнитель с Telegram username {username} уже существует.")
-            return None
+async def create_executor(session, username: str, category: str, difficulty_level: int):
+    # Проверяем, существует ли исполнитель с таким Telegram username
+    existing_executor = await session.scalar(select(Executor).where(Executor.telegram_username == username))
+    if existing_executor:
+        print(f"Исполнитель с Telegram username {username} уже существует.")
+        return None
 
-        try:
-            # Создаем нового исполнителя
-            new_executor = Executor(
-                login=username,  # Логин = Telegram username
-                telegram_username=username,
-                telegram_id=None,
-                category=category,
-                difficulty_level=difficulty_level
-            )
-            new_executor.set_password("FX@&9+9№exfXRc#e)wlo")  # Дефолтный пароль
+    try:
+        # Создаем нового исполнителя
+        new_executor = Executor(
+            login=username,  # Логин = Telegram username
+            telegram_username=username,
+            telegram_id=None,
+            category=category,
+            difficulty_level=difficulty_level,
+            password_hash=await get_default_password_hash()  # Дефолтный пароль
+        )
 
+        async with session.begin_nested():
             session.add(new_executor)
-            session.commit()
-            session.refresh(new_executor)
-            print(f"Исполнитель с Telegram username {username} добавлен с ID {new_executor.id}")
-            return new_executor.id
-
-        except IntegrityError:
-            session.rollback()
-            print(f"Ошибка: Исполнитель с Telegram username '{username}' уже существует.")
-            return None
+        # Пользователь мог быть закэширован как клиент
+        invalidate_user_roles(username=username)
+        print(f"Исполнитель с Telegram username {username} добавлен с ID {new_executor.id}")
+        return new_executor.id
+
+    except IntegrityError:
+        print(f"Ошибка: Исполнитель с Telegram username '{username}' уже существует.")
+        return None
         
 async def add_executor(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1219,32 +1214,30 @@ async def add_executor(update: Update, context: CallbackContext) -> None:
     await update.message.reply_text("Введите Telegram username исполнителя:")
     user_states[chat_id] = {"action": "add_executor_username"}
 
-def create_service(name: str, category: str, min_price: Decimal):
-    with SessionLocal() as session:
-        # Проверяем, существует ли услуга с таким названием и категорией
-        existing_service = session.query(Service).filter(Service.name == name, Service.category == category).first()
-        if existing_service:
-            print(f"Услуга '{name}' в категории '{category}' уже существует.")
-            return None
+async def create_service(session, name: str, category: str, min_price: Decimal):
+    # Проверяем, существует ли услуга с таким названием и категорией
+    existing_service = await session.scalar(select(Service).where(Service.name == name, Service.category == category))
+    if existing_service:
+        print(f"Услуга '{name}' в категории '{category}' уже существует.")
+        return None
 
-        try:
-            # Создаем новую услугу
-            new_service = Service(
-                name=name,
-                category=category,
-                min_price=min_price
-            )
+    try:
+        # Создаем новую услугу
+        new_service = Service(
+            name=name,
+            category=category,
+            min_price=min_price
+        )
 
+        async with session.begin_nested():
             session.add(new_service)
-            session.commit()
-            session.refresh(new_service)
-            print(f"Услуга '{name}' добавлена в категорию '{category}' с ID {new_service.id}")
-            return new_service.id
+        service_catalog.invalidate_on_commit(session)
+        print(f"Услуга '{name}' добавлена в категорию '{category}' с ID {new_service.id}")
+        return new_service.id
 
-        except IntegrityError:
-            session.rollback()
-            print(f"Ошибка: Услуга '{name}' в категории '{category}' уже существует.")
-            return None
+    except IntegrityError:
+        print(f"Ошибка: Услуга '{name}' в категории '{category}' уже существует.")
+        return None
 
 async def add_service(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1254,32 +1247,29 @@ async def add_service(update: Update, context: CallbackContext) -> None:
     await update.message.reply_text("Введите название услуги:")
     user_states[chat_id] = {"action": "add_service_name"}
 
-def create_order(client_username: str, status: str):
-    with SessionLocal() as session:
-        moscow_offset = timedelta(hours=3)  # Смещение для московского времени (UTC+3)
-        # Ищем клиента по telegram_username
-        client = session.query(Client).filter(Client.telegram_username == client_username).first()
-        if not client:
-            print(f"Клиент с Telegram username '{client_username}' не найден.")
-            return None
+async def create_order(session, client_username: str, status: str):
+    moscow_offset = timedelta(hours=3)  # Смещение для московского времени (UTC+3)
+    # Ищем клиента по telegram_username
+    client = await session.scalar(select(Client).where(Client.telegram_username == client_username))
+    if not client:
+        print(f"Клиент с Telegram username '{client_username}' не найден.")
+        return None
 
-        try:
-            # Создаем новый заказ с ID клиента
-            new_order = OrderRequest(
-                client_id=client.id,  # Используем ID клиента
-                status=status
-            )
+    try:
+        # Создаем новый заказ с ID клиента
+        new_order = OrderRequest(
+            client_id=client.id,  # Используем ID клиента
+            status=status
+        )
 
+        async with session.begin_nested():
             session.add(new_order)
-            session.commit()
-            session.refresh(new_order)
-            print(f"✅ Заказ с ID {new_order.id} добавлен для клиента '{client_username}' (ID {client.id})")
-            return new_order.id  # Возвращаем ID нового заказа
+        print(f"✅ Заказ с ID {new_order.id} добавлен для клиента '{client_username}' (ID {client.id})")
+        return new_order.id  # Возвращаем ID нового заказа
 
-        except Exception as e:
-            print(f"❌ Ошибка при добавлении заказа: {e}")
-            session.rollback()
-            return None
+    except Exception as e:
+        print(f"❌ Ошибка при добавлении заказа: {e}")
+        return None
 
 async def add_order(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1290,31 +1280,31 @@ async def add_order(update: Update, context: CallbackContext) -> None:
     user_states[chat_id] = {"action": "add_order_client_username"}
     await process_order_message(update,context,user_states)
 
-def create_service_to_order(order_id: int, service_id: int, quantity: int, service_price: Decimal, estimated_completion: datetime = None):
-    with SessionLocal() as session:
-        try:
-            executor_id = None  # Для отсутствующего исполнителя
-            new_order_service = OrderServices(
-                order_id=order_id,
-                service_id=service_id,
-                quantity=quantity,
-                service_price=service_price,
-                executor_id=executor_id,  # Передаем None
-                estimated_completion=estimated_completion,
-                status="В обработке"  # Дефолтный статус
-            )
+async def create_service_to_order(session, order_id: int, service_id: int, quantity: int, service_price: Decimal, estimated_completion: datetime = None):
+    try:
+        executor_id = None  # Для отсутствующего исполнителя
+        new_order_service = OrderServices(
+            order_id=order_id,
+            service_id=service_id,
+            quantity=quantity,
+            service_price=service_price,
+            executor_id=executor_id,  # Передаем None
+            estimated_completion=estimated_completion,
+            status="В обработке"  # Дефолтный статус
+        )
+        # Итоги пересчитываются в той же точке сохранения: при ошибке откатываются
+        # обе операции, а транзакция обновления остаётся рабочей
+        async with session.begin_nested():
             session.add(new_order_service)
-            session.commit()
-            session.refresh(new_order_service)
-            print(f"Услуга {service_id} добавлена в заказ {order_id} с ID {new_order_service.id}")
-            update_order_totals(order_id)
+            await session.flush()
+            await update_order_totals(session, order_id)
+        print(f"Услуга {service_id} добавлена в заказ {order_id} с ID {new_order_service.id}")
 
-            return new_order_service.id
+        return new_order_service.id
             
-        except Exception as e:
-            session.rollback()
-            print(f"Ошибка при добавлении услуги в заказ: {e}")
-            return None
+    except Exception as e:
+        print(f"Ошибка при добавлении услуги в заказ: {e}")
+        return None
         
 async def add_service_to_order(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1322,20 +1312,37 @@ async def add_service_to_order(update: Update, context: CallbackContext) -> None
     await update.message.reply_text("Введите ID заказа для добавления услуги:")
     user_states[chat_id] = {"action":"add_service_to_order_order_id"}
 
-def update_order_totals(order_id):
-    with SessionLocal() as session:
-        order = session.query(OrderRequest).filter(OrderRequest.id == order_id).first()
-        if not order:
-            return
+def order_totals_update():
+    """
+    UPDATE order_request: цена = сумма цен услуг заказа, срок = самый поздний срок услуги.
 
-        services = session.query(OrderServices).filter(OrderServices.order_id == order_id).all()
+    Агрегаты считаются коррелированными подзапросами на стороне БД,
+    строки услуг в ORM не загружаются.
+    """
+    total_price = (
+        select(func.coalesce(func.sum(OrderServices.service_price), 0))
+        .where(OrderServices.order_id == OrderRequest.id)
+        .scalar_subquery()
+    )
+    latest_completion = (
+        select(func.max(OrderServices.estimated_completion))
+        .where(OrderServices.order_id == OrderRequest.id)
+        .scalar_subquery()
+    )
+    # synchronize_session=False: значения вычисляет БД, объекты заказов в сессии не обновляются
+    return (
+        sql_update(OrderRequest)
+        .values(price=total_price, estimated_completion=latest_completion)
+        .execution_options(synchronize_session=False)
+    )
 
-        total_price = sum(service.service_price for service in services)
-        latest_completion = max((service.estimated_completion for service in services if service.estimated_completion), default=None)
+async def update_order_totals(session, order_id):
+    await session.execute(order_totals_update().where(OrderRequest.id == order_id))
 
-        order.price = total_price
-        order.estimated_completion = latest_completion
-        session.commit()
+async def recompute_all_order_totals(session) -> int:
+    """Пересчитывает цену и срок всех заказов одним запросом. Возвращает число заказов."""
+    result = await session.execute(order_totals_update())
+    return result.rowcount
 
 async def start(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1345,132 +1352,100 @@ async def start(update: Update, context: CallbackContext) -> None:
     user_id = update.message.from_user.username
     telegram_id = update.message.from_user.id
 
-    check_and_update_user(user_id, telegram_id)
+    role = await check_and_update_user(context.db_session, user_id, telegram_id)
     print(f"[DEBUG] {user_id}")  # Логируем входящее сообщение
 
-    # Проверяем, является ли пользователь исполнителем
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.telegram_username == user_id).first()
-        is_special = user_id in SPECIAL_USERS
-        if executor and is_special:
-            # Комбинированное меню для спец.пользователей-исполнителей
-            keyboard = [
-                ["✉️ Связаться с клиентом"],
-                ["🛫Отправить выполненный заказ","Посмотреть активные заказы"],
-                ["Добавить", "Изменить", "Удалить", "Посмотреть"]
-            ]
-        elif is_special:
-            keyboard = [["Добавить", "Изменить"],
-                      ["Удалить", "Посмотреть"]]
-        elif executor:
-            # Меню для исполнителя
-            keyboard = [
-                ["✉️ Связаться с клиентом"],
-                ["🛫 Отправить выполненный заказ"],
-                ["🪬 Посмотреть активные заказы"]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            await update.message.reply_text(
-                "👋 Приветик! Чем займёмся сегодня?", 
-                reply_markup=reply_markup
-            )
-        else:
-            keyboard = [["🛎 Сделать заказ", "✉️ Связаться с исполнителем"],
-                    ["🪬 Посмотреть активные заказы"]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-       
-    await update.message.reply_text("👋 Привет! Выберите действие:", reply_markup=reply_markup)
+    # Меню зависит от роли; исполнителя приветствуем по-своему
+    executor = role.role == ROLE_EXECUTOR
+    is_special = user_id in SPECIAL_USERS
+    greeting = "👋 Приветик! Чем займёмся сегодня?" if executor and not is_special else "👋 Привет! Выберите действие:"
+    await update.message.reply_text(greeting, reply_markup=keyboards.role_menu(executor, is_special))
 
 async def process_main_menu(update: Update, context: CallbackContext) -> None:
-    text = update.message.text
-    chat_id = update.message.chat_id
-
-    if text == "Добавить":
-        keyboard = [
-            ["👤Добавить клиента👤", "👨‍💻Добавить исполнителя👨‍💻"],
-            ["📄Добавить услугу📄", "📋Добавить заказ📋"],
-            ["➕Добавить услугу в заказ➕", "↩️Назад↩️"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
-    elif text == "Изменить":
-        keyboard = [
-            ["Изменить услугу", "Изменить исполнителя"],
-            ["Изменить заказ", "Изменить услугу в заказе"],
-            ["↩️Назад↩️"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
-    elif text == "Удалить":
-        keyboard = [
-            ["Удалить клиента", "Удалить исполнителя"],
-            ["Удалить услугу", "Удалить заказ"],
-            ["Удалить услугу из заказа", "↩️Назад↩️"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
-    elif text == "Посмотреть":
-        keyboard = [
-            ["Посмотреть клиентов", "Посмотреть исполнителей"],
-            ["Посмотреть услуги", "Посмотреть заказы", "Посмотреть услуги в заказах"],
-            ["↩️Назад↩️"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("Выберите, что хотите посмотреть:", reply_markup=reply_markup)
-    elif text == "↩️Назад↩️":
-        keyboard = [
-            ["Добавить", "Изменить", "Удалить", "Посмотреть"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-        await update.message.reply_text("👋 Выберите действие:", reply_markup=reply_markup)
-    else:
+    submenu = keyboards.SUBMENUS.get(update.message.text)
+    if submenu is None:
         await update.message.reply_text("⚠️ Пожалуйста, выберите действие из меню.")
-
-async def handle_create_order(update: Update, context: CallbackContext):
-    # Получаем услуги, сгруппированные по категориям
-    services_by_category = get_services_by_category()
-    
-    if not services_by_category:
-        await update.message.reply_text("❌ В настоящее время нет доступных услуг.")
         return
-
-    # Формируем сообщение
-    message_text = (
+    reply_markup, caption = submenu
+    await update.message.reply_text(caption, reply_markup=reply_markup)
+
+# Текст кнопки меню -> обработчик(update, context, text); тексты берутся из keyboards
+MENU_ROUTES = {
+    keyboards.CONTACT_CLIENT: lambda update, context, text: handle_contact_client(
+        update, context, update.message.from_user.username, update.message.chat_id),
+    keyboards.COMPLETE_ORDER: lambda update, context, text: handle_complete_order(
+        update, context, update.message.from_user.username, update.message.chat_id),
+    keyboards.VIEW_ACTIVE_ORDERS: lambda update, context, text: handle_view_orders(
+        update, context, update.message.from_user.username),
+    keyboards.CONTACT_EXECUTOR: lambda update, context, text: handle_contact_executor(
+        update, context, update.message.from_user.username, update.message.chat_id),
+    keyboards.CREATE_ORDER: lambda update, context, text: handle_create_order(update, context),
+    **dict.fromkeys(keyboards.SUBMENUS, lambda update, context, text: process_main_menu(update, context)),
+    **dict.fromkeys(keyboards.texts(keyboards.ADD_MENU) - {keyboards.BACK}, handle_add_submenu),
+    **dict.fromkeys(keyboards.texts(keyboards.EDIT_MENU) - {keyboards.BACK}, handle_edit_submenu),
+    **dict.fromkeys(keyboards.texts(keyboards.DELETE_MENU) - {keyboards.BACK}, handle_delete_submenu),
+    **dict.fromkeys(keyboards.texts(keyboards.VIEW_MENU) - {keyboards.BACK}, handle_view_submenu),
+}
+
+def render_order_catalog(services_by_category) -> str:
+    parts = [
         "🛎 *Чтобы сделать заказ, свяжитесь с менеджером:*\n"
         f"👉 @{MANAGER_CONTACT}\n\n"
         "📋 *Наши услуги:*\n\n"
-    )
+    ]
 
     # Добавляем услуги по категориям
     for category, services in services_by_category.items():
-        message_text += f"*{category}:*\n"
-        
+        parts.append(f"*{category}:*\n")
         for service in services:
             price_rub, price_byn = convert_currency(service.min_price)
-            message_text += (
+            parts.append(
                 f"• {service.name} - {int(service.min_price)} USD "
                 f"({int(price_rub)} RUB / {price_byn:.2f} BYN)\n"
             )
-        
-        message_text += "\n"
+        parts.append("\n")
 
     # Добавляем подсказку
-    message_text += (
+    parts.append(
         "\nПри обращении к менеджеру укажите:\n"
         "• Какие услуги вас интересуют\n"
         "• Желаемые сроки выполнения\n"
         "• Любые особые требования"
     )
+    return "".join(parts)
 
-    try:
-        await update.message.reply_text(message_text, parse_mode="Markdown")
-    except Exception as e:
-        # Если возникла ошибка с Markdown, отправляем без форматирования
-        await update.message.reply_text(
-            message_text.replace('*', '').replace('_', ''),
-            parse_mode=None
+# Отрисованный прайс-лист «🛎 Сделать заказ». Ключ — версия каталога и курсы валют;
+# markdown=False запоминает, что Telegram отверг разметку, чтобы сразу слать plain-текст
+_order_catalog_message = {"key": None, "text": None, "plain": None, "markdown": True}
+
+async def handle_create_order(update: Update, context: CallbackContext):
+    cached = _order_catalog_message
+    key = (service_catalog.version, USD_TO_RUB, USD_TO_BYN)
+    if cached["key"] != key:
+        # Получаем услуги, сгруппированные по категориям
+        services_by_category = await get_services_by_category(context.db_session)
+        message_text = render_order_catalog(services_by_category) if services_by_category else None
+        cached.update(
+            key=key,
+            text=message_text,
+            plain=message_text.replace('*', '').replace('_', '') if message_text else None,
+            markdown=True,
         )
 
+    if cached["text"] is None:
+        await update.message.reply_text("❌ В настоящее время нет доступных услуг.")
+        return
+
+    if cached["markdown"]:
+        try:
+            await update.message.reply_text(cached["text"], parse_mode="Markdown")
+            return
+        except BadRequest as e:
+            # Если возникла ошибка с Markdown, дальше отправляем без форматирования
+            print(f"[ERROR] Прайс-лист не прошёл разбор Markdown: {e}")
+            cached["markdown"] = False
+    await update.message.reply_text(cached["plain"], parse_mode=None)
+
 async def delete_client_handler(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
     await view_clients(update, context)
@@ -1489,11 +1464,7 @@ async def process_delete_client(update: Update, context: CallbackContext) -> Non
             user_states[chat_id]["client_id"] = client_id
 
             # Подтверждение удаления
-            keyboard = [
-                [InlineKeyboardButton("Да", callback_data="confirm_delete")],
-                [InlineKeyboardButton("Нет", callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.CONFIRM_DELETE
             await update.message.reply_text("Точно хотите удалить клиента?", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "confirm_delete_client"
@@ -1503,7 +1474,7 @@ async def process_delete_client(update: Update, context: CallbackContext) -> Non
     elif state["action"] == "confirm_delete_client":
         if update.callback_query.data == "confirm_delete":
             client_id = state["client_id"]
-            delete_client(client_id)
+            await delete_client(context.db_session, client_id)
             await update.message.reply_text(f"✅ Клиент с ID {client_id} удален.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1529,11 +1500,7 @@ async def process_delete_executor(update: Update, context: CallbackContext) -> N
             user_states[chat_id]["executor_id"] = executor_id
 
             # Подтверждение удаления
-            keyboard = [
-                [InlineKeyboardButton("Да", callback_data="confirm_delete")],
-                [InlineKeyboardButton("Нет", callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.CONFIRM_DELETE
             await update.message.reply_text("Точно хотите удалить исполнителя?", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "confirm_delete_executor"
@@ -1543,7 +1510,7 @@ async def process_delete_executor(update: Update, context: CallbackContext) -> N
     elif state["action"] == "confirm_delete_executor":
         if update.callback_query.data == "confirm_delete":
             executor_id = state["executor_id"]
-            delete_executor(executor_id)
+            await delete_executor(context.db_session, executor_id)
             await update.message.reply_text(f"✅ Исполнитель с ID {executor_id} удален.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1569,11 +1536,7 @@ async def process_delete_service(update: Update, context: CallbackContext) -> No
             user_states[chat_id]["service_id"] = service_id
 
             # Подтверждение удаления
-            keyboard = [
-                [InlineKeyboardButton("Да", callback_data="confirm_delete")],
-                [InlineKeyboardButton("Нет", callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.CONFIRM_DELETE
             await update.message.reply_text("Точно хотите удалить услугу?", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "confirm_delete_service"
@@ -1583,7 +1546,7 @@ async def process_delete_service(update: Update, context: CallbackContext) -> No
     elif state["action"] == "confirm_delete_service":
         if update.callback_query.data == "confirm_delete":
             service_id = state["service_id"]
-            delete_service(service_id)
+            await delete_service(context.db_session, service_id)
             await update.message.reply_text(f"✅ Услуга с ID {service_id} удалена.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1609,11 +1572,7 @@ async def process_delete_order(update: Update, context: CallbackContext) -> None
             user_states[chat_id]["order_id"] = order_id
 
             # Подтверждение удаления
-            keyboard = [
-                [InlineKeyboardButton("Да", callback_data="confirm_delete")],
-                [InlineKeyboardButton("Нет", callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.CONFIRM_DELETE
             await update.message.reply_text("Точно хотите удалить заказ?", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "confirm_delete_order"
@@ -1623,7 +1582,7 @@ async def process_delete_order(update: Update, context: CallbackContext) -> None
     elif state["action"] == "confirm_delete_order":
         if update.callback_query.data == "confirm_delete":
             order_id = state["order_id"]
-            delete_order(order_id)
+            await delete_order(context.db_session, order_id)
             await update.message.reply_text(f"✅ Заказ с ID {order_id} удален.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1664,11 +1623,7 @@ async def process_delete_service_from_order(update: Update, context: CallbackCon
             user_states[chat_id]["service_in_order_id"] = service_in_order_id
 
             # Подтверждение удаления
-            keyboard = [
-                [InlineKeyboardButton("Да", callback_data="confirm_delete")],
-                [InlineKeyboardButton("Нет", callback_data="cancel_delete")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.CONFIRM_DELETE
             await update.message.reply_text("Точно хотите удалить услугу из заказа?", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "confirm_delete_service_from_order"
@@ -1678,7 +1633,7 @@ async def process_delete_service_from_order(update: Update, context: CallbackCon
     elif state["action"] == "confirm_delete_service_from_order":
         if update.callback_query.data == "confirm_delete":
             service_in_order_id = state["service_in_order_id"]
-            delete_service_from_order(service_in_order_id)
+            await delete_service_from_order(context.db_session, service_in_order_id)
             await update.message.reply_text(f"✅ Услуга с ID {service_in_order_id} удалена из заказа.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1696,12 +1651,7 @@ async def process_edit_service(update: Update, context: CallbackContext, state:
             user_states[chat_id]["service_id"] = service_id
 
             # Предлагаем выбрать поле для изменения
-            keyboard = [
-                [InlineKeyboardButton("Изменить название", callback_data="edit_service_name")],
-                [InlineKeyboardButton("Изменить категорию", callback_data="edit_service_category")],
-                [InlineKeyboardButton("Изменить цену", callback_data="edit_service_price")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EDIT_SERVICE_FIELDS
             await update.message.reply_text("Выберите поле для изменения:", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "edit_service_field"
@@ -1713,7 +1663,7 @@ async def process_edit_service(update: Update, context: CallbackContext, state:
     if state["action"] == "edit_service_name":
             new_name = text
             service_id = state["service_id"]
-            if update_service_name(service_id, new_name):
+            if await update_service_name(context.db_session, service_id, new_name):
                 await update.message.reply_text(f"✅ Название услуги изменено на '{new_name}'.")
             else:
                 await update.message.reply_text("❌ Ошибка при изменении названия услуги.")
@@ -1725,7 +1675,7 @@ async def process_edit_service(update: Update, context: CallbackContext, state:
             try:
                 new_price = Decimal(text)
                 service_id = state["service_id"]
-                if update_service_price(service_id, new_price):
+                if await update_service_price(context.db_session, service_id, new_price):
                     await update.message.reply_text(f"✅ Цена услуги изменена на {new_price} USD.")
                 else:
                     await update.message.reply_text("❌ Ошибка при изменении цены услуги.")
@@ -1734,60 +1684,48 @@ async def process_edit_service(update: Update, context: CallbackContext, state:
                 await update.message.reply_text("❌ Ошибка: введите корректную цену.")
             return
 # Функции для работы с базой данных
-def get_all_services():
-    with SessionLocal() as session:
-        return session.query(Service).all()
-
-def get_all_executors():
-    with SessionLocal() as session:
-        return session.query(Executor).all()
-
-def get_all_orders():
-    with SessionLocal() as session:
-        return session.query(OrderRequest).all()
+async def get_all_services(session):
+    return await service_catalog.all(session)
 
-def get_all_clients():
-    with SessionLocal() as session:
-        return session.query(Client).all()
+async def get_all_orders(session):
+    return (await session.scalars(select(OrderRequest))).all()
 
-def get_services_in_order(order_id):
-    with SessionLocal() as session:
-        return session.query(OrderServices).filter(OrderServices.order_id == order_id).all()
+async def get_services_in_order(session, order_id):
+    return (await session.scalars(select(OrderServices).where(OrderServices.order_id == order_id))).all()
 
-def delete_service(service_id):
-    with SessionLocal() as session:
-        service = session.query(Service).filter(Service.id == service_id).first()
-        if service:
-            session.delete(service)
-            session.commit()
-
-def delete_client(client_id):
-    with SessionLocal() as session:
-        client = session.query(Client).filter(Client.id == client_id).first()
-        if client:
-            session.delete(client)
-            session.commit()
-
-def delete_executor(executor_id):
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.id == executor_id).first()
-        if executor:
-            session.delete(executor)
-            session.commit()
-
-def delete_order(order_id):
-    with SessionLocal() as session:
-        order = session.query(OrderRequest).filter(OrderRequest.id == order_id).first()
-        if order:
-            session.delete(order)
-            session.commit()
-
-def delete_service_from_order(service_in_order_id):
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            session.delete(service_in_order)
-            session.commit()
+async def delete_service(session, service_id):
+    service = await session.scalar(select(Service).where(Service.id == service_id))
+    if service:
+        await session.delete(service)
+        await session.flush()
+        service_catalog.invalidate_on_commit(session)
+
+async def delete_client(session, client_id):
+    client = await session.scalar(select(Client).where(Client.id == client_id))
+    if client:
+        await session.delete(client)
+        await session.flush()
+        invalidate_user_roles(role=ROLE_CLIENT, entity_id=client_id)
+
+async def delete_executor(session, executor_id):
+    executor = await session.scalar(select(Executor).where(Executor.id == executor_id))
+    if executor:
+        await session.delete(executor)
+        await session.flush()
+        invalidate_user_roles(role=ROLE_EXECUTOR, entity_id=executor_id)
+
+async def delete_order(session, order_id):
+    order = await session.scalar(select(OrderRequest).where(OrderRequest.id == order_id))
+    if order:
+        await session.delete(order)
+        await session.flush()
+
+async def delete_service_from_order(session, service_in_order_id):
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        await session.delete(service_in_order)
+        await session.flush()
+        await update_order_totals(session, service_in_order.order_id)
 
 async def confirm_delete_client(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -1796,7 +1734,7 @@ async def confirm_delete_client(update: Update, context: CallbackContext) -> Non
     if chat_id in user_states and user_states[chat_id]["action"] == "delete_client_id":
         if text == "Да":
             client_id = user_states[chat_id]["client_id"]
-            delete_client(client_id)
+            await delete_client(context.db_session, client_id)
             await update.message.reply_text(f"✅ Клиент с ID {client_id} удален.")
         else:
             await update.message.reply_text("❌ Удаление отменено.")
@@ -1806,10 +1744,15 @@ async def confirm_delete_client(update: Update, context: CallbackContext) -> Non
         
 async def button_callback(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
-    await query.answer()  # Обязательно подтверждаем нажатие
+    data = query.data
+    moderation_match = MODERATION_CALLBACK_RE.match(data)
+    digest_match = DIGEST_CALLBACK_RE.match(data)
+    if not moderation_match and not digest_match:
+        # Кнопки модерации подтверждаются после захвата сообщения: проигравшему нужен alert
+        await query.answer()  # Обязательно подтверждаем нажатие
 
     chat_id = query.message.chat_id
-    data = query.data
+    session = context.db_session
     print(f"[DEBUG] Получен callback_data: {data}")
 
     if data == "cancel_action":
@@ -1819,103 +1762,87 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         await start(update, context)
         return
 
+    # Листание админских списков
+    page_match = PAGE_CALLBACK_RE.match(data)
+    if page_match:
+        if query.from_user.username not in SPECIAL_USERS:
+            await query.message.reply_text("🚫 У вас нет доступа к этой команде.")
+            return
+        view, direction, cursor = page_match.groups()
+        await PAGE_VIEWS[view](update, context, parse_page_cursor(cursor), direction)
+        return
+
+    # Кнопки сводки модерации
+    if digest_match:
+        await handle_digest_callback(update, context, digest_match)
+        return
+
     # Сначала проверяем кнопки модерации
-    if data.startswith(('approve_', 'edit_', 'delete_')):
+    if moderation_match:
         try:
-            action, receiver_telegram_id, message_id = data.split('_', 2)
+            action, receiver_telegram_id, message_id = moderation_match.groups()
             receiver_telegram_id = int(receiver_telegram_id)
             
             print(f"[MODERATION] Обработка: {action} для сообщения {message_id}")
 
-            with SessionLocal() as session:
-                # Явный запрос с commit/rollback
-                try:
-                    db_message = session.query(MessageModeration)\
-                        .filter(MessageModeration.message_id == message_id)\
-                        .first()
-
-                    if not db_message:
-                        print(f"[ERROR] Сообщение {message_id} не найдено в БД")
-                        await query.edit_message_text(text="❌ Сообщение не найдено")
-                        return
-
-                    if db_message.processed:
-                        print(f"[WARN] Сообщение {message_id} уже обработано")
-                        await query.answer("Это сообщение уже обработано", show_alert=True)
-                        return
-
-                    # Обновляем сообщение
-                    db_message.processed = True
-                    if not db_message.moderator_messages:
-                        db_message.moderator_messages = []
-                    
-                    db_message.moderator_messages.append({
-                        'action': action,
-                        'moderator_id': chat_id,
-                        'timestamp': datetime.now().isoformat()
-                    })
-
-                    session.commit()
-                    print(f"[DEBUG] Сообщение {message_id} помечено как обработанное")
-
-                    # Обработка действий
-                    if action == 'approve':
-                        try:
-                            # Получаем дополнительные данные для оформления
-                            with SessionLocal() as session:
-                                service = session.query(OrderServices).options(
-                                    joinedload(OrderServices.service),
-                                    joinedload(OrderServices.order)
-                                ).filter(OrderServices.id == db_message.service_id).first()
-
-                            if service:
-                                order_id = service.order_id if service.order else "N/A"
-                                service_name = service.service.name if service.service else "Неизвестная услуга"
-            
-                                # Форматируем сообщение в красивый вид
-                                formatted_message = (
-                                    f"📨 *Новое сообщение:*\n\n"
-                                    f"📋 *Заказ:* №{order_id}\n"
-                                    f"📦 *Услуга:* {service_name}\n\n"
-                                    f"💬 *Текст сообщения:*\n{db_message.message_text}"
-                                )
-                            else:
-                                formatted_message = db_message.message_text  # fallback, если не нашли данные
-
-                            # Отправляем оформленное сообщение
-                            await context.bot.send_message(
-                                chat_id=receiver_telegram_id,
-                                text=formatted_message,
-                                parse_mode="Markdown"  # Включаем Markdown для форматирования
-                            )
-        
-                            await query.edit_message_text("✅ Сообщение отправлено")
-                            print(f"[DEBUG] Сообщение отправлено пользователю {receiver_telegram_id}")
-                        except Exception as e:
-                            print(f"[ERROR] Ошибка отправки: {str(e)}")
-                            await query.edit_message_text("❌ Не удалось отправить сообщение")
-                    elif action == 'delete':
-                        await query.edit_message_text("❌ Сообщение удалено")
-
-                    elif action == 'edit':
-                        context.user_data['edit_message'] = {
-                            'message_id': message_id,
-                            'receiver_telegram_id': receiver_telegram_id,
-                            'service_id': db_message.service_id,
-                            'original_text': db_message.message_text
-                        }
-                        await query.edit_message_text("✏️ Введите новый текст:")
-
-                    # Удаляем кнопки
+            try:
+                async with session.begin_nested():
+                    db_message = await claim_moderation_message(session, message_id, action, chat_id)
+
+                if not db_message:
+                    # Сообщение уже забрал другой менеджер (или его нет в БД)
+                    print(f"[WARN] Сообщение {message_id} уже обработано")
+                    await query.answer("Это сообщение уже обработано", show_alert=True)
+                    return
+
+                # Фиксируем захват сразу, чтобы не держать блокировку строки,
+                # пока отправляем сообщения в Telegram
+                await session.commit()
+                await query.answer()
+                print(f"[DEBUG] Сообщение {message_id} помечено как обработанное")
+
+                # Снимаем кнопки у остальных менеджеров в фоне, не задерживая нажавшего
+                context.application.create_task(
+                    retract_moderation_buttons(
+                        context.bot, db_message.moderator_messages, chat_id,
+                        f"☑️ Сообщение обработано менеджером @{query.from_user.username}: {MODERATION_ACTION_LABELS.get(action, action)}",
+                    ),
+                    update=update,
+                )
+
+                # Обработка действий
+                if action == 'approve':
                     try:
-                        await query.message.edit_reply_markup(reply_markup=None)
+                        # Получаем дополнительные данные для оформления
+                        services = await load_services_in_orders(session, [db_message.service_id])
+                        await deliver_approved_message(context.bot, receiver_telegram_id, db_message.message_text, services.get(db_message.service_id))
+                        await query.edit_message_text("✅ Сообщение отправлено")
+                        print(f"[DEBUG] Сообщение отправлено пользователю {receiver_telegram_id}")
                     except Exception as e:
-                        print(f"[WARN] Не удалось убрать кнопки: {str(e)}")
+                        print(f"[ERROR] Ошибка отправки: {str(e)}")
+                        await query.edit_message_text("❌ Не удалось отправить сообщение")
+                elif action == 'delete':
+                    await query.edit_message_text("❌ Сообщение удалено")
+
+                elif action == 'edit':
+                    context.user_data['edit_message'] = {
+                        'db_message_id': db_message.id,
+                        'message_id': message_id,
+                        'receiver_telegram_id': receiver_telegram_id,
+                        'service_id': db_message.service_id,
+                        'original_text': db_message.message_text
+                    }
+                    await query.edit_message_text("✏️ Введите новый текст:")
+
+                # Удаляем кнопки
+                try:
+                    await query.message.edit_reply_markup(reply_markup=None)
+                except Exception as e:
+                    print(f"[WARN] Не удалось убрать кнопки: {str(e)}")
 
-                except Exception as db_error:
-                    session.rollback()
-                    print(f"[DB ERROR] Ошибка БД: {str(db_error)}")
-                    await query.edit_message_text("❌ Ошибка базы данных")
+            except Exception as db_error:
+                print(f"[DB ERROR] Ошибка БД: {str(db_error)}")
+                await query.edit_message_text("❌ Ошибка базы данных")
 
         except Exception as e:
             print(f"[ERROR] Ошибка обработки: {str(e)}")
@@ -1930,7 +1857,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         if state["action"] == "confirm_delete_client":
             if data == "confirm_delete":
                 client_id = state["client_id"]
-                delete_client(client_id)
+                await delete_client(context.db_session, client_id)
                 await query.message.reply_text(f"✅ Клиент с ID {client_id} удален.")
             else:
                 await query.message.reply_text("❌ Удаление отменено.")
@@ -1939,7 +1866,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "confirm_delete_executor":
             if data == "confirm_delete":
                 executor_id = state["executor_id"]
-                delete_executor(executor_id)
+                await delete_executor(context.db_session, executor_id)
                 await query.message.reply_text(f"✅ Исполнитель с ID {executor_id} удален.")
             else:
                 await query.message.reply_text("❌ Удаление отменено.")
@@ -1948,7 +1875,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "confirm_delete_service":
             if data == "confirm_delete":
                 service_id = state["service_id"]
-                delete_service(service_id)
+                await delete_service(context.db_session, service_id)
                 await query.message.reply_text(f"✅ Услуга с ID {service_id} удалена.")
             else:
                 await query.message.reply_text("❌ Удаление отменено.")
@@ -1957,7 +1884,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "confirm_delete_order":
             if data == "confirm_delete":
                 order_id = state["order_id"]
-                delete_order(order_id)
+                await delete_order(context.db_session, order_id)
                 await query.message.reply_text(f"✅ Заказ с ID {order_id} удален.")
             else:
                 await query.message.reply_text("❌ Удаление отменено.")
@@ -1966,7 +1893,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "confirm_delete_service_from_order":
             if data == "confirm_delete":
                 service_in_order_id = state["service_in_order_id"]
-                delete_service_from_order(service_in_order_id)
+                await delete_service_from_order(context.db_session, service_in_order_id)
                 await query.message.reply_text(f"✅ Услуга с ID {service_in_order_id} удалена из заказа.")
             else:
                 await query.message.reply_text("❌ Удаление отменено.")
@@ -1978,12 +1905,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             user_states[chat_id]["category"] = category
 
             # Показываем кнопки выбора сложности
-            keyboard = [
-                [InlineKeyboardButton("Лёгкая", callback_data="difficulty_1")],
-                [InlineKeyboardButton("Средняя", callback_data="difficulty_2")],
-                [InlineKeyboardButton("Сложная", callback_data="difficulty_3")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EXECUTOR_DIFFICULTY
             await query.message.reply_text("Выберите сложность:", reply_markup=reply_markup)
 
             user_states[chat_id]["action"] = "add_executor_difficulty"
@@ -1996,7 +1918,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             category = user_states[chat_id]["category"]
 
             try:
-                executor_id = create_executor(username, category, difficulty_level)
+                executor_id = await create_executor(context.db_session, username, category, difficulty_level)
                 if executor_id:
                     await query.message.reply_text(f"✅ Исполнитель {username} зарегистрирован!")
                 else:
@@ -2027,7 +1949,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 name = user_states[chat_id]["name"]
                 category = user_states[chat_id]["category"]
 
-                service_id = create_service(name, category, min_price)
+                service_id = await create_service(context.db_session, name, category, min_price)
                 if service_id:
                     await query.message.reply_text(f"✅ Услуга '{name}' добавлена в категорию '{category}' с ID {service_id}")
                 else:
@@ -2040,13 +1962,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         # Обработка изменения категории
         if state["action"] == "edit_service_field" and data == "edit_service_category":
             # Показываем кнопки с категориями
-            keyboard = [
-                [InlineKeyboardButton("Montage", callback_data="edit_service_category_Montage")],
-                [InlineKeyboardButton("Design", callback_data="edit_service_category_Design")],
-                [InlineKeyboardButton("IT", callback_data="edit_service_category_IT")],
-                [InlineKeyboardButton("Record", callback_data="edit_service_category_Record")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EDIT_SERVICE_CATEGORY
             await query.message.reply_text("Выберите новую категорию:", reply_markup=reply_markup)
             user_states[chat_id]["action"] = "edit_service_category_"
             return
@@ -2064,7 +1980,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             service_id = state["service_id"]
 
             # Обновляем категорию в базе данных
-            if update_service_category(service_id, new_category):
+            if await update_service_category(context.db_session, service_id, new_category):
                 await query.message.reply_text(f"✅ Категория услуги изменена на '{new_category}'.")
             else:
                 await query.message.reply_text("❌ Ошибка при изменении категории услуги.")
@@ -2079,22 +1995,11 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 await query.message.reply_text("Введите новый username исполнителя:")
                 user_states[chat_id]["action"] = "edit_executor_username"
             elif data == "edit_executor_category":
-                keyboard = [
-                    [InlineKeyboardButton("Montage", callback_data="edit_executor_category_Montage")],
-                    [InlineKeyboardButton("Design", callback_data="edit_executor_category_Design")],
-                    [InlineKeyboardButton("IT", callback_data="edit_executor_category_IT")],
-                    [InlineKeyboardButton("Record", callback_data="edit_executor_category_Record")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.EDIT_EXECUTOR_CATEGORY
                 await query.message.reply_text("Выберите новую категорию:", reply_markup=reply_markup)
                 user_states[chat_id]["action"] = "edit_executor_category_"
             elif data == "edit_executor_difficulty":
-                keyboard = [
-                    [InlineKeyboardButton("Лёгкая", callback_data="edit_executor_difficulty_1")],
-                    [InlineKeyboardButton("Средняя", callback_data="edit_executor_difficulty_2")],
-                    [InlineKeyboardButton("Сложная", callback_data="edit_executor_difficulty_3")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.EDIT_EXECUTOR_DIFFICULTY
                 await query.message.reply_text("Выберите новую сложность:", reply_markup=reply_markup)
                 user_states[chat_id]["action"] = "edit_executor_difficulty_"
 
@@ -2102,7 +2007,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "edit_executor_category_":
             new_category = data.split("_")[-1]
             executor_id = state["executor_id"]
-            if update_executor_category(executor_id, new_category):
+            if await update_executor_category(context.db_session, executor_id, new_category):
                 await query.message.reply_text(f"✅ Категория исполнителя изменена на '{new_category}'")
             else:
                 await query.message.reply_text("❌ Ошибка при изменении категории исполнителя.")
@@ -2112,7 +2017,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         elif state["action"] == "edit_executor_difficulty_":
             new_difficulty = int(data.split("_")[-1])
             executor_id = state["executor_id"]
-            if update_executor_difficulty(executor_id, new_difficulty):
+            if await update_executor_difficulty(context.db_session, executor_id, new_difficulty):
                 await query.message.reply_text(f"✅ Сложность исполнителя изменена на {new_difficulty}")
             else:
                 await query.message.reply_text("❌ Ошибка при изменении сложности исполнителя.")
@@ -2127,13 +2032,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 await query.message.reply_text("Введите новое время завершения (например, '2 дня', '1 неделя', '2023-12-31 18:00'):")
                 user_states[chat_id]["action"] = "edit_order_completion"
             elif data == "edit_order_status":
-                keyboard = [
-                    [InlineKeyboardButton("В обработке", callback_data="edit_order_status_processing")],
-                    [InlineKeyboardButton("Выполняется", callback_data="edit_order_status_in_progress")],
-                    [InlineKeyboardButton("Ожидание правок", callback_data="edit_order_status_waiting")],
-                    [InlineKeyboardButton("Завершён", callback_data="edit_order_status_completed")]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.EDIT_ORDER_STATUS
                 await query.message.reply_text("Выберите новый статус:", reply_markup=reply_markup)
                 user_states[chat_id]["action"] = "edit_order_status_"
 
@@ -2147,7 +2046,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             }
             new_status = status_map[data.split("_")[-1]]
             order_id = state["order_id"]
-            if update_order_status(order_id, new_status):
+            if await update_order_status(context.db_session, order_id, new_status):
                 await query.message.reply_text(f"✅ Статус заказа изменен на '{new_status}'")
             else:
                 await query.message.reply_text("❌ Ошибка при изменении статуса заказа.")
@@ -2173,13 +2072,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                 await query.message.reply_text('Введите новую дату завершения (например, "2 дня", "1 неделя", "2023-12-31 18:00"):')
                 user_states[chat_id]['action'] = 'edit_service_in_order_completion'
             elif data == 'edit_service_in_order_status':
-                keyboard = [
-                    [InlineKeyboardButton('В обработке', callback_data='edit_service_in_order_status_processing')],
-                    [InlineKeyboardButton('Выполняется', callback_data='edit_service_in_order_status_in_progress')],
-                    [InlineKeyboardButton('Ожидание правок', callback_data='edit_service_in_order_status_waiting')],
-                    [InlineKeyboardButton('Завершён', callback_data='edit_service_in_order_status_completed')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
+                reply_markup = keyboards.EDIT_SERVICE_IN_ORDER_STATUS
                 await query.message.reply_text('Выберите новый статус:', reply_markup=reply_markup)
                 user_states[chat_id]['action'] = 'edit_service_in_order_status_'
 
@@ -2194,7 +2087,7 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
             }
             new_status = status_map[data.split("_")[-1]]
             service_id = state["service_id"]
-            if update_service_in_order_status(service_id, new_status):
+            if await update_service_in_order_status(context.db_session, service_id, new_status):
                 await query.message.reply_text(f"✅ Статус услуги изменен на '{new_status}'")
             else:
                 await query.message.reply_text("❌ Ошибка при изменении статуса услуги.")
@@ -2207,34 +2100,34 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
                     service_id = state["service_id"]
                     message_text = state["message"]
                     sender_username = update.effective_user.username
-                    client_username = get_client_username_by_service(service_id)
-
-                    with SessionLocal() as session:
-                        service = session.query(OrderServices).options(joinedload(OrderServices.order)).filter(OrderServices.id == service_id).first()
-                        if service and service.order and service.order.client:
-                            client_telegram_id = service.order.client.telegram_id
-                            moderation_entry = MessageModeration(
-                                message_id=str(uuid.uuid4()),
-                                message_text=message_text,
-                                receiver_telegram_id=client_telegram_id,
-                                receiver_username=client_username,
-                                receiver_type="client",
-                                sender_username=sender_username,
-                                service_id=service_id,
-                                created_at=datetime.now(),
-                                processed=False,
-                            )
-                            session.add(moderation_entry)
-                            session.commit()
-
-                            if is_suspicious(message_text):
-                                await send_to_manager(update, context, message_text, client_username, "client")
-                                await query.message.reply_text("🔎 Сообщение отправлено на проверку менеджеру.")
-                            else:
-                                await send_message(context, client_telegram_id, message_text)
-                                await query.message.reply_text("✅ Сообщение отправлено клиенту.")
+                    client_username = await get_client_username_by_service(context.db_session, service_id)
+
+                    service = await session.scalar(select(OrderServices).options(joinedload(OrderServices.order).joinedload(OrderRequest.client)).where(OrderServices.id == service_id))
+                    if service and service.order and service.order.client:
+                        client_telegram_id = service.order.client.telegram_id
+                        moderation_entry = MessageModeration(
+                            message_id=str(uuid.uuid4()),
+                            message_text=message_text,
+                            receiver_telegram_id=client_telegram_id,
+                            receiver_username=client_username,
+                            receiver_type="client",
+                            sender_username=sender_username,
+                            service_id=service_id,
+                            created_at=datetime.now(),
+                            processed=False,
+                        )
+                        session.add(moderation_entry)
+                        await session.flush()
+
+                        verdict = moderate(message_text)
+                        if verdict.suspicious:
+                            await send_to_manager(update, context, message_text, client_telegram_id, client_username, "client", service_id, verdict=verdict)
+                            await query.message.reply_text("🔎 Сообщение отправлено на проверку менеджеру.")
                         else:
-                            await query.message.reply_text("❌ Не удалось найти клиента.")
+                            await send_message(context, client_telegram_id, message_text)
+                            await query.message.reply_text("✅ Сообщение отправлено клиенту.")
+                    else:
+                        await query.message.reply_text("❌ Не удалось найти клиента.")
                 except Exception as e:
                     await query.message.reply_text(f"❌ Ошибка при отправке сообщения: {e}")
             else:
@@ -2250,47 +2143,47 @@ async def handle_edited_message(update: Update, context: CallbackContext):
     edit_data = context.user_data['edit_message']
     new_text = update.message.text
     
-    with SessionLocal() as session:
-        # Обновляем сообщение в базе данных
-        db_message = session.query(MessageModeration).get(edit_data['db_message_id'])
-        if db_message:
-            # Обновляем текст сообщения
-            db_message.message_text = new_text
+    session = context.db_session
+    # Обновляем сообщение в базе данных
+    db_message = await session.get(MessageModeration, edit_data['db_message_id'])
+    if db_message:
+        # Обновляем текст сообщения
+        db_message.message_text = new_text
             
-            # Добавляем запись о редактировании
-            if db_message.moderator_messages is None:
-                db_message.moderator_messages = []
+        # Добавляем запись о редактировании
+        if db_message.moderator_messages is None:
+            db_message.moderator_messages = []
                 
-            db_message.moderator_messages.append({
-                'action': 'edited',
-                'new_text': new_text,
-                'timestamp': datetime.now().isoformat(),
-                'moderator_id': update.effective_user.id
-            })
+        db_message.moderator_messages.append({
+            'action': 'edited',
+            'new_text': new_text,
+            'timestamp': datetime.now().isoformat(),
+            'moderator_id': update.effective_user.id
+        })
             
-            session.commit()
+        await session.flush()
             
-            # Отправляем новую версию получателю
+        # Отправляем новую версию получателю
+        try:
+            await context.bot.send_message(
+                chat_id=edit_data['receiver_telegram_id'],
+                text=new_text
+            )
+                
+            # Удаляем сообщение с кнопками у модератора
             try:
-                await context.bot.send_message(
-                    chat_id=edit_data['receiver_telegram_id'],
-                    text=new_text
+                await context.bot.delete_message(
+                    chat_id=edit_data['moderator_chat_id'],
+                    message_id=edit_data['moderator_message_id']
                 )
-                
-                # Удаляем сообщение с кнопками у модератора
-                try:
-                    await context.bot.delete_message(
-                        chat_id=edit_data['moderator_chat_id'],
-                        message_id=edit_data['moderator_message_id']
-                    )
-                except Exception as e:
-                    print(f"[ERROR] Ошибка при удалении сообщения модератора: {e}")
-                
-                await update.message.reply_text("✅ Сообщение отредактировано и отправлено.")
             except Exception as e:
-                await update.message.reply_text(f"❌ Не удалось отправить сообщение: {e}")
+                print(f"[ERROR] Ошибка при удалении сообщения модератора: {e}")
+                
+            await update.message.reply_text("✅ Сообщение отредактировано и отправлено.")
+        except Exception as e:
+            await update.message.reply_text(f"❌ Не удалось отправить сообщение: {e}")
         
-        del context.user_data['edit_message']
+    del context.user_data['edit_message']
 
 async def process_edit_executor(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -2306,12 +2199,7 @@ async def process_edit_executor(update: Update, context: CallbackContext) -> Non
             executor_id = int(text)
             user_states[chat_id]['executor_id'] = executor_id
 
-            keyboard = [
-                [InlineKeyboardButton('Изменить username', callback_data='edit_executor_username')],
-                [InlineKeyboardButton('Изменить категорию', callback_data='edit_executor_category')],
-                [InlineKeyboardButton('Изменить сложность', callback_data='edit_executor_difficulty')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EDIT_EXECUTOR_FIELDS
             await update.message.reply_text('Выберите, что хотите изменить:', reply_markup=reply_markup)
             user_states[chat_id]['action'] = 'edit_executor_field'
         except ValueError:
@@ -2320,7 +2208,7 @@ async def process_edit_executor(update: Update, context: CallbackContext) -> Non
     elif state['action'] == 'edit_executor_username':
         executor_id = state['executor_id']
         new_username = text
-        if update_executor_username(executor_id, new_username):
+        if await update_executor_username(context.db_session, executor_id, new_username):
             await update.message.reply_text(f'✅ Username исполнителя изменен на {new_username}')
         else:
             await update.message.reply_text('❌ Ошибка при изменении username исполнителя')
@@ -2331,7 +2219,7 @@ async def process_edit_executor(update: Update, context: CallbackContext) -> Non
         try:
             new_difficulty = int(text)
             if 1 <= new_difficulty <= 3:
-                if update_executor_difficulty(executor_id, new_difficulty):
+                if await update_executor_difficulty(context.db_session, executor_id, new_difficulty):
                     await update.message.reply_text(f'✅ Сложность исполнителя изменена на {new_difficulty}')
                 else:
                     await update.message.reply_text('❌ Ошибка при изменении сложности исполнителя')
@@ -2341,33 +2229,31 @@ async def process_edit_executor(update: Update, context: CallbackContext) -> Non
         except ValueError:
             await update.message.reply_text('❌ Введите корректное число от 1 до 3')
 
-def update_executor_username(executor_id: int, new_username: str) -> bool:
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.id == executor_id).first()
-        if executor:
-            executor.telegram_username = new_username
-            executor.login = new_username
-            session.commit()
-            return True
-        return False
+async def update_executor_username(session, executor_id: int, new_username: str) -> bool:
+    executor = await session.scalar(select(Executor).where(Executor.id == executor_id))
+    if executor:
+        executor.telegram_username = new_username
+        executor.login = new_username
+        await session.flush()
+        invalidate_user_roles(username=new_username, role=ROLE_EXECUTOR, entity_id=executor_id)
+        return True
+    return False
 
-def update_executor_category(executor_id: int, new_category: str) -> bool:
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.id == executor_id).first()
-        if executor:
-            executor.category = new_category
-            session.commit()
-            return True
-        return False
+async def update_executor_category(session, executor_id: int, new_category: str) -> bool:
+    executor = await session.scalar(select(Executor).where(Executor.id == executor_id))
+    if executor:
+        executor.category = new_category
+        await session.flush()
+        return True
+    return False
 
-def update_executor_difficulty(executor_id: int, new_difficulty: int) -> bool:
-    with SessionLocal() as session:
-        executor = session.query(Executor).filter(Executor.id == executor_id).first()
-        if executor:
-            executor.difficulty_level = new_difficulty
-            session.commit()
-            return True
-        return False
+async def update_executor_difficulty(session, executor_id: int, new_difficulty: int) -> bool:
+    executor = await session.scalar(select(Executor).where(Executor.id == executor_id))
+    if executor:
+        executor.difficulty_level = new_difficulty
+        await session.flush()
+        return True
+    return False
 
 # Функции для изменения заказа
 async def edit_order_handler(update: Update, context: CallbackContext) -> None:
@@ -2390,12 +2276,7 @@ async def process_edit_order(update: Update, context: CallbackContext) -> None:
             order_id = int(text)
             user_states[chat_id]['order_id'] = order_id
 
-            keyboard = [
-                [InlineKeyboardButton('Изменить клиента', callback_data='edit_order_client')],
-                [InlineKeyboardButton('Изменить время завершения', callback_data='edit_order_completion')],
-                [InlineKeyboardButton('Изменить статус', callback_data='edit_order_status')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EDIT_ORDER_FIELDS
             await update.message.reply_text('Выберите, что хотите изменить:', reply_markup=reply_markup)
             user_states[chat_id]['action'] = 'edit_order_field'
         except ValueError:
@@ -2404,7 +2285,7 @@ async def process_edit_order(update: Update, context: CallbackContext) -> None:
     elif state['action'] == 'edit_order_client':
         order_id = state['order_id']
         new_username = text
-        if update_order_client(order_id, new_username):
+        if await update_order_client(context.db_session, order_id, new_username):
             await update.message.reply_text(f'✅ Клиент заказа изменен на {new_username}')
         else:
             await update.message.reply_text('❌ Ошибка при изменении клиента заказа')
@@ -2433,7 +2314,7 @@ async def process_edit_order(update: Update, context: CallbackContext) -> None:
             else:
                 estimated_completion = datetime.strptime(time_input, '%Y-%m-%d %H:%M') + moscow_offset
 
-            if update_order_completion(order_id, estimated_completion):
+            if await update_order_completion(context.db_session, order_id, estimated_completion):
                 await update.message.reply_text(f"✅ Время завершения заказа изменено на {estimated_completion.strftime('%d.%m.%y %H:%M')}")
             else:
                 await update.message.reply_text('❌ Ошибка при изменении времени завершения заказа')
@@ -2441,36 +2322,33 @@ async def process_edit_order(update: Update, context: CallbackContext) -> None:
         except ValueError:
             await update.message.reply_text('❌ Ошибка в формате. Введите количество дней/недель/месяцев или дату (ГГГГ-ММ-ДД ЧЧ:ММ):')
 
-def update_order_client(order_id: int, new_username: str) -> bool:
-    with SessionLocal() as session:
-        client = session.query(Client).filter(Client.telegram_username == new_username).first()
-        if not client:
-            return False
-        
-        order = session.query(OrderRequest).filter(OrderRequest.id == order_id).first()
-        if order:
-            order.client_id = client.id
-            session.commit()
-            return True
+async def update_order_client(session, order_id: int, new_username: str) -> bool:
+    client = await session.scalar(select(Client).where(Client.telegram_username == new_username))
+    if not client:
         return False
+        
+    order = await session.scalar(select(OrderRequest).where(OrderRequest.id == order_id))
+    if order:
+        order.client_id = client.id
+        await session.flush()
+        return True
+    return False
 
-def update_order_completion(order_id: int, new_completion: datetime) -> bool:
-    with SessionLocal() as session:
-        order = session.query(OrderRequest).filter(OrderRequest.id == order_id).first()
-        if order:
-            order.estimated_completion = new_completion
-            session.commit()
-            return True
-        return False
+async def update_order_completion(session, order_id: int, new_completion: datetime) -> bool:
+    order = await session.scalar(select(OrderRequest).where(OrderRequest.id == order_id))
+    if order:
+        order.estimated_completion = new_completion
+        await session.flush()
+        return True
+    return False
 
-def update_order_status(order_id: int, new_status: str) -> bool:
-    with SessionLocal() as session:
-        order = session.query(OrderRequest).filter(OrderRequest.id == order_id).first()
-        if order:
-            order.status = new_status
-            session.commit()
-            return True
-        return False
+async def update_order_status(session, order_id: int, new_status: str) -> bool:
+    order = await session.scalar(select(OrderRequest).where(OrderRequest.id == order_id))
+    if order:
+        order.status = new_status
+        await session.flush()
+        return True
+    return False
 
 # Функции для изменения услуги в заказе
 async def edit_service_in_order_handler(update: Update, context: CallbackContext) -> None:
@@ -2503,15 +2381,7 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
             user_states[chat_id]["service_id"] = service_id
             
             # Показываем кнопки с вариантами изменения
-            keyboard = [
-                [InlineKeyboardButton("Изменить услугу", callback_data="edit_service_in_order_service")],
-                [InlineKeyboardButton("Изменить количество", callback_data="edit_service_in_order_quantity")],
-                [InlineKeyboardButton("Изменить цену", callback_data="edit_service_in_order_price")],
-                [InlineKeyboardButton("Изменить исполнителя", callback_data="edit_service_in_order_executor")],
-                [InlineKeyboardButton("Изменить дату завершения", callback_data="edit_service_in_order_completion")],
-                [InlineKeyboardButton("Изменить статус", callback_data="edit_service_in_order_status")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = keyboards.EDIT_SERVICE_IN_ORDER_FIELDS
             await update.message.reply_text("Выберите, что хотите изменить:", reply_markup=reply_markup)
             user_states[chat_id]["action"] = "edit_service_in_order_field"
         except ValueError:
@@ -2522,7 +2392,7 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
         try:
             new_service_id = int(text)
             service_id = state["service_id"]
-            if update_service_in_order_service(service_id, new_service_id):
+            if await update_service_in_order_service(context.db_session, service_id, new_service_id):
                 await update.message.reply_text("✅ Услуга успешно изменена.")
             else:
                 await update.message.reply_text("❌ Ошибка при изменении услуги.")
@@ -2535,7 +2405,7 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
         try:
             new_quantity = int(text)
             service_id = state["service_id"]
-            if update_service_in_order_quantity(service_id, new_quantity):
+            if await update_service_in_order_quantity(context.db_session, service_id, new_quantity):
                 await update.message.reply_text(f"✅ Количество изменено на {new_quantity}.")
             else:
                 await update.message.reply_text("❌ Ошибка при изменении количества.")
@@ -2548,7 +2418,7 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
         try:
             new_price = Decimal(text)
             service_id = state["service_id"]
-            if update_service_in_order_price(service_id, new_price):
+            if await update_service_in_order_price(context.db_session, service_id, new_price):
                 await update.message.reply_text(f"✅ Цена изменена на {new_price}.")
             else:
                 await update.message.reply_text("❌ Ошибка при изменении цены.")
@@ -2561,7 +2431,7 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
         try:
             new_executor_id = int(text)
             service_id = state["service_id"]
-            if update_service_in_order_executor(service_id, new_executor_id):
+            if await update_service_in_order_executor(context.db_session, service_id, new_executor_id):
                 await update.message.reply_text(f"✅ Исполнитель изменен.")
             else:
                 await update.message.reply_text("❌ Ошибка при изменении исполнителя.")
@@ -2570,59 +2440,55 @@ async def process_edit_service_in_order(update: Update, context: CallbackContext
             await update.message.reply_text("❌ Ошибка: введите корректный ID исполнителя.")
             return
 
-def update_service_in_order_service(service_in_order_id: int, new_service_id: int) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.service_id = new_service_id
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_service(session, service_in_order_id: int, new_service_id: int) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.service_id = new_service_id
+        await session.flush()
+        return True
+    return False
 
-def update_service_in_order_quantity(service_in_order_id: int, new_quantity: int) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.quantity = new_quantity
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_quantity(session, service_in_order_id: int, new_quantity: int) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.quantity = new_quantity
+        await session.flush()
+        return True
+    return False
 
-def update_service_in_order_price(service_in_order_id: int, new_price: Decimal) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.service_price = new_price
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_price(session, service_in_order_id: int, new_price: Decimal) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.service_price = new_price
+        await session.flush()
+        await update_order_totals(session, service_in_order.order_id)
+        return True
+    return False
 
-def update_service_in_order_executor(service_in_order_id: int, new_executor_id: int) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.executor_id = new_executor_id
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_executor(session, service_in_order_id: int, new_executor_id: int) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.executor_id = new_executor_id
+        await session.flush()
+        return True
+    return False
 
-def update_service_in_order_completion(service_in_order_id: int, new_completion: datetime) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.estimated_completion = new_completion
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_completion(session, service_in_order_id: int, new_completion: datetime) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.estimated_completion = new_completion
+        await session.flush()
+        await update_order_totals(session, service_in_order.order_id)
+        return True
+    return False
 
-def update_service_in_order_status(service_in_order_id: int, new_status: str) -> bool:
-    with SessionLocal() as session:
-        service_in_order = session.query(OrderServices).filter(OrderServices.id == service_in_order_id).first()
-        if service_in_order:
-            service_in_order.status = new_status
-            session.commit()
-            return True
-        return False
+async def update_service_in_order_status(session, service_in_order_id: int, new_status: str) -> bool:
+    service_in_order = await session.scalar(select(OrderServices).where(OrderServices.id == service_in_order_id))
+    if service_in_order:
+        service_in_order.status = new_status
+        await session.flush()
+        return True
+    return False
     
 async def send(update: Update, text: str, **kwargs) -> None:
     """Отправляет сообщение в зависимости от типа update"""
@@ -2631,45 +2497,108 @@ async def send(update: Update, text: str, **kwargs) -> None:
     elif update.callback_query:
         await update.callback_query.message.reply_text(text, **kwargs)
 
-async def view_clients(update: Update, context: CallbackContext) -> None:
-    clients = get_all_clients()
-    if not clients:
-        await update.message.reply_text("Нет зарегистрированных клиентов.")
+async def send_long(update: Update, text: str, reply_markup=None, **kwargs) -> None:
+    """Отправляет текст частями под лимит Telegram; клавиатура прикрепляется к последней части."""
+    chunks = chunk_message(text, markdown=kwargs.get("parse_mode") == "Markdown")
+    for number, chunk in enumerate(chunks, 1):
+        await send(update, chunk, reply_markup=reply_markup if number == len(chunks) else None, **kwargs)
+
+class Page(NamedTuple):
+    items: list
+    has_prev: bool
+    has_next: bool
+
+def page_cursor(keys) -> str:
+    """Курсор страницы для callback_data: значения ключа через двоеточие."""
+    return ":".join(str(key) for key in keys)
+
+def parse_page_cursor(cursor: str) -> tuple:
+    return tuple(int(part) for part in cursor.split(":"))
+
+async def fetch_page(session, query, key_columns, cursor: tuple = None, direction: str = "next", page_size: int = ADMIN_PAGE_SIZE) -> Page:
+    """
+    Keyset-пагинация: WHERE ключ > курсор ORDER BY ключ LIMIT n (или в обратную сторону для "prev").
+
+    Запрашивается на одну строку больше, чтобы понять, есть ли следующая страница.
+    :param key_columns: Уникальный ключ сортировки, например (OrderRequest.id,).
+    :param cursor: Ключ последней (next) или первой (prev) строки предыдущей страницы.
+    """
+    key = tuple_(*key_columns) if len(key_columns) > 1 else key_columns[0]
+    cursor_value = (tuple(cursor) if len(key_columns) > 1 else cursor[0]) if cursor else None
+    if direction == "prev":
+        if cursor_value is not None:
+            query = query.where(key < cursor_value)
+        query = query.order_by(*(column.desc() for column in key_columns))
+    else:
+        if cursor_value is not None:
+            query = query.where(key > cursor_value)
+        query = query.order_by(*key_columns)
+
+    rows = (await session.scalars(query.limit(page_size + 1))).unique().all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        return Page(list(reversed(rows)), has_more, True)
+    return Page(rows, cursor is not None, has_more)
+
+def page_keyboard(view: str, page: Page, key) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки «назад/вперёд» для страницы списка; key(item) возвращает кортеж ключа."""
+    buttons = []
+    if page.has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"page_{view}_prev_{page_cursor(key(page.items[0]))}"))
+    if page.has_next:
+        buttons.append(InlineKeyboardButton("Вперёд ➡️", callback_data=f"page_{view}_next_{page_cursor(key(page.items[-1]))}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def send_page(update: Update, text: str, reply_markup, **kwargs) -> None:
+    """Отправляет страницу списка; при листании редактирует исходное сообщение."""
+    query = update.callback_query
+    if query and query.data and query.data.startswith("page_"):
+        await query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+    else:
+        await send_long(update, text, reply_markup=reply_markup, **kwargs)
+
+async def view_clients(update: Update, context: CallbackContext, cursor: tuple = None, direction: str = "next") -> None:
+    page = await fetch_page(
+        context.db_session,
+        select(Client).where(Client.telegram_username.isnot(None)),
+        (Client.id,), cursor, direction
+    )
+    if not page.items:
+        await send(update, "Нет зарегистрированных клиентов.")
         return
 
     message_text = "📋 *Список клиентов:*\n\n"
     message_text += "```\n"  # Начинаем блок кода для моноширинного текста
     message_text += "| ID | Telegram username  |\n"
     message_text += "|----|--------------------|\n"
-    for client in clients:
-        if client.telegram_username is None:
-            continue
+    for client in page.items:
         message_text += f"| {client.id:2} | {client.telegram_username:18} |\n"
     message_text += "```"  # Закрываем блок кода
 
-    await send(update, message_text, parse_mode="Markdown")
+    await send_page(update, message_text, page_keyboard("clients", page, lambda client: (client.id,)), parse_mode="Markdown")
 
-async def view_executors(update: Update, context: CallbackContext) -> None:
-    executors = get_all_executors()
-    if not executors:
-        await update.message.reply_text("Нет зарегистрированных исполнителей.")
+async def view_executors(update: Update, context: CallbackContext, cursor: tuple = None, direction: str = "next") -> None:
+    page = await fetch_page(context.db_session, select(Executor), (Executor.id,), cursor, direction)
+    if not page.items:
+        await send(update, "Нет зарегистрированных исполнителей.")
         return
 
     message_text = "📋 *Список исполнителей:*\n\n"
     message_text += "```\n"
     message_text += "| ID | Telegram username | Категория       | Уровень сложности  |\n"
     message_text += "|----|-------------------|-----------------|--------------------|\n"
-    for executor in executors:
+    for executor in page.items:
         username = executor.telegram_username or "N/A"
         category = executor.category or "N/A"
         difficulty = executor.difficulty_level or "N/A"
         message_text += f"| {executor.id:2} | {username:17} | {category:15} | {difficulty:18} |\n"
     message_text += "```"
 
-    await send(update, message_text, parse_mode="Markdown")
+    await send_page(update, message_text, page_keyboard("executors", page, lambda executor: (executor.id,)), parse_mode="Markdown")
 
 async def view_services(update: Update, context: CallbackContext) -> None:
-    services = get_all_services()
+    services = await get_all_services(context.db_session)
     if not services:
         await update.message.reply_text("Нет доступных услуг.")
         return
@@ -2696,14 +2625,16 @@ async def view_services(update: Update, context: CallbackContext) -> None:
         )
     message_text += "```"  # Закрываем блок кода
 
-    await send(update, message_text, parse_mode="Markdown")
+    await send_long(update, message_text, parse_mode="Markdown")
 
-async def view_orders(update: Update, context: CallbackContext) -> None:
-    with SessionLocal() as session:
-        orders = session.query(OrderRequest).options(joinedload(OrderRequest.client)).order_by(OrderRequest.id).all()
-    
-    if not orders:
-        await update.message.reply_text("Нет активных заказов.")
+async def view_orders(update: Update, context: CallbackContext, cursor: tuple = None, direction: str = "next") -> None:
+    page = await fetch_page(
+        context.db_session,
+        select(OrderRequest).options(joinedload(OrderRequest.client)),
+        (OrderRequest.id,), cursor, direction
+    )
+    if not page.items:
+        await send(update, "Нет активных заказов.")
         return
 
     message_text = "📋 *Список заказов:*\n\n"
@@ -2711,7 +2642,7 @@ async def view_orders(update: Update, context: CallbackContext) -> None:
     message_text += "| ID |      Клиент      |  USD  |  RUB   |   BYN   |    Статус    | Дата создания  | Дата завершения |\n"
     message_text += "|----|------------------|-------|--------|---------|--------------|----------------|-----------------|\n"
     
-    for order in orders:
+    for order in page.items:
         # Handle possible None values
         client_username = order.client.telegram_username if order.client and order.client.telegram_username else "N/A"
         price = order.price if order.price is not None else "N/A"
@@ -2730,26 +2661,27 @@ async def view_orders(update: Update, context: CallbackContext) -> None:
         )
     
     message_text += "```"
-    await send(update, message_text, parse_mode="Markdown")
-
-async def view_services_in_orders(update: Update, context: CallbackContext) -> None:
-    with SessionLocal() as session:
-        services_in_order = (
-            session.query(OrderServices)
-            .join(OrderRequest, OrderRequest.id == OrderServices.order_id)
-            .join(Service, Service.id == OrderServices.service_id)
-            .options(joinedload(OrderServices.service), joinedload(OrderServices.executor))
-            .order_by(OrderServices.order_id)
-            .all()
-        )
-
-    if not services_in_order:
-        await update.message.reply_text("Нет услуг в заказах.")
+    await send_page(update, message_text, page_keyboard("orders", page, lambda order: (order.id,)), parse_mode="Markdown")
+
+async def view_services_in_orders(update: Update, context: CallbackContext, cursor: tuple = None, direction: str = "next") -> None:
+    # Ключ (order_id, id): услуги остаются сгруппированными по заказам
+    page = await fetch_page(
+        context.db_session,
+        select(OrderServices)
+        .join(OrderRequest, OrderRequest.id == OrderServices.order_id)
+        .join(Service, Service.id == OrderServices.service_id)
+        .options(joinedload(OrderServices.service), joinedload(OrderServices.executor)),
+        (OrderServices.order_id, OrderServices.id), cursor, direction,
+        # Карточка услуги занимает ~300 символов: страница должна уложиться в лимит Telegram (4096)
+        page_size=min(ADMIN_PAGE_SIZE, 10)
+    )
+    if not page.items:
+        await send(update, "Нет услуг в заказах.")
         return
 
     message_text = "📋 *Список услуг в заказах:*\n\n"
     
-    for service in services_in_order:
+    for service in page.items:
         # Получаем данные, обрабатывая возможные None значения
         service_name = service.service.name if service.service else "Неизвестная услуга"
         order_id = service.order_id
@@ -2776,37 +2708,35 @@ async def view_services_in_orders(update: Update, context: CallbackContext) -> N
             f"────────────────────\n"
         )
 
-    # Разбиваем сообщение на части, если оно слишком длинное
-    max_length = 4000  # Максимальная длина сообщения в Telegram
-    if len(message_text) > max_length:
-        parts = [message_text[i:i+max_length] for i in range(0, len(message_text), max_length)]
-        for part in parts:
-            await update.message.reply_text(part, parse_mode="Markdown")
-    else:
-        await update.message.reply_text(message_text, parse_mode="Markdown")
-
-    # Разбиваем сообщение на части, если оно слишком длинное
-    max_length = 4000  # Максимальная длина сообщения в Telegram
-    if len(message_text) > max_length:
-        parts = [message_text[i:i+max_length] for i in range(0, len(message_text), max_length)]
-        for part in parts:
-            await update.message.reply_text(part, parse_mode="Markdown")
-    else:
-        await update.message.reply_text(message_text, parse_mode="Markdown")
+    await send_page(
+        update, message_text,
+        page_keyboard("sio", page, lambda service: (service.order_id, service.id)),
+        parse_mode="Markdown"
+    )
 
 
+# Листаемые списки: page_{список}_{next|prev}_{курсор}
+PAGE_CALLBACK_RE = re.compile(r'^page_(clients|executors|orders|sio)_(next|prev)_(\d+(?::\d+)*)$')
+
+PAGE_VIEWS = {
+    "clients": view_clients,
+    "executors": view_executors,
+    "orders": view_orders,
+    "sio": view_services_in_orders,
+}
+
 async def view_services_in_order(update: Update, context: CallbackContext, order_id: int) -> None:
 
     #Выводит список услуг в конкретном заказе
-    with SessionLocal() as session:
-        services_in_order = (
-        session.query(OrderServices)
-        .join(OrderRequest, OrderRequest.id == OrderServices.order_id)  # Присоединяем заказы
-        .join(Service, Service.id == OrderServices.service_id)  # Присоединяем услуги
-        .options(joinedload(OrderServices.service), joinedload(OrderServices.executor))  # Загружаем связанные услуги и исполнителей
-        .order_by(OrderServices.order_id)  # Сортируем по заказу
-        .all()
-    )
+    session = context.db_session
+    services_in_order = (await session.scalars(
+    select(OrderServices)
+    .join(OrderRequest, OrderRequest.id == OrderServices.order_id)  # Присоединяем заказы
+    .join(Service, Service.id == OrderServices.service_id)  # Присоединяем услуги
+    .options(joinedload(OrderServices.service), joinedload(OrderServices.executor))  # Загружаем связанные услуги и исполнителей
+    .where(OrderServices.order_id == order_id)
+    .order_by(OrderServices.id)
+    )).all()
 
     if not services_in_order:
         await update.message.reply_text(f"Нет услуг в заказе с ID {order_id}.")
@@ -2841,240 +2771,236 @@ async def view_services_in_order(update: Update, context: CallbackContext, order
     message_text += "```"  # Закрываем блок кода
 
     # Отправляем сообщение в Telegram
-    await send(update, message_text, parse_mode="Markdown")
+    await send_long(update, message_text, parse_mode="Markdown")
 
-def update_service_name(service_id: int, new_name: str) -> bool:
-    with SessionLocal() as session:
-        service = session.query(Service).filter(Service.id == service_id).first()
-        if service:
-            service.name = new_name
-            session.commit()
-            return True
-        return False
+async def update_service_name(session, service_id: int, new_name: str) -> bool:
+    service = await session.scalar(select(Service).where(Service.id == service_id))
+    if service:
+        service.name = new_name
+        await session.flush()
+        service_catalog.invalidate_on_commit(session)
+        return True
+    return False
 
-def update_service_category(service_id: int, new_category: str) -> bool:
-    with SessionLocal() as session:
-        service = session.query(Service).filter(Service.id == service_id).first()
-        if service:
-            service.category = new_category
-            session.commit()
-            return True
-        return False
+async def update_service_category(session, service_id: int, new_category: str) -> bool:
+    service = await session.scalar(select(Service).where(Service.id == service_id))
+    if service:
+        service.category = new_category
+        await session.flush()
+        service_catalog.invalidate_on_commit(session)
+        return True
+    return False
 
-def update_service_price(service_id: int, new_price: Decimal) -> bool:
-    with SessionLocal() as session:
-        service = session.query(Service).filter(Service.id == service_id).first()
-        if service:
-            service.min_price = new_price
-            session.commit()
-            return True
-        return False
-# Проверяем, является ли сообщение подозрительным (фильтры добавим позже)
+async def update_service_price(session, service_id: int, new_price: Decimal) -> bool:
+    service = await session.scalar(select(Service).where(Service.id == service_id))
+    if service:
+        service.min_price = new_price
+        await session.flush()
+        service_catalog.invalidate_on_commit(session)
+        return True
+    return False
+# Проверяем, является ли сообщение подозрительным (правила — в moderation.ModerationEngine)
 def is_suspicious(message: str) -> bool:
-    russian_numbers_regex = re.compile(
-        r'\b(нол[ьяюеи]|один|одног[оа]|одним?|дв[ауе]|двух|двумя?|тр[иеяю]|трех|тремя?|'
-        r'четыр[еиьяю]|пят[иьяю]|шест[иьяю]|сем[иьяю]|восьм[иьяю]|девят[иьяю]|'
-        r'десят[иьяю]|сорок|сто|двести|триста|четыреста|пятьсот|'
-        r'тысяч[иауе]?|миллион[ауе]?)\b',
-        re.IGNORECASE
-    )
-    
-    has_russian_numbers = bool(russian_numbers_regex.search(message))
+    return moderation.get_engine().is_suspicious(message)
 
-    digit_count = sum(c.isdigit() for c in message)
-    has_too_many_digits = digit_count > 5
+def moderate(message: str) -> Verdict:
+    """Проверяет сообщение всеми правилами и учитывает срабатывания в metrics."""
+    return moderation.get_engine().classify(message, record_metrics=True)
+
+def classify_many(messages) -> list:
+    """Проверяет список сообщений; возвращает список Verdict в том же порядке (имена правил — Verdict.rules)."""
+    return moderation.get_engine().classify_many(messages)
 
-    forbidden_emojis = [
-        "0️⃣", "1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", 
-        "🔟"
-        ]
-    has_forbidden_emojis = any(emoji in message for emoji in forbidden_emojis)
-    # 1) Проверка на наличие английских букв
-    has_english_letters = bool(re.search(r'[a-zA-Z]', message))
-    
-    # 2) Проверка на наличие более 3 цифр подряд
-    has_long_digit_sequence = bool(re.search(r'\d{4,}', message))
-    
-    # 3) Проверка на наличие подозрительных символов
-    suspicious_symbols = ["@", "*", "_", "#", "$"]
-    has_suspicious_symbols = any(char in message for char in suspicious_symbols)
-    
-    # 4) Проверка на вложения (ссылки, изображения, файлы)
-    has_attachments = bool(re.search(r'http[s]?://|www\.', message, re.IGNORECASE))
-    
-    # 5) Проверка на ключевые слова (соцсети и мессенджеры)
-    suspicious_keywords = [
-    # Полные названия (разные регистры)
-    "тг", "ТГ", "TГ", "Tг", "тГ",
-    "вк", "ВК", "VK", "vk", "Vк", "vК",
-    "вайбер", "Вайбер", "Viber", "viber", "VIBER",
-    "ватсап", "Ватсап", "WhatsApp", "whatsapp", "WHATSAPP", "ватс ап", "ватс-ап",
-    "телеграм", "Телеграм", "Telegram", "telegram", "TELEGRAM", "тлг", "ТЛГ", "TLG",
-    "инстаграм", "Инстаграм", "Instagram", "instagram", "INSTAGRAM", "инста", "Инста", "insta", "Insta",
-    "viber", "Viber", "VIBER",
-    "whatsapp", "WhatsApp", "WHATSAPP",
-    "telegram", "Telegram", "TELEGRAM",
-    "instagram", "Instagram", "INSTAGRAM",
-    "vk", "VK", "vK", "Vk",
-    "tg", "TG", "tG", "Tg", "лс", "директ", "ссылка"
-    
-    # Альтернативные названия и сленг
-    "тeлeграм", "т3л3грам", "тележка", "телега", "тлг", "тлгрм", "тг-канал", "тг канал",
-    "инст", "инстик", "инсту", "инстик", "инстаграмм", "инстаграмчик",
-    "вацап", "вотсап", "вотс ап", "вац ап", "watsapp", "watsap", "watsup",
-    "вайберчик", "вайберуха", "вайб", "вайбера",
-    "вконтакте", "в контакте", "вкнтакте", "вкнт", "вк-страница", "вк страница",
-    
-    # Попытки обхода (с пробелами, точками, спецсимволами)
-    "т г", "в к", "v k", "t g",
-    "т.г", "в.к", "v.k", "t.g",
-    "т_г", "в_к", "v_k", "t_g",
-    "т-г", "в-к", "v-k", "t-g",
-    "тг.", "вк.", "vk.", "tg.",
-    
-    # Другие соцсети и мессенджеры
-    "facebook", "Facebook", "FACEBOOK", "фейсбук", "Фейсбук", "фб", "ФБ", "fb", "FB",
-    "twitter", "Twitter", "TWITTER", "твиттер", "Твиттер", "твт", "ТВТ", "twt", "TWT",
-    "tiktok", "TikTok", "TIKTOK", "тикток", "ТикТок", "тик-ток", "tt", "TT",
-    "linkedin", "LinkedIn", "LINKEDIN", "линкедин", "Линкедин", "линк", "Линк",
-    "discord", "Discord", "DISCORD", "дискорд", "Дискорд", "дис", "Дис", "dc", "DC",
-    "signal", "Signal", "SIGNAL", "сигнал", "Сигнал", "sg", "SG",
-    "snapchat", "Snapchat", "SNAPCHAT", "снэпчат", "Снэпчат", "снап", "Снап", "sc", "SC",
-    "reddit", "Reddit", "REDDIT", "реддит", "Реддит", "рдт", "РДТ", "rdt", "RDT",
-    "twitch", "Twitch", "TWITCH", "твич", "Твич", "твч", "ТВЧ", "tvch", "TVCH",
-    "youtube", "YouTube", "YOUTUBE", "ютуб", "Ютуб", "ют", "ЮТ", "yt", "YT",
-    "pinterest", "Pinterest", "PINTEREST", "пинтерест", "Пинтерест", "пин", "Пин", "pt", "PT",
-    "onlyfans", "OnlyFans", "ONLYFANS", "онлифанс", "Онлифанс", "оф", "ОФ", "of", "OF",
-    "tinder", "Tinder", "TINDER", "тиндер", "Тиндер", "тинд", "Тинд", "tdr", "TDR",
-    "zoom", "Zoom", "ZOOM", "зум", "Зум", "зм", "ЗМ", "zm", "ZM",
-    "slack", "Slack", "SLACK", "слак", "Слак", "слк", "СЛК", "slk", "SLK",
-    "skype", "Skype", "SKYPE", "скайп", "Скайп", "ск", "СК", "sk", "SK",
-    
-    # Кибер-сленг и эмодзи
-    "дотуп", "дотупь", "дотyп", "дотyпь", "пиши в", "напиши в", "добавь в", "кинь ссылку",
-    "✉️", "📱", "📲", "🔗", "📧", "💬", "📨", "📩", "👾", "🤖", "🖇️", "📎", "📌", "📍", "📞", "📟", "📠", "🔌", "📡",
-    "пиши в лс", "напиши в лс", "добавь в лс", "кинь ссылку в лс", "контакты в лс", "контакт в лс",
-    ]
-    has_suspicious_keywords = any(keyword.lower() in message.lower() for keyword in suspicious_keywords)
-    
-    # Сообщение считается подозрительным, если выполняется хотя бы одно из условий
-    return (
-        has_russian_numbers or
-        has_too_many_digits or
-        has_english_letters or
-        has_long_digit_sequence or
-        has_suspicious_symbols or
-        has_attachments or
-        has_suspicious_keywords or
-        has_forbidden_emojis
-    )
 # Получаем ID исполнителя по ID услуги
-def get_executor_id_by_service(service_id: int):
-    with SessionLocal() as session:
-        service = session.query(OrderServices).filter(OrderServices.id == service_id).first()
-        if service and service.executor:
-            return service.executor.telegram_id
+async def get_executor_id_by_service(session, service_id: int):
+    service = await session.scalar(select(OrderServices).options(joinedload(OrderServices.executor)).where(OrderServices.id == service_id))
+    if service and service.executor:
+        return service.executor.telegram_id
     return None
 
-def get_executor_username_by_service(service_id: int):
-    with SessionLocal() as session:
-        service = session.query(OrderServices).options(joinedload(OrderServices.executor)).filter(OrderServices.id == service_id).first()
-        if service and service.executor:
-            return service.executor.telegram_username
+async def get_executor_username_by_service(session, service_id: int):
+    service = await session.scalar(select(OrderServices).options(joinedload(OrderServices.executor)).where(OrderServices.id == service_id))
+    if service and service.executor:
+        return service.executor.telegram_username
     return None
 
-def get_client_id_by_service(service_id: int):
-    with SessionLocal() as session:
-        # Ищем услугу по ID и загружаем связанный заказ и клиента
-        service = (
-            session.query(OrderServices)
-            .options(joinedload(OrderServices.order).joinedload(OrderRequest.client))
-            .filter(OrderServices.id == service_id)
-            .first()
-        )
-        if service and service.order and service.order.client:
-            return service.order.client.id  # Возвращаем ID клиента
+async def get_client_id_by_service(session, service_id: int):
+    # Ищем услугу по ID и загружаем связанный заказ и клиента
+    service = await session.scalar(
+        select(OrderServices)
+        .options(joinedload(OrderServices.order).joinedload(OrderRequest.client))
+        .where(OrderServices.id == service_id)
+    )
+    if service and service.order and service.order.client:
+        return service.order.client.id  # Возвращаем ID клиента
     return None  # Если услуга, заказ или клиент не найдены, возвращаем None
 
-def get_client_username_by_service(service_id: int):
-    with SessionLocal() as session:
-        # Ищем услугу по ID и загружаем связанный заказ и клиента
-        service = (
-                session.query(OrderServices)
-                .options(
-                    joinedload(OrderServices.order).joinedload(OrderRequest.client),
-                    joinedload(OrderServices.service)
-                )
-                .filter(OrderServices.id == service_id)
-                .first()
+async def get_client_username_by_service(session, service_id: int):
+    # Ищем услугу по ID и загружаем связанный заказ и клиента
+    service = await session.scalar(
+            select(OrderServices)
+            .options(
+                joinedload(OrderServices.order).joinedload(OrderRequest.client),
+                joinedload(OrderServices.service)
             )
-        if service and service.order and service.order.client:
-            print(f"[DEBUG] Found client: {service.order.client.telegram_username}")  # Добавим отладочный вывод
-            return service.order.client.telegram_username
-        else:
-            print(f"[DEBUG] Service, order or client not found for service_id: {service_id}")
-            if service:
-                print(f"[DEBUG] Service found: {service.id}")
-                if service.order:
-                    print(f"[DEBUG] Order found: {service.order.id}")
-                    if not service.order.client:
-                        print("[DEBUG] Client not found for order")
-                else:
-                    print("[DEBUG] Order not found for service")
+            .where(OrderServices.id == service_id)
+        )
+    if service and service.order and service.order.client:
+        print(f"[DEBUG] Found client: {service.order.client.telegram_username}")  # Добавим отладочный вывод
+        return service.order.client.telegram_username
+    else:
+        print(f"[DEBUG] Service, order or client not found for service_id: {service_id}")
+        if service:
+            print(f"[DEBUG] Service found: {service.id}")
+            if service.order:
+                print(f"[DEBUG] Order found: {service.order.id}")
+                if not service.order.client:
+                    print("[DEBUG] Client not found for order")
             else:
-                print("[DEBUG] Service not found")
-            return None
+                print("[DEBUG] Order not found for service")
+        else:
+            print("[DEBUG] Service not found")
+        return None
     return None  # Если услуга, заказ или клиент не найдены, возвращаем None
 
-def get_all_manager_telegram_id():
-    with SessionLocal() as session:
-        managers = session.query(Manager).all()
-        return [manager.telegram_id for manager in managers if manager.telegram_id]
+async def get_all_manager_telegram_id(session):
+    manager_ids = manager_ids_cache.get("managers")
+    if manager_ids is None:
+        manager_ids = (await session.scalars(
+            select(Manager.telegram_id).where(Manager.telegram_id.is_not(None)).order_by(Manager.id)
+        )).all()
+        manager_ids = tuple(manager_id for manager_id in manager_ids if manager_id)
+        manager_ids_cache.set("managers", manager_ids)
+    return list(manager_ids)
 
 # Получаем список услуг клиента
-def get_client_services(username):
-    with SessionLocal() as session:
-        client = session.query(Client).filter(Client.telegram_username == username).first()
-        if not client:
-            return None  # Клиент не найден
-
-        services = (
-            session.query(OrderServices)
-            .join(OrderRequest, OrderRequest.id == OrderServices.order_id)
-            .join(Service, Service.id == OrderServices.service_id)
-            .options(
-                joinedload(OrderServices.service),
-                joinedload(OrderServices.executor)
-            )
-            .filter(OrderRequest.client_id == client.id)
-            .all()
+async def get_client_services(session, role: RoleInfo):
+    if role.role != ROLE_CLIENT:
+        return None  # Пользователь не клиент
+
+    services = (await session.scalars(
+        select(OrderServices)
+        .join(OrderRequest, OrderRequest.id == OrderServices.order_id)
+        .join(Service, Service.id == OrderServices.service_id)
+        .options(
+            joinedload(OrderServices.service),
+            joinedload(OrderServices.executor)
         )
+        .where(OrderRequest.client_id == role.entity_id)
+    )).all()
 
-        if not services:
-            return None  # Нет активных заказов
+    if not services:
+        return None  # Нет активных заказов
 
-        message_text = "📋 Ваши услуги в заказах:\n\n"
-        for service in services:
-            price_rub, price_byn = convert_currency(service.service_price)
-            executor_username = service.executor.telegram_username if service.executor else 'не назначен'
+    message_text = "📋 Ваши услуги в заказах:\n\n"
+    for service in services:
+        price_rub, price_byn = convert_currency(service.service_price)
+        executor_username = service.executor.telegram_username if service.executor else 'не назначен'
             
-            message_text += (
-                f"📍 ID услуги: {service.id}\n"
-                f"📌 Услуга: {service.service.name if service.service else 'N/A'}\n"
-                f"📦 Количество: {service.quantity}\n"
-                f"💰 Цена: {int(service.service_price)} USD | {int(price_rub)} RUB | {price_byn:.2f} BYN\n"
-                f"📅 Дата создания: {service.created_at.strftime('%d.%m.%y %H:%M') if service.created_at else 'N/A'}\n"
-                f"⏳ Дата завершения: {service.estimated_completion.strftime('%d.%m.%y %H:%M') if service.estimated_completion else 'N/A'}\n"
-                f"📌 Статус: {service.status}\n"
-                f"👨‍💻 Исполнитель: @{executor_username}\n"
-                "———————————————\n"
-            )
-        return message_text
+        message_text += (
+            f"📍 ID услуги: {service.id}\n"
+            f"📌 Услуга: {service.service.name if service.service else 'N/A'}\n"
+            f"📦 Количество: {service.quantity}\n"
+            f"💰 Цена: {int(service.service_price)} USD | {int(price_rub)} RUB | {price_byn:.2f} BYN\n"
+            f"📅 Дата создания: {service.created_at.strftime('%d.%m.%y %H:%M') if service.created_at else 'N/A'}\n"
+            f"⏳ Дата завершения: {service.estimated_completion.strftime('%d.%m.%y %H:%M') if service.estimated_completion else 'N/A'}\n"
+            f"📌 Статус: {service.status}\n"
+            f"👨‍💻 Исполнитель: @{executor_username}\n"
+            "———————————————\n"
+        )
+    return message_text
 
 # Отправка сообщения через бота
 async def send_message(context: CallbackContext, user_id, text):
     await context.bot.send_message(chat_id=user_id, text=text)
 
+async def route_moderation(session, manager_ids: list) -> list:
+    """
+    Выбирает получателей уведомления о подозрительном сообщении (MODERATION_ROUTING).
+
+    broadcast — все менеджеры; round_robin — следующий по кругу;
+    least_loaded — менеджер с наименьшим числом назначенных ему необработанных сообщений.
+    """
+    if MODERATION_ROUTING == 'broadcast' or len(manager_ids) <= 1:
+        return list(manager_ids)
+    if MODERATION_ROUTING == 'least_loaded':
+        rows = await session.execute(
+            select(MessageModeration.assigned_manager_id, func.count())
+            .where(MessageModeration.processed == False, MessageModeration.assigned_manager_id.in_(manager_ids))
+            .group_by(MessageModeration.assigned_manager_id)
+        )
+        load = dict(rows.all())
+        return [min(manager_ids, key=lambda manager_id: load.get(manager_id, 0))]
+    return [manager_ids[next(_round_robin) % len(manager_ids)]]
+
+_round_robin = itertools.count()
+
+def moderation_keyboard(receiver_telegram_id: int, message_id: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton('✔️ Одобрить', callback_data=f'approve_{receiver_telegram_id}_{message_id}'),
+            InlineKeyboardButton('✏️ Изменить', callback_data=f'edit_{receiver_telegram_id}_{message_id}'),
+            InlineKeyboardButton('❌ Удалить', callback_data=f'delete_{receiver_telegram_id}_{message_id}')
+        ]
+    ])
+
+async def render_moderation_notice(
+    session,
+    message_text: str,
+    sender_username: str,
+    receiver_username: str,
+    receiver_type: str,
+    service_id: int = None,
+    verdict: Verdict = None
+) -> str:
+    # Получаем информацию об услуге в заказе
+    service_in_order_id = "N/A"
+    service_name = "Неизвестная услуга"
+
+    if service_id:
+        service_in_order = await session.scalar(select(OrderServices).options(
+            joinedload(OrderServices.service)
+        ).where(OrderServices.id == service_id))
+
+        if service_in_order:
+            service_in_order_id = service_in_order.id
+            service_name = service_in_order.service.name if service_in_order.service else "Неизвестная услуга"
+
+    return (
+        f"⚠️ Подозрительное сообщение:\n\n"
+        f"{message_text}\n\n"
+        f"📨 Отправитель: @{sender_username}\n"
+        f"👤 Получатель: @{receiver_username}\n"
+        f"🔹 Для кого: {receiver_type}\n"
+        f"📦 Номер услуги в заказе: #{service_in_order_id}\n"
+        f"🛠 Название услуги: {service_name}"
+        + (f"\n🚩 Сработали правила: {verdict.describe()}" if verdict else "")
+    )
+
+async def deliver_moderation_notice(bot, manager_ids: list, notice: str, reply_markup) -> list:
+    """Рассылает уведомление менеджерам; возвращает записи для moderator_messages (в том числе об ошибках)."""
+    results = await fan_out(
+        manager_ids,
+        lambda manager_id: bot.send_message(
+            chat_id=manager_id, text=notice, reply_markup=reply_markup, rate_limit_args=PRIORITY_MODERATION
+        ),
+    )
+    sent_messages = []
+    for manager_id, result in zip(manager_ids, results):
+        if isinstance(result, Exception):
+            metrics.increment("moderation.notice_failed")
+            sent_messages.append({
+                "chat_id": manager_id,
+                "error": f"{type(result).__name__}: {result}",
+                "timestamp": datetime.now().isoformat()
+            })
+        else:
+            sent_messages.append({
+                "chat_id": manager_id,
+                "message_id": result.message_id
+            })
+    return sent_messages
+
 async def send_to_manager(
     update: Update,
     context: CallbackContext,
@@ -3082,112 +3008,458 @@ async def send_to_manager(
     receiver_telegram_id: int,
     receiver_username: str,
     receiver_type: str,
-    service_id: int = None
+    service_id: int = None,
+    verdict: Verdict = None
 ):
     message_id = str(uuid.uuid4())
-    
-    # Получаем информацию о заказе и услуге
-    order_id = "N/A"
-    service_in_order_id = "N/A"
-    service_name = "Неизвестная услуга"
-    
-    if service_id:
-        with SessionLocal() as session:
-            service_in_order = session.query(OrderServices).options(
-                joinedload(OrderServices.order),
-                joinedload(OrderServices.service)
-            ).filter(OrderServices.id == service_id).first()
-            
-            if service_in_order:
-                order_id = service_in_order.order_id if service_in_order.order else "N/A"
-                service_in_order_id = service_in_order.id
-                service_name = service_in_order.service.name if service_in_order.service else "Неизвестная услуга"
+    session = context.db_session
 
-    # Клавиатура модерации
-    keyboard = [
-        [
-            InlineKeyboardButton('✔️ Одобрить', callback_data=f'approve_{receiver_telegram_id}_{message_id}'),
-            InlineKeyboardButton('✏️ Изменить', callback_data=f'edit_{receiver_telegram_id}_{message_id}'),
-            InlineKeyboardButton('❌ Удалить', callback_data=f'delete_{receiver_telegram_id}_{message_id}')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    notice = await render_moderation_notice(
+        session, message_text, update.effective_user.username, receiver_username, receiver_type, service_id, verdict
+    )
 
-    # Отправляем менеджерам
-    manager_ids = get_all_manager_telegram_id()
-    sent_messages = []
+    # В режиме сводки (MODERATION_DIGEST_SECONDS) сообщение только ставится в очередь
+    if MODERATION_DIGEST_SECONDS:
+        manager_ids = []
+    else:
+        manager_ids = await route_moderation(session, await get_all_manager_telegram_id(session))
+    assigned_manager_id = manager_ids[0] if MODERATION_ROUTING != 'broadcast' and manager_ids else None
+
+    # Строка модерации пишется в отдельной короткой сессии и фиксируется до
+    # рассылки: менеджер может нажать кнопку раньше, чем закончится обработка
+    # обновления, а единица работы самого обновления фиксируется только в конце
+    async with AsyncSessionLocal.begin() as moderation_session:
+        row_id = await moderation_session.scalar(text('''
+            INSERT INTO message_moderation 
+            (message_id, message_text, receiver_telegram_id, receiver_username, 
+             receiver_type, sender_username, service_id, processed, created_at, moderator_messages,
+             assigned_manager_id, assigned_at)
+            VALUES 
+            (:message_id, :message_text, :receiver_telegram_id, :receiver_username,
+             :receiver_type, :sender_username, :service_id, FALSE, NOW(), :moderator_messages,
+             :assigned_manager_id, :assigned_at)
+            RETURNING id
+        '''), {
+            'message_id': message_id,
+            'message_text': message_text,
+            'receiver_telegram_id': receiver_telegram_id,
+            'receiver_username': receiver_username,
+            'receiver_type': receiver_type,
+            'sender_username': update.effective_user.username,
+            'service_id': service_id,
+            'moderator_messages': json.dumps([]),
+            'assigned_manager_id': assigned_manager_id,
+            'assigned_at': datetime.now() if assigned_manager_id else None
+        })
+
+    # Отправляем всем менеджерам или одному назначенному (MODERATION_ROUTING);
+    # неудачные отправки сохраняем вместе с успешными
+    sent_messages = await deliver_moderation_notice(
+        context.bot, manager_ids, notice, moderation_keyboard(receiver_telegram_id, message_id)
+    )
+    if sent_messages:
+        # Дописываем к массиву, а не перезаписываем: там может уже быть запись о захвате
+        async with AsyncSessionLocal.begin() as moderation_session:
+            await moderation_session.execute(
+                sql_update(MessageModeration)
+                .where(MessageModeration.id == row_id)
+                .values(moderator_messages=_json_array_append(
+                    moderation_session, MessageModeration.moderator_messages, *sent_messages
+                ))
+                .execution_options(synchronize_session=False)
+            )
 
-    for manager_id in manager_ids:
-        try:
-            msg = await context.bot.send_message(
-                chat_id=manager_id,
-                text=(
-                    f"⚠️ Подозрительное сообщение:\n\n"
-                    f"{message_text}\n\n"
-                    f"📨 Отправитель: @{update.effective_user.username}\n"
-                    f"👤 Получатель: @{receiver_username}\n"
-                    f"🔹 Для кого: {receiver_type}\n"
-                    f"📦 Номер услуги в заказе: #{service_in_order_id}\n"
-                    f"🛠 Название услуги: {service_name}"
+def format_approved_message(message_text: str, service) -> str:
+    if service:
+        order_id = service.order_id if service.order else "N/A"
+        service_name = service.service.name if service.service else "Неизвестная услуга"
+
+        # Форматируем сообщение в красивый вид
+        formatted_message = (
+            f"📨 *Новое сообщение:*\n\n"
+            f"📋 *Заказ:* №{order_id}\n"
+            f"📦 *Услуга:* {service_name}\n\n"
+            f"💬 *Текст сообщения:*\n{message_text}"
+        )
+    else:
+        formatted_message = message_text  # fallback, если не нашли данные
+    return formatted_message
+
+async def load_services_in_orders(session, service_ids) -> dict:
+    """Услуги в заказах (с услугой и заказом) по id для оформления одобренных сообщений."""
+    ids = {service_id for service_id in service_ids if service_id}
+    if not ids:
+        return {}
+    services = (await session.scalars(select(OrderServices).options(
+        joinedload(OrderServices.service),
+        joinedload(OrderServices.order)
+    ).where(OrderServices.id.in_(ids)))).all()
+    return {service.id: service for service in services}
+
+async def deliver_approved_message(bot, receiver_telegram_id: int, message_text: str, service=None) -> None:
+    """Отправляет одобренное сообщение получателю с данными заказа и услуги (из load_services_in_orders)."""
+    formatted_message = format_approved_message(message_text, service)
+
+    # Отправляем оформленное сообщение
+    await bot.send_message(
+        chat_id=receiver_telegram_id,
+        text=formatted_message,
+        parse_mode="Markdown"  # Включаем Markdown для форматирования
+    )
+
+async def reassign_stale_moderation(context: CallbackContext) -> None:
+    """
+    Периодическая задача JobQueue: передаёт следующему менеджеру сообщения,
+    которые назначенный менеджер не обработал за MODERATION_REASSIGN_SECONDS.
+    """
+    deadline = datetime.now() - timedelta(seconds=MODERATION_REASSIGN_SECONDS)
+    async with session_scope() as session:
+        stale = (await session.scalars(
+            select(MessageModeration)
+            .where(
+                MessageModeration.processed == False,
+                MessageModeration.assigned_manager_id.is_not(None),
+                MessageModeration.assigned_at <= deadline,
+            )
+            .order_by(MessageModeration.id)
+            .limit(100)
+        )).all()
+        if not stale:
+            return
+        manager_ids = await get_all_manager_telegram_id(session)
+
+        for message in stale:
+            previous_manager_id = message.assigned_manager_id
+            candidates = [manager_id for manager_id in manager_ids if manager_id != previous_manager_id]
+            if candidates:
+                if MODERATION_ROUTING == 'round_robin' and previous_manager_id in manager_ids:
+                    # Следующий по кругу после текущего исполнителя
+                    position = manager_ids.index(previous_manager_id)
+                    next_manager_id = manager_ids[(position + 1) % len(manager_ids)]
+                else:
+                    next_manager_id = (await route_moderation(session, candidates))[0]
+            else:
+                next_manager_id = previous_manager_id
+
+            # Условное обновление: если сообщение успели забрать, его не трогаем
+            reassigned = await session.execute(
+                sql_update(MessageModeration)
+                .where(
+                    MessageModeration.id == message.id,
+                    MessageModeration.processed == False,
+                    MessageModeration.assigned_manager_id == previous_manager_id,
+                )
+                .values(assigned_manager_id=next_manager_id, assigned_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            if not reassigned.rowcount or next_manager_id == previous_manager_id:
+                continue
+
+            print(f"[MODERATION] Сообщение {message.message_id} передано от {previous_manager_id} к {next_manager_id}")
+            metrics.increment("moderation.reassigned")
+            await retract_moderation_buttons(
+                context.bot, message.moderator_messages, next_manager_id, "⏱ Сообщение не обработано вовремя и передано другому менеджеру"
+            )
+
+            notice = await render_moderation_notice(
+                session, message.message_text, message.sender_username, message.receiver_username,
+                message.receiver_type, message.service_id, moderation.get_engine().classify(message.message_text),
+            )
+            sent_messages = await deliver_moderation_notice(
+                context.bot, [next_manager_id], notice, moderation_keyboard(message.receiver_telegram_id, message.message_id)
+            )
+            for entry in sent_messages:
+                await session.execute(
+                    sql_update(MessageModeration)
+                    .where(MessageModeration.id == message.id)
+                    .values(moderator_messages=_json_array_append(session, MessageModeration.moderator_messages, entry))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+# approve_/edit_/delete_<telegram_id получателя>_<uuid сообщения>; у админских кнопок edit_* другой формат
+MODERATION_CALLBACK_RE = re.compile(r'^(approve|edit|delete)_(-?\d+)_([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$')
+
+def _json_array_append(session, column, *items):
+    """Выражение "column + [items...]" для JSON-колонки, вычисляемое на стороне БД."""
+    if session.bind.dialect.name == "sqlite":
+        appended = func.coalesce(column, '[]')
+        for item in items:
+            appended = func.json_insert(appended, '$[#]', func.json(json.dumps(item)))
+        return appended
+    appended = cast(func.coalesce(column, literal([], JSON)), JSONB).op('||')(literal(list(items), JSONB))
+    return cast(appended, JSON)
+
+async def claim_moderation_message(session, message_id: str, action: str, moderator_id: int):
+    """
+    Атомарно забирает необработанное сообщение модерации одним UPDATE ... RETURNING.
+
+    Из нескольких одновременно нажавших менеджеров строку обновит только один:
+    остальные после снятия блокировки увидят processed = TRUE и получат None.
+
+    :return: Строка (id, message_text, service_id, moderator_messages) или None, если сообщение уже обработано.
+    """
+    result = await _claim_moderation(session, MessageModeration.message_id == message_id, action, moderator_id)
+    return result.first()
+
+async def claim_moderation_digest(session, digest_id: str, action: str, moderator_id: int) -> list:
+    """Атомарно забирает все ещё не обработанные сообщения, показанные в сводке digest_id."""
+    result = await _claim_moderation(session, MessageModeration.digest_id == digest_id, action, moderator_id)
+    return result.all()
+
+async def _claim_moderation(session, criterion, action: str, moderator_id: int):
+    entry = {
+        'action': action,
+        'moderator_id': moderator_id,
+        'timestamp': datetime.now().isoformat()
+    }
+    return await session.execute(
+        sql_update(MessageModeration)
+        .where(criterion, MessageModeration.processed == False)
+        .values(processed=True, moderator_messages=_json_array_append(session, MessageModeration.moderator_messages, entry))
+        .returning(
+            MessageModeration.id, MessageModeration.message_text, MessageModeration.service_id,
+            MessageModeration.moderator_messages, MessageModeration.receiver_telegram_id,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+MODERATION_ACTION_LABELS = {
+    'approve': "✔️ одобрено",
+    'edit': "✏️ редактируется",
+    'delete': "❌ удалено",
+}
+
+async def retract_moderation_buttons(bot, moderator_messages, moderator_chat_id: int, notice: str) -> None:
+    """
+    Заменяет копии уведомления у остальных менеджеров на notice (например, "обработано @x") и убирает кнопки.
+
+    Выполняется фоновой задачей после захвата сообщения; ошибки отдельных
+    правок (сообщение удалено, бот заблокирован) только считаются.
+    """
+    message_ids = {
+        entry["chat_id"]: entry["message_id"]
+        for entry in moderator_messages or []
+        if isinstance(entry, dict) and "message_id" in entry and entry.get("chat_id") != moderator_chat_id
+    }
+    if not message_ids:
+        return
+    # Кнопки уже не сработают (сообщение забрано), поэтому правки идут после остальных запросов
+    results = await fan_out(
+        list(message_ids),
+        lambda manager_id: bot.edit_message_text(
+            chat_id=manager_id, message_id=message_ids[manager_id], text=notice, reply_markup=None,
+            rate_limit_args=PRIORITY_BROADCAST,
+        ),
+    )
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        metrics.increment("moderation.retract_failed", len(failed))
+        print(f"[WARN] Не удалось обновить {len(failed)} из {len(results)} копий уведомления: {failed[0]}")
+
+# digest_all_<id сводки> / digest_item_<id> — кнопки сводки модерации
+DIGEST_CALLBACK_RE = re.compile(r'^digest_(?:all_([0-9a-f]{32})|item_(\d+))$')
+DIGEST_MAX_ITEMS = 20
+DIGEST_PREVIEW_LENGTH = 80
+
+async def send_moderation_digest(context: CallbackContext) -> None:
+    """
+    Периодическая задача JobQueue (MODERATION_DIGEST_SECONDS): одна сводка
+    новых необработанных сообщений вместо отдельного уведомления на каждое.
+
+    Сообщения выбираются и отмечаются номером сводки (digest_id) одним UPDATE:
+    строки, зафиксированные позже (в том числе с меньшим id), попадут в
+    следующую сводку, а «Одобрить все» заберёт ровно показанные сообщения.
+    """
+    digest_id = uuid.uuid4().hex
+    async with session_scope() as session:
+        candidates = (
+            select(MessageModeration.id)
+            .where(MessageModeration.processed == False, MessageModeration.digest_id.is_(None))
+            .order_by(MessageModeration.id)
+            .limit(DIGEST_MAX_ITEMS)
+            .with_for_update(skip_locked=True)
+        )
+        pending = sorted((await session.execute(
+            sql_update(MessageModeration)
+            .where(MessageModeration.id.in_(candidates.scalar_subquery()))
+            .values(digest_id=digest_id, digested_at=datetime.now())
+            .returning(
+                MessageModeration.id, MessageModeration.message_text,
+                MessageModeration.sender_username, MessageModeration.receiver_username,
+            )
+            .execution_options(synchronize_session=False)
+        )).all(), key=lambda item: item.id)
+        if not pending:
+            return
+        manager_ids = await get_all_manager_telegram_id(session)
+
+    engine = moderation.get_engine()
+    lines = [f"📋 Сообщения на проверке: {len(pending)}", ""]
+    for item in pending:
+        preview = item.message_text if len(item.message_text) <= DIGEST_PREVIEW_LENGTH else item.message_text[:DIGEST_PREVIEW_LENGTH] + "…"
+        verdict = engine.classify(item.message_text)
+        lines.append(f"#{item.id} @{item.sender_username} → @{item.receiver_username}: {preview}")
+        if verdict.suspicious:
+            lines.append(f"   🚩 {', '.join(verdict.rules)}")
+
+    item_buttons = [InlineKeyboardButton(f"🔎 #{item.id}", callback_data=f"digest_item_{item.id}") for item in pending]
+    keyboard = [[InlineKeyboardButton(f"✔️ Одобрить все ({len(pending)})", callback_data=f"digest_all_{digest_id}")]]
+    keyboard += [item_buttons[i:i + 4] for i in range(0, len(item_buttons), 4)]
+
+    digest = "\n".join(lines)
+    results = await fan_out(
+        manager_ids,
+        lambda manager_id: context.bot.send_message(
+            chat_id=manager_id, text=digest, reply_markup=InlineKeyboardMarkup(keyboard), rate_limit_args=PRIORITY_MODERATION
+        ),
+    )
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        print(f"[WARN] Сводка модерации не доставлена {len(failed)} из {len(results)} менеджеров: {failed[0]}")
+    if len(failed) < len(results):
+        metrics.increment("moderation.digests")
+        return
+    # Сводку никто не получил: возвращаем сообщения в очередь следующей сводки
+    async with session_scope() as session:
+        await session.execute(
+            sql_update(MessageModeration)
+            .where(MessageModeration.digest_id == digest_id, MessageModeration.processed == False)
+            .values(digest_id=None, digested_at=None)
+            .execution_options(synchronize_session=False)
+        )
+
+async def handle_digest_callback(update: Update, context: CallbackContext, match) -> None:
+    """Кнопки сводки: одобрить все сообщения сводки или открыть одно с обычной клавиатурой модерации."""
+    query = update.callback_query
+    session = context.db_session
+    chat_id = query.message.chat_id
+    digest_id, item_id = match.groups()
+
+    if item_id:
+        message = await session.scalar(
+            select(MessageModeration)
+            .where(MessageModeration.id == int(item_id), MessageModeration.processed == False)
+        )
+        if not message:
+            await query.answer("Это сообщение уже обработано", show_alert=True)
+            return
+        await query.answer()
+        notice = await render_moderation_notice(
+            session, message.message_text, message.sender_username, message.receiver_username,
+            message.receiver_type, message.service_id, moderation.get_engine().classify(message.message_text),
+        )
+        sent = await context.bot.send_message(
+            chat_id=chat_id, text=notice, reply_markup=moderation_keyboard(message.receiver_telegram_id, message.message_id)
+        )
+        # Запоминаем копию, чтобы после решения убрать у неё кнопки
+        await session.execute(
+            sql_update(MessageModeration)
+            .where(MessageModeration.id == message.id)
+            .values(moderator_messages=_json_array_append(
+                session, MessageModeration.moderator_messages, {"chat_id": chat_id, "message_id": sent.message_id}
+            ))
+            .execution_options(synchronize_session=False)
+        )
+        return
+
+    claimed = await claim_moderation_digest(session, digest_id, 'approve', chat_id)
+    if not claimed:
+        await query.answer("Все сообщения из сводки уже обработаны", show_alert=True)
+        return
+    # Фиксируем захват сразу, как и для одиночных сообщений
+    await session.commit()
+    await query.answer()
+    print(f"[MODERATION] Сводка {digest_id}: одобрено {len(claimed)} сообщений")
+
+    services = await load_services_in_orders(session, [row.service_id for row in claimed])
+    results = await asyncio.gather(
+        *(
+            deliver_approved_message(context.bot, row.receiver_telegram_id, row.message_text, services.get(row.service_id))
+            for row in claimed
+        ),
+        return_exceptions=True,
+    )
+    failed = sum(isinstance(result, Exception) for result in results)
+    for row in claimed:
+        if row.moderator_messages:
+            context.application.create_task(
+                retract_moderation_buttons(
+                    context.bot, row.moderator_messages, None,
+                    f"☑️ Сообщение обработано менеджером @{query.from_user.username}: {MODERATION_ACTION_LABELS['approve']}",
                 ),
-                reply_markup=reply_markup
+                update=update,
             )
-            sent_messages.append({
-                "chat_id": manager_id,
-                "message_id": msg.message_id
-            })
-        except Exception as e:
-            print(f'Error sending to manager {manager_id}: {e}')
+    await query.edit_message_text(
+        f"✅ Одобрено и отправлено {len(claimed) - failed} из {len(claimed)} сообщений (@{query.from_user.username})"
+        + (f"\n❌ Не удалось отправить: {failed}" if failed else "")
+    )
 
-    # Сохраняем в базу
-    with SessionLocal() as session:
-        try:
-            session.execute(text('''
-                INSERT INTO message_moderation 
-                (message_id, message_text, receiver_telegram_id, receiver_username, 
-                 receiver_type, sender_username, service_id, processed, created_at, moderator_messages)
-                VALUES 
-                (:message_id, :message_text, :receiver_telegram_id, :receiver_username,
-                 :receiver_type, :sender_username, :service_id, FALSE, NOW(), :moderator_messages)
-            '''), {
-                'message_id': message_id,
-                'message_text': message_text,
-                'receiver_telegram_id': receiver_telegram_id,
-                'receiver_username': receiver_username,
-                'receiver_type': receiver_type,
-                'sender_username': update.effective_user.username,
-                'service_id': service_id,
-                'moderator_messages': json.dumps(sent_messages)
-            })
-            session.commit()
-        except Exception as e:
-            print(f'DB error: {e}')
-            session.rollback()
-            raise
-
-def get_message_data(message_id):
-    with SessionLocal() as session:
-        result = session.execute(text('''
-            SELECT * FROM message_moderation 
-            WHERE message_id = :message_id AND processed = FALSE
-        '''), {'message_id': message_id})
-        message_data = result.fetchone()
-        return dict(message_data) if message_data else None
-
-def mark_message_processed(message_id):
-    with SessionLocal() as session:
-        try:
-            session.execute(text('''
+async def get_message_data(session, message_id):
+    result = await session.execute(text('''
+        SELECT * FROM message_moderation 
+        WHERE message_id = :message_id AND processed = FALSE
+    '''), {'message_id': message_id})
+    message_data = result.fetchone()
+    return dict(message_data._mapping) if message_data else None
+
+async def mark_message_processed(session, message_id):
+    try:
+        async with session.begin_nested():
+            await session.execute(text('''
                 UPDATE message_moderation 
                 SET processed = TRUE 
                 WHERE message_id = :message_id
             '''), {'message_id': message_id})
-            session.commit()
-            return True
-        except Exception as e:
-            print(f'Error marking message as processed: {e}')
-            session.rollback()
-            return False
+        return True
+    except Exception as e:
+        print(f'Error marking message as processed: {e}')
+        return False
+
+async def metrics_command(update: Update, context: CallbackContext) -> None:
+    """/metrics — счётчики и время работы правил модерации с момента запуска бота."""
+    if update.message.from_user.username not in SPECIAL_USERS:
+        await update.message.reply_text("🚫 У вас нет доступа к этой команде.")
+        return
+    await update.message.reply_text(f"```\n{metrics.render()}\n```", parse_mode="Markdown")
+
+async def refresh_catalog_command(update: Update, context: CallbackContext) -> None:
+    """/refresh_catalog — перечитать каталог услуг из БД (например, после правок в обход бота)."""
+    if update.message.from_user.username not in SPECIAL_USERS:
+        await update.message.reply_text("🚫 У вас нет доступа к этой команде.")
+        return
+    service_catalog.invalidate()
+    services = await get_all_services(context.db_session)
+    await update.message.reply_text(f"✅ Каталог услуг обновлён: {len(services)} услуг.")
+
+async def reload_moderation_rules() -> str:
+    """Перечитывает файл правил в отдельном потоке (компиляция регулярных выражений не блокирует бота)."""
+    try:
+        engine = await asyncio.to_thread(moderation.rules.reload)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] Правила модерации не обновлены, остаётся версия {moderation.get_engine().version}: {e}")
+        raise
+    return f"✅ Правила модерации версии {engine.version} загружены."
+
+async def poll_moderation_rules(context: CallbackContext) -> None:
+    # Периодическая задача JobQueue: подхватываем изменённый файл правил без перезапуска
+    if moderation.rules.changed():
+        try:
+            await reload_moderation_rules()
+        except (OSError, ValueError):
+            pass
+
+async def reload_rules_command(update: Update, context: CallbackContext) -> None:
+    """/reload_rules — перечитать файл правил модерации немедленно."""
+    if update.message.from_user.username not in SPECIAL_USERS:
+        await update.message.reply_text("🚫 У вас нет доступа к этой команде.")
+        return
+    try:
+        text = await reload_moderation_rules()
+    except (OSError, ValueError) as e:
+        text = f"❌ Файл правил не загружен, действует версия {moderation.get_engine().version}.\n{e}"
+    await update.message.reply_text(text)
 
 async def cancel_command(update: Update, context: CallbackContext) -> None:
     chat_id = update.message.chat_id
@@ -3199,31 +3471,96 @@ async def cancel_command(update: Update, context: CallbackContext) -> None:
     # Возвращаем основное меню
     await start(update, context)
 
-def get_services_by_category():
-    with SessionLocal() as session:
-        services = session.query(Service).order_by(Service.category, Service.name).all()
-        
-        services_by_category = {}
-        for service in services:
-            if service.category not in services_by_category:
-                services_by_category[service.category] = []
-            services_by_category[service.category].append(service)
-        
-        return services_by_category
+async def get_services_by_category(session):
+    return await service_catalog.by_category(session)
     
+class BotContext(CallbackContext):
+    """Контекст обработчиков с доступом к сессии БД текущего обновления."""
+
+    @property
+    def db_session(self):
+        session = get_current_session()
+        if session is None:
+            raise RuntimeError("Нет активной сессии БД: обработчик вызван вне session_scope()")
+        return session
+
+class BotApplication(Application):
+    """Application, оборачивающий каждое обновление в одну единицу работы с БД."""
+
+    async def process_update(self, update: object) -> None:
+        async with session_scope():
+            await super().process_update(update)
+
+async def rollback_on_error(update: object, context: BotContext) -> None:
+    # PTB перехватывает исключения обработчиков сам, поэтому откатываем сессию здесь,
+    # иначе session_scope() зафиксировал бы частично выполненную работу
+    print(f"[ERROR] Ошибка при обработке обновления: {context.error}")
+    # Ошибки задач JobQueue приходят без обновления и без session_scope()
+    session = get_current_session()
+    if session is not None:
+        await session.rollback()
+
+async def warm_up(app: Application) -> None:
+    # Считаем хеш дефолтного пароля до первых регистраций
+    await get_default_password_hash()
+    if app.job_queue:
+        app.job_queue.run_repeating(poll_moderation_rules, interval=MODERATION_RULES_POLL_SECONDS, first=MODERATION_RULES_POLL_SECONDS)
+        if MODERATION_DIGEST_SECONDS:
+            app.job_queue.run_repeating(send_moderation_digest, interval=MODERATION_DIGEST_SECONDS, first=MODERATION_DIGEST_SECONDS)
+        elif MODERATION_ROUTING != 'broadcast':
+            sweep_interval = min(60, MODERATION_REASSIGN_SECONDS)
+            app.job_queue.run_repeating(reassign_stale_moderation, interval=sweep_interval, first=sweep_interval)
+    else:
+        print("[ERROR] JobQueue недоступна (нужен python-telegram-bot[job-queue]): правила модерации обновляются только через /reload_rules")
+
+async def close_database(app: Application) -> None:
+    # Закрываем пул соединений и пул процессов хеширования при остановке бота
+    await async_engine.dispose()
+    shutdown_hash_executor()
+
 # Основная функция
 def main() -> None:
     if not TELEGRAM_TOKEN:
         print("Ошибка: Telegram токен не задан!")
         return
     
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    moderation.configure_rules(MODERATION_RULES_FILE)
+    if BOT_MODE not in ('polling', 'webhook'):
+        print(f"Ошибка: неизвестный BOT_MODE={BOT_MODE!r} (polling, webhook)")
+        return
+    if BOT_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET_TOKEN):
+        print("Ошибка: для BOT_MODE=webhook нужны WEBHOOK_URL и WEBHOOK_SECRET_TOKEN!")
+        return
+    unknown_updates = set(ALLOWED_UPDATES) - set(Update.ALL_TYPES) - {'all'}
+    if unknown_updates:
+        print(f"Ошибка: неизвестные типы обновлений в ALLOWED_UPDATES: {', '.join(sorted(unknown_updates))}")
+        return
+    if MODERATION_ROUTING not in ('broadcast', 'round_robin', 'least_loaded'):
+        print(f"Ошибка: неизвестный MODERATION_ROUTING={MODERATION_ROUTING!r} (broadcast, round_robin, least_loaded)")
+        return
+
+    app = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .application_class(BotApplication)
+        .context_types(ContextTypes(context=BotContext))
+        # Разные чаты обрабатываются параллельно, сообщения одного чата — по порядку
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        # Все исходящие запросы проходят через общую очередь с лимитами Telegram и приоритетами
+        .rate_limiter(OutboundScheduler(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST))
+        .post_init(warm_up)
+        .post_shutdown(close_database)
+        .build()
+    )
 
     # Обработчик команды /start
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("cancel", cancel_command))
+    app.add_handler(CommandHandler("refresh_catalog", refresh_catalog_command))
+    app.add_handler(CommandHandler("metrics", metrics_command))
+    app.add_handler(CommandHandler("reload_rules", reload_rules_command))
 
-    app.add_handler(MessageHandler(filters.Regex(r'^❌ Отмена$'), cancel_command))
+    app.add_handler(MessageHandler(filters.Text([keyboards.CANCEL]), cancel_command))
 
     # Обработчик для всех текстовых сообщений
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_user_message))
@@ -3231,8 +3568,21 @@ def main() -> None:
     # Обработчик для нажатий на кнопки
     app.add_handler(CallbackQueryHandler(button_callback))
 
+    app.add_error_handler(rollback_on_error)
+
     # Запуск бота
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    allowed_updates = Update.ALL_TYPES if ALLOWED_UPDATES == ['all'] else ALLOWED_UPDATES
+    if BOT_MODE == 'webhook':
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            allowed_updates=allowed_updates,
+        )
+    else:
+        app.run_polling(allowed_updates=allowed_updates)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
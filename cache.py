@@ -0,0 +1,49 @@
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Ограниченный по размеру кэш в памяти процесса с временем жизни записей.
+
+    При переполнении вытесняется запись, к которой дольше всего не обращались.
+    Бот работает в одном цикле asyncio, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def invalidate_where(self, predicate) -> int:
+        """Удаляет записи, для которых predicate(key, value) истинно. Возвращает их количество."""
+        stale = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
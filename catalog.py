@@ -0,0 +1,79 @@
+from decimal import Decimal
+from types import MappingProxyType
+from typing import NamedTuple
+from sqlalchemy import select
+from database import on_transaction_end
+from models.models import Service
+
+class ServiceItem(NamedTuple):
+    """Неизменяемая копия строки service: безопасно делится между обновлениями."""
+    id: int
+    category: str
+    name: str
+    min_price: Decimal
+
+class ServiceCatalog:
+    """
+    Кэш каталога услуг в памяти процесса (read-through).
+
+    Каталог загружается одним запросом при первом обращении и живёт до
+    инвалидации: его меняют только админские create/update/delete_service.
+    version увеличивается при каждой инвалидации, по нему можно кэшировать
+    производные данные (например, отрисованный прайс-лист).
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._loaded = False
+        self._by_id = MappingProxyType({})
+        self._by_category = MappingProxyType({})
+
+    async def _ensure_loaded(self, session) -> None:
+        if self._loaded:
+            return
+        version = self.version
+        rows = (await session.execute(
+            select(Service.id, Service.category, Service.name, Service.min_price)
+            .order_by(Service.category, Service.name)
+        )).all()
+        by_category = {}
+        for row in rows:
+            by_category.setdefault(row.category, []).append(ServiceItem(*row))
+        self._by_category = MappingProxyType({category: tuple(items) for category, items in by_category.items()})
+        self._by_id = MappingProxyType({item.id: item for items in self._by_category.values() for item in items})
+        # Если каталог инвалидировали во время загрузки, данные могут быть устаревшими:
+        # отдаём их текущему вызову, но следующий загрузит каталог заново
+        self._loaded = version == self.version
+        print(f"[DEBUG] Каталог услуг загружен: {len(self._by_id)} услуг")
+
+    async def by_category(self, session):
+        """Услуги, сгруппированные по категориям (категории и услуги по алфавиту)."""
+        await self._ensure_loaded(session)
+        return self._by_category
+
+    async def all(self, session) -> list:
+        """Все услуги в порядке ID."""
+        await self._ensure_loaded(session)
+        return sorted(self._by_id.values(), key=lambda item: item.id)
+
+    async def get(self, session, service_id: int):
+        await self._ensure_loaded(session)
+        return self._by_id.get(service_id)
+
+    def invalidate(self) -> None:
+        self._loaded = False
+        self.version += 1
+
+    def invalidate_on_commit(self, session) -> None:
+        """
+        Сбрасывает каталог сейчас и ещё раз после завершения транзакции сессии.
+
+        Повторный сброс нужен, потому что до commit каталог мог загрузить
+        параллельный обработчик (ещё без изменений) или эта же сессия (с
+        изменениями, которые затем откатятся). Освобождение точки сохранения
+        begin_nested() концом транзакции не считается.
+        """
+        self.invalidate()
+        on_transaction_end(session, on_commit=self.invalidate, on_rollback=self.invalidate)
+
+service_catalog = ServiceCatalog()
@@ -0,0 +1,133 @@
+"""
+Разбиение длинных сообщений на части под лимит Telegram.
+
+Telegram считает длину текста в кодовых единицах UTF-16 (эмодзи вне BMP —
+две единицы), поэтому срез строки Python по 4000 символов может как
+превысить лимит, так и разрезать запись или *жирный* фрагмент пополам —
+тогда Telegram отклоняет часть с ошибкой разбора Markdown.
+
+chunk_message режет текст по границам записей (строка-разделитель вроде
+"———", а если их нет — пустая строка), при необходимости — по строкам и
+только в крайнем случае внутри строки. Незакрытые на границе части сущности Markdown
+(*, _, `, ```) закрываются в конце части и открываются заново в начале
+следующей.
+"""
+import re
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Запас под закрывающие и открывающие маркеры при разрезании длинной строки
+_MARKUP_RESERVE = 16
+
+# Строка-разделитель записей из тире/черт; если таких нет, записи разделяет пустая строка
+_SEPARATOR_RE = re.compile(r'^\s*[—─\-=]{3,}\s*$')
+_BLANK_RE = re.compile(r'^\s*$')
+
+_CLOSERS = {'*': '*', '_': '_', '`': '`', '```': '\n```'}
+_OPENERS = {'*': '*', '_': '_', '`': '`', '```': '```\n'}
+
+def utf16_len(text: str) -> int:
+    """Длина текста так, как её считает Telegram."""
+    return len(text.encode('utf-16-le')) // 2
+
+def open_entity(text: str):
+    """
+    Сущность Markdown (legacy), оставшаяся открытой в конце текста: '*', '_', '`', '```' или None.
+
+    В Markdown первой версии сущности не вкладываются, поэтому достаточно
+    помнить одну открытую.
+    """
+    current = None
+    i = 0
+    while i < len(text):
+        if text.startswith('```', i) and current in (None, '```'):
+            current = None if current else '```'
+            i += 3
+            continue
+        char = text[i]
+        if current in ('```', '`'):
+            # Внутри кода разметка не действует
+            if char == '`' and current == '`':
+                current = None
+        elif char == '\\':
+            i += 1  # экранированный символ
+        elif current is None and char in '*_`':
+            current = char
+        elif char == current:
+            current = None
+        i += 1
+    return current
+
+def _split_line(line: str, limit: int) -> list:
+    """Режет строку длиннее лимита на куски не длиннее limit единиц UTF-16."""
+    pieces, current, size = [], [], 0
+    for char in line:
+        width = 2 if ord(char) > 0xFFFF else 1
+        if size + width > limit:
+            pieces.append(''.join(current))
+            current, size = [], 0
+        current.append(char)
+        size += width
+    if current:
+        pieces.append(''.join(current))
+    return pieces
+
+def _records(text: str) -> list:
+    lines = text.splitlines(keepends=True)
+    record_end = _SEPARATOR_RE if any(_SEPARATOR_RE.match(line) for line in lines) else _BLANK_RE
+    records, current = [], []
+    for line in lines:
+        current.append(line)
+        if record_end.match(line):
+            records.append(''.join(current))
+            current = []
+    if current:
+        records.append(''.join(current))
+    return records
+
+def _pieces(text: str, limit: int) -> list:
+    """Записи целиком; слишком длинные записи — построчно, слишком длинные строки — по кускам."""
+    pieces = []
+    for record in _records(text):
+        if utf16_len(record) <= limit - _MARKUP_RESERVE:
+            pieces.append(record)
+            continue
+        for line in record.splitlines(keepends=True):
+            if utf16_len(line) <= limit - _MARKUP_RESERVE:
+                pieces.append(line)
+            else:
+                pieces.extend(_split_line(line, limit - _MARKUP_RESERVE))
+    return pieces
+
+def chunk_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT, markdown: bool = True) -> list:
+    """
+    Делит текст на части не длиннее limit единиц UTF-16.
+
+    :param markdown: Текст отправляется с parse_mode="Markdown" — на границах
+        частей закрывать и заново открывать незакрытые сущности.
+    :return: Список частей; короткий текст возвращается одной частью без изменений.
+    """
+    if utf16_len(text) <= limit:
+        return [text]
+
+    def closed(chunk: str) -> str:
+        entity = open_entity(chunk) if markdown else None
+        if not entity:
+            return chunk
+        if entity == '```' and chunk.endswith('\n'):
+            return chunk + '```'
+        return chunk + _CLOSERS[entity]
+
+    chunks = []
+    current = ""
+    for piece in _pieces(text, limit):
+        candidate = current + piece
+        if current and utf16_len(closed(candidate)) > limit:
+            entity = open_entity(current) if markdown else None
+            chunks.append(closed(current))
+            current = (_OPENERS[entity] if entity else "") + piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(closed(current))
+    return chunks
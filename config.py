@@ -1,5 +1,56 @@
-from decouple import config
+from decouple import config, Csv
 from sqlalchemy.engine import URL
 
 TELEGRAM_TOKEN = config('TELEGRAM_TOKEN')
-DATABASE_URL = config('DATABASE_URL')
\ No newline at end of file
+DATABASE_URL = config('DATABASE_URL')
+
+# Кэш ролей пользователей (менеджер / исполнитель / клиент)
+ROLE_CACHE_SIZE = config('ROLE_CACHE_SIZE', default=10000, cast=int)
+ROLE_CACHE_TTL = config('ROLE_CACHE_TTL', default=300, cast=int)
+# Список Telegram ID менеджеров для уведомлений модерации
+MANAGER_CACHE_TTL = config('MANAGER_CACHE_TTL', default=600, cast=int)
+
+# Пароль, который получают аккаунты, созданные через Telegram
+DEFAULT_PASSWORD = config('DEFAULT_PASSWORD', default='FX@&9+9№exfXRc#e)wlo')
+
+# Размер страницы в админских списках (клиенты, исполнители, заказы)
+ADMIN_PAGE_SIZE = config('ADMIN_PAGE_SIZE', default=20, cast=int)
+
+# Курсы валют для цен в рублях и белорусских рублях
+USD_TO_RUB = config('USD_TO_RUB', default=100, cast=float)
+USD_TO_BYN = config('USD_TO_BYN', default=3.3, cast=float)
+
+# Файл правил модерации (путь относительно каталога бота) и период проверки его изменений, с
+MODERATION_RULES_FILE = config('MODERATION_RULES_FILE', default='moderation_rules.json')
+MODERATION_RULES_POLL_SECONDS = config('MODERATION_RULES_POLL_SECONDS', default=30, cast=int)
+
+# Лимиты исходящих сообщений Telegram: всего в секунду, в один чат в секунду
+# и сколько сообщений в чат можно отправить подряд без ожидания (ответ + меню)
+TELEGRAM_GLOBAL_RATE = config('TELEGRAM_GLOBAL_RATE', default=30, cast=float)
+TELEGRAM_CHAT_RATE = config('TELEGRAM_CHAT_RATE', default=1, cast=float)
+TELEGRAM_CHAT_BURST = config('TELEGRAM_CHAT_BURST', default=3, cast=float)
+
+# Маршрутизация подозрительных сообщений: broadcast — всем менеджерам,
+# round_robin / least_loaded — одному менеджеру с передачей следующему,
+# если сообщение не обработано за MODERATION_REASSIGN_SECONDS секунд
+MODERATION_ROUTING = config('MODERATION_ROUTING', default='broadcast')
+MODERATION_REASSIGN_SECONDS = config('MODERATION_REASSIGN_SECONDS', default=300, cast=int)
+
+# Режим сводки: вместо уведомления на каждое подозрительное сообщение менеджеры
+# раз в MODERATION_DIGEST_SECONDS секунд получают одну сводку (0 — выключено)
+MODERATION_DIGEST_SECONDS = config('MODERATION_DIGEST_SECONDS', default=0, cast=int)
+
+# Способ получения обновлений: polling или webhook (встроенный сервер PTB на tornado)
+BOT_MODE = config('BOT_MODE', default='polling')
+WEBHOOK_LISTEN = config('WEBHOOK_LISTEN', default='0.0.0.0')
+WEBHOOK_PORT = config('WEBHOOK_PORT', default=8443, cast=int)
+WEBHOOK_PATH = config('WEBHOOK_PATH', default='telegram')
+# Публичный адрес, который сообщается Telegram (например, https://bot.example.com/telegram)
+WEBHOOK_URL = config('WEBHOOK_URL', default='')
+# Telegram присылает его в заголовке X-Telegram-Bot-Api-Secret-Token, чужие запросы отклоняются
+WEBHOOK_SECRET_TOKEN = config('WEBHOOK_SECRET_TOKEN', default='')
+# Типы обновлений, которые бот обрабатывает; "all" — все типы
+ALLOWED_UPDATES = config('ALLOWED_UPDATES', default='message,callback_query', cast=Csv())
+
+# Сколько обновлений обрабатывается одновременно (обновления одного чата — всегда по очереди)
+MAX_CONCURRENT_UPDATES = config('MAX_CONCURRENT_UPDATES', default=8, cast=int)
\ No newline at end of file
@@ -0,0 +1,76 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from config import DATABASE_URL
+
+def to_async_url(url: str):
+    """
+    Переводит URL базы данных на асинхронный драйвер asyncpg.
+
+    :param url: Строка подключения из конфигурации (postgresql://, postgresql+psycopg2:// ...).
+    :return: URL с драйвером postgresql+asyncpg.
+    """
+    parsed = make_url(url)
+    if parsed.drivername.startswith("postgresql"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed
+
+# Асинхронное подключение к базе данных
+async_engine = create_async_engine(to_async_url(DATABASE_URL), pool_pre_ping=True)
+# expire_on_commit=False: объекты остаются доступными после commit без повторной загрузки
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Сессия текущего обновления (единица работы). ContextVar копируется в каждую
+# задачу asyncio, поэтому параллельные обновления не видят сессии друг друга.
+_current_session = ContextVar("current_session", default=None)
+
+@asynccontextmanager
+async def session_scope():
+    """
+    Открывает одну сессию на обновление: commit в конце или rollback при ошибке.
+
+    Соединение из пула берётся только при первом запросе, поэтому обновления
+    без обращений к базе ничего не стоят.
+    """
+    session = AsyncSessionLocal()
+    token = _current_session.set(session)
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        await session.close()
+
+def get_current_session():
+    """Возвращает сессию текущего обновления, открытую session_scope(), или None вне её (задачи JobQueue)."""
+    return _current_session.get()
+
+def on_transaction_end(session, on_commit=None, on_rollback=None) -> None:
+    """
+    Вызывает on_commit() после commit внешней транзакции сессии или on_rollback() после её отката.
+
+    SQLAlchemy посылает after_commit/after_rollback и при освобождении или
+    откате точки сохранения begin_nested(), поэтому такие события
+    пропускаются: колбэк срабатывает один раз, когда завершается сама
+    единица работы. Принимает AsyncSession или обычную Session.
+    """
+    sync_session = getattr(session, "sync_session", session)
+    pending = [True]
+
+    def finish(callback, current):
+        # Во время события точки сохранения текущей транзакцией сессии остаётся вложенная
+        if not pending[0] or current.in_nested_transaction():
+            return
+        pending[0] = False
+        if callback is not None:
+            callback()
+
+    # Слушатели не снимаются (снятие во время рассылки события небезопасно):
+    # после первого срабатывания они ничего не делают, а сессия живёт одно обновление
+    event.listen(sync_session, "after_commit", lambda current: finish(on_commit, current))
+    event.listen(sync_session, "after_rollback", lambda current: finish(on_rollback, current))
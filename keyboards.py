@@ -0,0 +1,179 @@
+"""
+Реестр клавиатур бота.
+
+Меню ролей и статические inline-клавиатуры собираются один раз при импорте
+и переиспользуются: объекты Telegram (ReplyKeyboardMarkup,
+InlineKeyboardMarkup) после создания неизменяемы, поэтому их безопасно
+отправлять из параллельно обрабатываемых обновлений.
+
+Тексты кнопок объявлены здесь же и служат единственным источником
+истины для маршрутизатора текстовых сообщений (bot.MENU_ROUTES).
+"""
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+# Главное меню администратора
+ADD = "Добавить"
+EDIT = "Изменить"
+DELETE = "Удалить"
+VIEW = "Посмотреть"
+BACK = "↩️Назад↩️"
+CANCEL = "❌ Отмена"
+
+# Меню исполнителя
+CONTACT_CLIENT = "✉️ Связаться с клиентом"
+COMPLETE_ORDER = "🛫 Отправить выполненный заказ"
+VIEW_ACTIVE_ORDERS = "🪬 Посмотреть активные заказы"
+
+# Меню клиента
+CREATE_ORDER = "🛎 Сделать заказ"
+CONTACT_EXECUTOR = "✉️ Связаться с исполнителем"
+
+# Подменю "Добавить"
+ADD_CLIENT = "👤Добавить клиента👤"
+ADD_EXECUTOR = "👨‍💻Добавить исполнителя👨‍💻"
+ADD_SERVICE = "📄Добавить услугу📄"
+ADD_ORDER = "📋Добавить заказ📋"
+ADD_SERVICE_TO_ORDER = "➕Добавить услугу в заказ➕"
+
+# Подменю "Изменить"
+EDIT_SERVICE = "Изменить услугу"
+EDIT_EXECUTOR = "Изменить исполнителя"
+EDIT_ORDER = "Изменить заказ"
+EDIT_SERVICE_IN_ORDER = "Изменить услугу в заказе"
+
+# Подменю "Удалить"
+DELETE_CLIENT = "Удалить клиента"
+DELETE_EXECUTOR = "Удалить исполнителя"
+DELETE_SERVICE = "Удалить услугу"
+DELETE_ORDER = "Удалить заказ"
+DELETE_SERVICE_FROM_ORDER = "Удалить услугу из заказа"
+
+# Подменю "Посмотреть"
+VIEW_CLIENTS = "Посмотреть клиентов"
+VIEW_EXECUTORS = "Посмотреть исполнителей"
+VIEW_SERVICES = "Посмотреть услуги"
+VIEW_ORDERS = "Посмотреть заказы"
+VIEW_SERVICES_IN_ORDERS = "Посмотреть услуги в заказах"
+
+def reply_menu(rows) -> ReplyKeyboardMarkup:
+    return ReplyKeyboardMarkup(rows, resize_keyboard=True)
+
+def inline_column(buttons) -> InlineKeyboardMarkup:
+    """Inline-клавиатура по кнопке в строке: buttons — пары (текст, callback_data)."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=data)] for label, data in buttons])
+
+def texts(markup: ReplyKeyboardMarkup) -> frozenset:
+    """Тексты всех кнопок reply-клавиатуры."""
+    return frozenset(button.text for row in markup.keyboard for button in row)
+
+# Меню ролей
+ADMIN_MENU = reply_menu([[ADD, EDIT], [DELETE, VIEW]])
+ADMIN_EXECUTOR_MENU = reply_menu([
+    [CONTACT_CLIENT],
+    [COMPLETE_ORDER, VIEW_ACTIVE_ORDERS],
+    [ADD, EDIT, DELETE, VIEW]
+])
+EXECUTOR_MENU = reply_menu([[CONTACT_CLIENT], [COMPLETE_ORDER], [VIEW_ACTIVE_ORDERS]])
+CLIENT_MENU = reply_menu([[CREATE_ORDER, CONTACT_EXECUTOR], [VIEW_ACTIVE_ORDERS]])
+
+def role_menu(is_executor: bool, is_special: bool) -> ReplyKeyboardMarkup:
+    if is_executor and is_special:
+        return ADMIN_EXECUTOR_MENU
+    if is_special:
+        return ADMIN_MENU
+    if is_executor:
+        return EXECUTOR_MENU
+    return CLIENT_MENU
+
+# Подменю администратора
+ADD_MENU = reply_menu([
+    [ADD_CLIENT, ADD_EXECUTOR],
+    [ADD_SERVICE, ADD_ORDER],
+    [ADD_SERVICE_TO_ORDER, BACK]
+])
+EDIT_MENU = reply_menu([
+    [EDIT_SERVICE, EDIT_EXECUTOR],
+    [EDIT_ORDER, EDIT_SERVICE_IN_ORDER],
+    [BACK]
+])
+DELETE_MENU = reply_menu([
+    [DELETE_CLIENT, DELETE_EXECUTOR],
+    [DELETE_SERVICE, DELETE_ORDER],
+    [DELETE_SERVICE_FROM_ORDER, BACK]
+])
+VIEW_MENU = reply_menu([
+    [VIEW_CLIENTS, VIEW_EXECUTORS],
+    [VIEW_SERVICES, VIEW_ORDERS, VIEW_SERVICES_IN_ORDERS],
+    [BACK]
+])
+# Кнопка главного меню -> (подменю, подпись)
+SUBMENUS = {
+    ADD: (ADD_MENU, "Выберите действие:"),
+    EDIT: (EDIT_MENU, "Выберите действие:"),
+    DELETE: (DELETE_MENU, "Выберите действие:"),
+    VIEW: (VIEW_MENU, "Выберите, что хотите посмотреть:"),
+    BACK: (ADMIN_MENU, "👋 Выберите действие:"),
+}
+
+# Все кнопки меню администратора: нажатие без прав отклоняется (bot.handle_admin_commands)
+ADMIN_BUTTONS = texts(ADMIN_MENU).union(*(texts(menu) for menu, _ in SUBMENUS.values()))
+
+CANCEL_MENU = reply_menu([[CANCEL]])
+# Кнопка отмены и слова, которые можно набрать вместо неё (сравнение после casefold)
+CANCEL_TEXTS = frozenset({CANCEL.casefold(), "отмена", "cancel"})
+
+# Статические inline-клавиатуры
+CATEGORIES = ("Montage", "Design", "IT", "Record")
+DIFFICULTIES = (("Лёгкая", 1), ("Средняя", 2), ("Сложная", 3))
+ORDER_STATUSES = (
+    ("В обработке", "processing"),
+    ("Выполняется", "in_progress"),
+    ("Ожидание правок", "waiting"),
+    ("Завершён", "completed"),
+)
+
+def _categories(prefix: str) -> InlineKeyboardMarkup:
+    return inline_column((category, f"{prefix}{category}") for category in CATEGORIES)
+
+def _difficulties(prefix: str) -> InlineKeyboardMarkup:
+    return inline_column((label, f"{prefix}{level}") for label, level in DIFFICULTIES)
+
+def _statuses(prefix: str) -> InlineKeyboardMarkup:
+    return inline_column((label, f"{prefix}{status}") for label, status in ORDER_STATUSES)
+
+EXECUTOR_CATEGORY = _categories("category_")
+SERVICE_CATEGORY = _categories("service_category_")
+EDIT_SERVICE_CATEGORY = _categories("edit_service_category_")
+EDIT_EXECUTOR_CATEGORY = _categories("edit_executor_category_")
+
+EXECUTOR_DIFFICULTY = _difficulties("difficulty_")
+EDIT_EXECUTOR_DIFFICULTY = _difficulties("edit_executor_difficulty_")
+
+EDIT_ORDER_STATUS = _statuses("edit_order_status_")
+EDIT_SERVICE_IN_ORDER_STATUS = _statuses("edit_service_in_order_status_")
+
+CONFIRM_DELETE = inline_column((("Да", "confirm_delete"), ("Нет", "cancel_delete")))
+
+EDIT_SERVICE_FIELDS = inline_column((
+    ("Изменить название", "edit_service_name"),
+    ("Изменить категорию", "edit_service_category"),
+    ("Изменить цену", "edit_service_price"),
+))
+EDIT_EXECUTOR_FIELDS = inline_column((
+    ("Изменить username", "edit_executor_username"),
+    ("Изменить категорию", "edit_executor_category"),
+    ("Изменить сложность", "edit_executor_difficulty"),
+))
+EDIT_ORDER_FIELDS = inline_column((
+    ("Изменить клиента", "edit_order_client"),
+    ("Изменить время завершения", "edit_order_completion"),
+    ("Изменить статус", "edit_order_status"),
+))
+EDIT_SERVICE_IN_ORDER_FIELDS = inline_column((
+    ("Изменить услугу", "edit_service_in_order_service"),
+    ("Изменить количество", "edit_service_in_order_quantity"),
+    ("Изменить цену", "edit_service_in_order_price"),
+    ("Изменить исполнителя", "edit_service_in_order_executor"),
+    ("Изменить дату завершения", "edit_service_in_order_completion"),
+    ("Изменить статус", "edit_service_in_order_status"),
+))
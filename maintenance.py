@@ -0,0 +1,129 @@
+"""
+Служебные команды для обслуживания базы данных бота.
+
+Запуск: python maintenance.py <команда>
+    migrate             применить миграции схемы (индексы и т.д.)
+    check-indexes       проверить через EXPLAIN, что горячие запросы используют индексы
+    recompute-totals    пересчитать цену и срок всех заказов по их услугам
+    rescore-moderation  прогнать историю message_moderation через текущие правила
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from sqlalchemy import select
+from database import async_engine, session_scope
+from models.models import MessageModeration
+import moderation
+from config import MODERATION_RULES_FILE
+from migrations import migrate as apply_migrations, check_index_usage
+from bot import recompute_all_order_totals
+
+async def migrate(args) -> None:
+    applied = await apply_migrations(async_engine)
+    if applied:
+        print(f"[DEBUG] Применены миграции: {', '.join(map(str, applied))}")
+    else:
+        print("[DEBUG] Схема актуальна, миграций нет")
+
+async def check_indexes(args) -> None:
+    async with async_engine.begin() as conn:
+        report = await conn.run_sync(check_index_usage)
+    failed = False
+    for description, expected, used, ok in report:
+        print(f"{'OK  ' if ok else 'FAIL'} {description}: ожидается {expected}, в плане {sorted(used) or 'нет индексов'}")
+        failed = failed or not ok
+    if failed:
+        sys.exit(1)
+
+async def recompute_totals(args) -> None:
+    async with session_scope() as session:
+        count = await recompute_all_order_totals(session)
+    print(f"[DEBUG] Пересчитаны итоги заказов: {count}")
+
+MODERATION_OUTCOMES = ("approve", "edit", "delete", "pending")
+
+def moderation_outcome(processed: bool, moderator_messages) -> str:
+    """Решение менеджера по сообщению: последнее действие из moderator_messages."""
+    if not processed:
+        return "pending"
+    for entry in reversed(moderator_messages or []):
+        if isinstance(entry, dict) and entry.get("action") in MODERATION_OUTCOMES:
+            return entry["action"]
+    return "unknown"
+
+async def rescore_moderation(args) -> None:
+    hits = {}            # правило -> Counter(решение -> количество)
+    outcomes = Counter()  # решение -> количество сообщений
+    clean = Counter()     # решение -> сообщений без срабатываний
+    classify_seconds = 0.0
+    query = select(
+        MessageModeration.message_text,
+        MessageModeration.processed,
+        MessageModeration.moderator_messages,
+    ).order_by(MessageModeration.id).execution_options(yield_per=args.batch_size)
+    if args.limit:
+        query = query.limit(args.limit)
+
+    moderation.configure_rules(MODERATION_RULES_FILE)
+    engine = moderation.get_engine()
+    print(f"[DEBUG] Правила модерации версии {engine.version}")
+
+    async with session_scope() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            started = time.perf_counter()
+            verdicts = engine.classify_many([row.message_text or "" for row in rows])
+            classify_seconds += time.perf_counter() - started
+            for row, verdict in zip(rows, verdicts):
+                outcome = moderation_outcome(row.processed, row.moderator_messages)
+                outcomes[outcome] += 1
+                if not verdict.suspicious:
+                    clean[outcome] += 1
+                for rule in verdict.rules:
+                    hits.setdefault(rule, Counter())[outcome] += 1
+
+    total = sum(outcomes.values())
+    if not total:
+        print("[DEBUG] В message_moderation нет сообщений")
+        return
+    columns = list(MODERATION_OUTCOMES) + (["unknown"] if outcomes["unknown"] else [])
+    print(f"{'правило':22}" + "".join(f"{column:>10}" for column in columns))
+    print(f"{'всего сообщений':22}" + "".join(f"{outcomes[column]:>10}" for column in columns))
+    for rule in engine.rules:
+        counter = hits.get(rule.name, Counter())
+        print(f"{rule.name:22}" + "".join(f"{counter[column]:>10}" for column in columns))
+    print(f"{'без срабатываний':22}" + "".join(f"{clean[column]:>10}" for column in columns))
+    print(
+        f"\nПроверено {total} сообщений за {classify_seconds:.3f} с "
+        f"({classify_seconds / total * 1e6:.1f} мкс/сообщение, {total / max(classify_seconds, 1e-9):.0f} сообщений/с)"
+    )
+
+COMMANDS = {
+    "migrate": migrate,
+    "check-indexes": check_indexes,
+    "recompute-totals": recompute_totals,
+    "rescore-moderation": rescore_moderation,
+}
+
+async def run(args) -> None:
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        await async_engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных PixelHub")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="применить миграции схемы")
+    subparsers.add_parser("check-indexes", help="проверить использование индексов горячими запросами")
+    subparsers.add_parser("recompute-totals", help="пересчитать цену и срок всех заказов")
+    rescore = subparsers.add_parser("rescore-moderation", help="оценить правила модерации на истории сообщений")
+    rescore.add_argument("--batch-size", type=int, default=1000, help="строк за одну выборку (yield_per)")
+    rescore.add_argument("--limit", type=int, default=None, help="проверить только первые N сообщений")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
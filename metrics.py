@@ -0,0 +1,63 @@
+import time
+from collections import defaultdict
+
+class MetricsRegistry:
+    """
+    Счётчики, суммарное время и текущие значения (gauges) в памяти процесса.
+
+    Бот работает в одном цикле asyncio, поэтому блокировки не нужны.
+    Значения живут до перезапуска бота и показываются командой /metrics.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._counters = defaultdict(int)
+        self._timings = defaultdict(lambda: [0, 0.0])  # name -> [количество, секунды]
+        self._gauges = {}  # name -> функция без аргументов, возвращающая текущее значение
+
+    def increment(self, name: str, value: int = 1) -> None:
+        self._counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        timing = self._timings[name]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def register_gauge(self, name: str, read) -> None:
+        """Регистрирует значение, которое читается в момент снятия метрик (например, длина очереди)."""
+        self._gauges[name] = read
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """Копия текущих значений: {"counters": {...}, "gauges": {...}, "timings": {name: (count, seconds)}}."""
+        return {
+            "counters": dict(self._counters),
+            "gauges": {name: read() for name, read in self._gauges.items()},
+            "timings": {name: tuple(timing) for name, timing in self._timings.items()},
+        }
+
+    def render(self) -> str:
+        """Текстовый отчёт для /metrics."""
+        snapshot = self.snapshot()
+        uptime = int(time.time() - self.started_at)
+        lines = [f"Аптайм: {uptime // 3600} ч {uptime % 3600 // 60} мин", ""]
+        for name in sorted(snapshot["counters"]):
+            lines.append(f"{name} = {snapshot['counters'][name]}")
+        for name in sorted(snapshot["gauges"]):
+            lines.append(f"{name} = {snapshot['gauges'][name]} (сейчас)")
+        if snapshot["timings"]:
+            lines.append("")
+        for name in sorted(snapshot["timings"]):
+            count, seconds = snapshot["timings"][name]
+            average = seconds / count * 1e6 if count else 0
+            lines.append(f"{name}: {count} раз, {seconds * 1000:.1f} мс всего, {average:.1f} мкс в среднем")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        gauges = self._gauges
+        self.__init__()
+        self._gauges = gauges
+
+metrics = MetricsRegistry()
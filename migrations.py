@@ -0,0 +1,131 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Каждая миграция — функция от синхронного соединения с номером версии.
+Применённые версии хранятся в таблице schema_version; все ожидающие
+миграции выполняются в одной транзакции.
+"""
+import json
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, func, text, inspect
+from models.models import OrderRequest, OrderServices, MessageModeration
+
+_metadata = MetaData()
+
+schema_version = Table(
+    'schema_version', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.now),
+)
+
+def _index(table, name: str):
+    return next(index for index in table.indexes if index.name == name)
+
+def _001_hot_path_indexes(conn) -> None:
+    for index in (
+        _index(OrderServices.__table__, 'ix_order_services_order_id'),
+        _index(OrderServices.__table__, 'ix_order_services_executor_id'),
+        _index(OrderRequest.__table__, 'ix_order_request_client_id'),
+        _index(MessageModeration.__table__, 'ix_message_moderation_unprocessed_created_at'),
+    ):
+        index.create(conn, checkfirst=True)
+
+def _add_column(conn, column) -> None:
+    """ALTER TABLE ... ADD COLUMN, если колонки ещё нет (таблицы могли создаваться через create_all)."""
+    table = column.table
+    if column.name in {existing['name'] for existing in inspect(conn).get_columns(table.name)}:
+        return
+    conn.execute(text(
+        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}'
+    ))
+
+def _002_moderation_assignment(conn) -> None:
+    _add_column(conn, MessageModeration.__table__.c.assigned_manager_id)
+    _add_column(conn, MessageModeration.__table__.c.assigned_at)
+
+def _003_moderation_digest_membership(conn) -> None:
+    _add_column(conn, MessageModeration.__table__.c.digest_id)
+    _add_column(conn, MessageModeration.__table__.c.digested_at)
+
+# (версия, описание, функция) — только добавлять в конец, не менять применённые
+MIGRATIONS = [
+    (1, "Индексы внешних ключей заказов и очереди модерации", _001_hot_path_indexes),
+    (2, "Назначение сообщений модерации одному менеджеру", _002_moderation_assignment),
+    (3, "Принадлежность сообщений модерации сводке", _003_moderation_digest_membership),
+]
+
+def current_version(conn) -> int:
+    _metadata.create_all(conn, tables=[schema_version])
+    return conn.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar_one()
+
+def apply_migrations(conn) -> list:
+    """Применяет ожидающие миграции. Возвращает список применённых версий."""
+    version = current_version(conn)
+    applied = []
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        print(f"[DEBUG] Миграция {number}: {description}")
+        migrate(conn)
+        conn.execute(schema_version.insert().values(version=number, description=description))
+        applied.append(number)
+    return applied
+
+async def migrate(engine) -> list:
+    async with engine.begin() as conn:
+        return await conn.run_sync(apply_migrations)
+
+# Горячие запросы бота и индексы, которые они должны использовать
+HOT_QUERIES = [
+    (
+        "Услуги исполнителя (активные заказы, связь с клиентом)",
+        select(OrderServices.id).where(OrderServices.executor_id == 1),
+        'ix_order_services_executor_id',
+    ),
+    (
+        "Услуги заказа (итоги заказа, просмотр услуг в заказе)",
+        select(OrderServices.id).where(OrderServices.order_id == 1),
+        'ix_order_services_order_id',
+    ),
+    (
+        "Заказы клиента",
+        select(OrderRequest.id).where(OrderRequest.client_id == 1),
+        'ix_order_request_client_id',
+    ),
+    (
+        "Необработанные сообщения модерации",
+        select(MessageModeration.id)
+        .where(MessageModeration.processed == False)
+        .order_by(MessageModeration.created_at)
+        .limit(50),
+        'ix_message_moderation_unprocessed_created_at',
+    ),
+]
+
+def _plan_indexes(plan: dict) -> set:
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        names |= _plan_indexes(child)
+    return names
+
+def check_index_usage(conn) -> list:
+    """
+    Выполняет EXPLAIN горячих запросов и проверяет, что планировщик выбирает индексы.
+
+    Последовательное сканирование отключается на время проверки: на маленьких
+    таблицах оно дешевле, и без этого проверка зависела бы от объёма данных.
+    :return: Список (описание, ожидаемый индекс, индексы в плане, ok).
+    """
+    if conn.dialect.name != 'postgresql':
+        raise RuntimeError("Проверка планов запросов поддерживается только для PostgreSQL")
+    conn.execute(text("SET LOCAL enable_seqscan = off"))
+    report = []
+    for description, query, expected in HOT_QUERIES:
+        sql = str(query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+        if isinstance(plan, str):  # asyncpg не декодирует json
+            plan = json.loads(plan)
+        used = _plan_indexes(plan[0]['Plan'])
+        report.append((description, expected, used, expected in used))
+    return report
@@ -1,15 +1,43 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, DECIMAL, TypeDecorator, BigInteger, Boolean, JSON
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, DECIMAL, TypeDecorator, BigInteger, Boolean, JSON, Index
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 from passlib.context import CryptContext
 from passlib.hash import bcrypt
 from zoneinfo import ZoneInfo
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
 
 Base = declarative_base()
 
 # Настройка алгоритма хеширования
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt занимает сотни миллисекунд CPU, поэтому в асинхронном коде пароли
+# хешируются в отдельных процессах, чтобы не блокировать цикл событий
+_hash_executor = None
+
+def _get_hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+    return _hash_executor
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+async def hash_password_async(password: str) -> str:
+    """Хеширует пароль в пуле процессов, не блокируя цикл событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), _hash_password, password)
+
+def shutdown_hash_executor() -> None:
+    """Останавливает пул процессов хеширования (при завершении приложения)."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 class MoscowDateTime(TypeDecorator):
     impl = DateTime
 
@@ -94,7 +122,7 @@ class OrderRequest(Base):
     __tablename__ = 'order_request'
     
     id = Column(Integer, primary_key=True)
-    client_id = Column(Integer, ForeignKey('client.id'), nullable=False)
+    client_id = Column(Integer, ForeignKey('client.id'), nullable=False, index=True)
     created_at = Column(MoscowDateTime, default=lambda: datetime.now(ZoneInfo('Europe/Moscow')))
     estimated_completion = Column(DateTime)
     status = Column(String(50), nullable=False)
@@ -104,10 +132,10 @@ class OrderServices(Base):
     __tablename__ = 'order_services'
     
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('order_request.id'), nullable=False)
+    order_id = Column(Integer, ForeignKey('order_request.id'), nullable=False, index=True)
     service_id = Column(Integer, ForeignKey('service.id'), nullable=False)
     quantity = Column(Integer, nullable=False)
-    executor_id = Column(Integer, ForeignKey('executor.id'))
+    executor_id = Column(Integer, ForeignKey('executor.id'), index=True)
     created_at = Column(MoscowDateTime, default=lambda: datetime.now(ZoneInfo('Europe/Moscow')))
     service_price = Column(DECIMAL(10, 2), nullable=False)
     estimated_completion = Column(DateTime)
@@ -142,6 +170,24 @@ class MessageModeration(Base):
     processed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     moderator_messages = Column(JSON, default=[]) 
+    # Менеджер, которому сейчас назначено сообщение (telegram_id), и время назначения;
+    # NULL при рассылке всем менеджерам
+    assigned_manager_id = Column(BigInteger, nullable=True)
+    assigned_at = Column(DateTime, nullable=True)
+    # Сводка модерации, в которую попало сообщение (режим MODERATION_DIGEST_SECONDS);
+    # отмечается тем же запросом, что выбирает сообщения для сводки
+    digest_id = Column(String(32), nullable=True)
+    digested_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Частичный индекс: в очереди модерации обычно мало необработанных сообщений
+        Index(
+            'ix_message_moderation_unprocessed_created_at',
+            'processed', 'created_at',
+            postgresql_where=(processed == False),
+            sqlite_where=(processed == False),
+        ),
+    )
 
 class TokenBlocklist(Base):
     __tablename__ = 'token_blocklist'
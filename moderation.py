@@ -0,0 +1,313 @@
+"""
+Модерация сообщений между клиентами и исполнителями.
+
+Правила (ключевые слова, эмодзи, символы, пороги) хранятся в версионированном
+файле moderation_rules.json и компилируются в ModerationEngine один раз при
+загрузке. Текст сообщения нормализуется один раз (normalize_text), после чего
+ключевые слова ищутся одним объединённым регулярным выражением только в
+канонической форме.
+
+Ключевые слова в файле достаточно записать одним написанием: регистр,
+латиница вместо кириллицы, цифры вместо букв, разделители между буквами и
+повторы снимаются normalize_text. Короткие слова (до short_keyword_length
+букв) ищутся только целиком с падежным окончанием ("тг", "зуме", но не
+"отгрузка"), длинные — с начала слова ("телеграмм", "т е л е г р а м", но не
+"с лаком" для "слак").
+"""
+import json
+import os
+import re
+import time
+import unicodedata
+from itertools import islice
+from typing import Callable, NamedTuple
+from metrics import metrics
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "moderation_rules.json")
+
+# Латинские буквы, похожие на кириллические (после casefold)
+HOMOGLYPHS = str.maketrans({
+    "a": "а", "b": "в", "c": "с", "e": "е", "h": "н", "k": "к", "m": "м", "n": "п",
+    "o": "о", "p": "р", "r": "г", "t": "т", "u": "и", "x": "х", "y": "у", "ё": "е",
+})
+
+# Цифры, которыми заменяют буквы: "т3л3грам", "д8а"
+LEET_DIGITS = {"0": "о", "1": "и", "3": "е", "4": "ч", "6": "б", "8": "в"}
+
+_LEET_DIGIT_RE = re.compile(r'(?<=[^\W\d_])[013468]|[013468](?=[^\W\d_])')
+_SEPARATORS_RE = re.compile(r'[\W_]+')
+_SINGLE_LETTER_RUN_RE = re.compile(r'(?<!\S)\w(?: \w(?!\S))+')
+_REPEATS_RE = re.compile(r'(.)\1+')
+# Повтор не-ASCII буквы в шаблоне; ASCII не трогаем, чтобы не задеть экранирования вроде \b
+_PATTERN_REPEATS_RE = re.compile(r'([^\W\d_a-zA-Z])\1+')
+
+def normalize_text(text: str) -> str:
+    """
+    Приводит текст к канонической форме для поиска ключевых слов.
+
+    NFKC и casefold, латинские двойники -> кириллица, цифры внутри слов -> буквы,
+    любые разделители -> один пробел, одиночные буквы через разделитель
+    склеиваются ("т.г" -> "тг"), повторы схлопываются ("телеграммм" -> "телеграм").
+    """
+    if not unicodedata.is_normalized("NFKC", text):
+        text = unicodedata.normalize("NFKC", text)
+    text = text.casefold().translate(HOMOGLYPHS)
+    text = _LEET_DIGIT_RE.sub(lambda match: LEET_DIGITS[match.group()], text)
+    text = _SEPARATORS_RE.sub(" ", text).strip()
+    text = _SINGLE_LETTER_RUN_RE.sub(lambda match: match.group().replace(" ", ""), text)
+    return _REPEATS_RE.sub(r"\1", text)
+
+def normalize_pattern(pattern: str) -> str:
+    """
+    Приводит литералы регулярного выражения из файла правил к форме normalize_text.
+
+    Шаблон ищется по нормализованному тексту, где повторы уже схлопнуты
+    ("миллион" -> "милион"), поэтому так же схлопываются повторы букв и ё -> е.
+    """
+    return _PATTERN_REPEATS_RE.sub(r"\1", pattern.replace("ё", "е").replace("Ё", "Е"))
+
+class PreparedMessage:
+    """Сообщение и его производные формы; нормализация выполняется один раз и только если понадобилась."""
+
+    __slots__ = ("raw", "bare", "_normalized")
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.bare = raw.replace("\ufe0f", "")  # без вариативного селектора, для сравнения эмодзи
+        self._normalized = None
+
+    @property
+    def normalized(self) -> str:
+        if self._normalized is None:
+            self._normalized = normalize_text(self.raw)
+        return self._normalized
+
+class Rule(NamedTuple):
+    name: str
+    source: str     # какую форму сообщения проверяет правило: raw, bare или normalized
+    find: Callable  # find(text) -> итератор (start, end, фрагмент)
+
+class RuleHit(NamedTuple):
+    rule: str
+    source: str
+    spans: tuple    # ((start, end, фрагмент), ...) в тексте формы source
+
+class Verdict(NamedTuple):
+    """Результат проверки сообщения: сработавшие правила и найденные фрагменты."""
+    hits: tuple
+
+    @property
+    def suspicious(self) -> bool:
+        return bool(self.hits)
+
+    @property
+    def rules(self) -> tuple:
+        return tuple(hit.rule for hit in self.hits)
+
+    def describe(self) -> str:
+        """Краткое описание для менеджера: правило («фрагмент», ...)."""
+        return ", ".join(
+            f"{hit.rule} ({', '.join(f'«{fragment}»' for fragment in dict.fromkeys(span[2] for span in hit.spans))})"
+            for hit in self.hits
+        )
+
+# Сколько фрагментов сохранять на одно правило
+MAX_SPANS = 5
+
+def _regex_finder(regex: re.Pattern) -> Callable:
+    return lambda text: ((match.start(), match.end(), match.group()) for match in regex.finditer(text))
+
+def _any_of(strings) -> str:
+    """Шаблон, находящий любую из строк (длинные варианты первыми); для пустого списка — ничего."""
+    unique = sorted(set(strings) - {""}, key=len, reverse=True)
+    return "|".join(re.escape(string) for string in unique) or r'(?!)'
+
+def _bare(text: str) -> str:
+    return text.replace("\ufe0f", "")
+
+def compile_keywords(keywords, short_keyword_length: int = 3, short_keyword_endings=()) -> re.Pattern:
+    """Объединяет канонические формы ключевых слов в одно регулярное выражение."""
+    canonical = {normalize_text(keyword) for keyword in keywords} - {""}
+    short = [keyword for keyword in canonical if len(keyword) <= short_keyword_length and " " not in keyword]
+    long = [keyword for keyword in canonical if keyword not in short]
+    parts = []
+    if long:
+        # Только с начала слова: "клинка" не содержит "линк", а "с лаком" — "слак".
+        # Пробел необязателен лишь там, где он есть в самом ключевом слове
+        # ("в контакте"); буквы через пробел склеивает normalize_text
+        parts.append(r'(?<![^\W\d_])(?:%s)' % "|".join(
+            " ?".join(re.escape(word) for word in keyword.split(" "))
+            for keyword in sorted(long, key=len, reverse=True)
+        ))
+    if short:
+        # Граница — не буква: "вк2" совпадает, "вкус" нет
+        endings = "(?:%s)?" % _any_of(short_keyword_endings) if short_keyword_endings else ""
+        parts.append(r'(?<![^\W\d_])(?:%s)%s(?![^\W\d_])' % (_any_of(short), endings))
+    return re.compile("|".join(parts) or r'(?!)')
+
+class ModerationEngine:
+    """
+    Скомпилированный набор правил модерации (неизменяемый после создания).
+
+    Сообщение считается подозрительным, если срабатывает хотя бы одно правило.
+    Дешёвые правила проверяются первыми.
+    """
+
+    def __init__(
+        self,
+        keywords,
+        forbidden_emojis,
+        contact_emojis,
+        suspicious_symbols,
+        russian_numbers_pattern: str,
+        max_digits: int = 5,
+        max_digit_run: int = 3,
+        short_keyword_length: int = 3,
+        short_keyword_endings=(),
+        version: int = 0,
+    ):
+        self.version = version
+        russian_numbers = re.compile(normalize_pattern(russian_numbers_pattern), re.IGNORECASE)
+        english_letters = re.compile(r'[a-zA-Z]')
+        long_digit_sequence = re.compile(r'\d{%d,}' % (max_digit_run + 1))
+        symbols = re.compile(_any_of(suspicious_symbols))
+        attachments = re.compile(r'http[s]?://|www\.', re.IGNORECASE)
+        emojis = re.compile(_any_of(_bare(emoji) for emoji in forbidden_emojis))
+        contacts = re.compile(_any_of(_bare(emoji) for emoji in contact_emojis))
+        keyword_regex = compile_keywords(keywords, short_keyword_length, short_keyword_endings)
+
+        def find_too_many_digits(text):
+            digits = [(position, position + 1, char) for position, char in enumerate(text) if char.isdigit()]
+            return iter(digits if len(digits) > max_digits else ())
+
+        self.rules = (
+            Rule("english_letters", "raw", _regex_finder(english_letters)),
+            Rule("suspicious_symbols", "raw", _regex_finder(symbols)),
+            Rule("long_digit_sequence", "raw", _regex_finder(long_digit_sequence)),
+            Rule("too_many_digits", "raw", find_too_many_digits),
+            Rule("forbidden_emojis", "bare", _regex_finder(emojis)),
+            Rule("contact_emojis", "bare", _regex_finder(contacts)),
+            Rule("attachments", "raw", _regex_finder(attachments)),
+            Rule("suspicious_keywords", "normalized", _regex_finder(keyword_regex)),
+            # По нормализованному тексту: ловит "д в а", "тр1", "миллион", "сто" латиницей
+            Rule("russian_numbers", "normalized", _regex_finder(russian_numbers)),
+        )
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_FILE) -> "ModerationEngine":
+        """Читает и компилирует файл правил. Ошибки формата поднимаются как ValueError."""
+        with open(path, encoding="utf-8") as file:
+            rules = json.load(file)
+        try:
+            return cls(
+                keywords=rules["keywords"],
+                forbidden_emojis=rules["forbidden_emojis"],
+                contact_emojis=rules["contact_emojis"],
+                suspicious_symbols=rules["suspicious_symbols"],
+                russian_numbers_pattern=rules["russian_numbers_pattern"],
+                max_digits=int(rules["max_digits"]),
+                max_digit_run=int(rules["max_digit_run"]),
+                short_keyword_length=int(rules.get("short_keyword_length", 3)),
+                short_keyword_endings=rules.get("short_keyword_endings", ()),
+                version=int(rules["version"]),
+            )
+        except (KeyError, TypeError, re.error) as e:
+            raise ValueError(f"Некорректный файл правил модерации {path}: {e!r}") from e
+
+    def is_suspicious(self, message: str) -> bool:
+        """Быстрая проверка: останавливается на первом сработавшем правиле."""
+        prepared = PreparedMessage(message)
+        return any(next(rule.find(getattr(prepared, rule.source)), None) is not None for rule in self.rules)
+
+    def classify(self, message: str, record_metrics: bool = False) -> Verdict:
+        """
+        Проверяет сообщение всеми правилами (без остановки на первом).
+
+        :param record_metrics: Учитывать срабатывания и время правил в metrics
+            (для живого трафика; офлайн-пересчёт истории их не трогает).
+        """
+        prepared = PreparedMessage(message)
+        hits = []
+        for rule in self.rules:
+            started = time.perf_counter()
+            spans = tuple(islice(rule.find(getattr(prepared, rule.source)), MAX_SPANS))
+            if record_metrics:
+                metrics.observe(f"moderation.rule.{rule.name}", time.perf_counter() - started)
+                if spans:
+                    metrics.increment(f"moderation.rule.{rule.name}.hits")
+            if spans:
+                hits.append(RuleHit(rule.name, rule.source, spans))
+        verdict = Verdict(tuple(hits))
+        if record_metrics:
+            metrics.increment("moderation.messages")
+            if verdict.suspicious:
+                metrics.increment("moderation.suspicious")
+        return verdict
+
+    def classify_many(self, messages) -> list:
+        """
+        classify для списка сообщений за один вызов.
+
+        Одинаковые тексты (частые «спасибо», «ок») проверяются один раз.
+        :return: Список Verdict в порядке messages.
+        """
+        results = {}
+        verdicts = []
+        for message in messages:
+            verdict = results.get(message)
+            if verdict is None:
+                verdict = results[message] = self.classify(message)
+            verdicts.append(verdict)
+        return verdicts
+
+class RulesReloader:
+    """
+    Держит текущий ModerationEngine и подменяет его при изменении файла правил.
+
+    Новый движок полностью компилируется до подмены, а сама подмена — одно
+    присваивание ссылки: обработчики, уже взявшие старый движок, доработают с
+    ним, следующие получат новый. При ошибке в файле остаётся прежний движок,
+    а сломанная версия файла не перечитывается, пока файл снова не изменится.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULES_FILE):
+        self.path = path
+        self.engine = ModerationEngine.from_file(path)
+        self._mtime = self._current_mtime()
+        self._failed_mtime = None  # версия файла, которую не удалось загрузить; не перечитываем до следующего изменения
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        mtime = self._current_mtime()
+        return mtime != self._mtime and mtime != self._failed_mtime
+
+    def reload(self) -> ModerationEngine:
+        """Перечитывает файл правил и подменяет движок. Поднимает OSError/ValueError, если файл некорректен."""
+        mtime = self._current_mtime()
+        try:
+            engine = ModerationEngine.from_file(self.path)
+        except (OSError, ValueError):
+            self._failed_mtime = mtime
+            raise
+        self.engine, self._mtime, self._failed_mtime = engine, mtime, None
+        print(f"[DEBUG] Правила модерации версии {engine.version} загружены из {self.path}")
+        return engine
+
+def configure_rules(path: str) -> None:
+    """Загружает правила из другого файла (путь из конфигурации)."""
+    global rules
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    if path != rules.path:
+        rules = RulesReloader(path)
+
+def get_engine() -> ModerationEngine:
+    """Текущий скомпилированный движок модерации."""
+    return rules.engine
+
+rules = RulesReloader()
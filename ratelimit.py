@@ -0,0 +1,179 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+from cache import TTLCache
+from metrics import metrics
+
+# Приоритеты исходящих запросов (rate_limit_args): меньше — раньше
+PRIORITY_MODERATION = 0
+PRIORITY_REPLY = 1
+PRIORITY_BROADCAST = 2
+PRIORITY_NAMES = {PRIORITY_MODERATION: "moderation", PRIORITY_REPLY: "reply", PRIORITY_BROADCAST: "broadcast"}
+
+class TokenBucket:
+    """
+    Ведро токенов: не более rate событий в секунду, всплеск до capacity.
+
+    Токен можно взять "в долг" — тогда reserve() возвращает, сколько ждать.
+    Бот работает в одном цикле asyncio, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Забирает один токен и возвращает задержку в секундах до момента, когда он доступен."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self) -> None:
+        """Возвращает токен, взятый reserve(), если он не понадобился."""
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+class OutboundScheduler(BaseRateLimiter):
+    """
+    Единая очередь исходящих запросов бота к Telegram (ExtBot.rate_limiter).
+
+    Запрос с chat_id сначала ждёт своё ведро чата (~1 сообщение в секунду со
+    всплеском до chat_burst: обычный ответ и следующее за ним меню уходят
+    сразу, пока обновление держит блокировку чата и транзакцию), затем встаёт в общую очередь с приоритетом из rate_limit_args
+    (PRIORITY_MODERATION > PRIORITY_REPLY > PRIORITY_BROADCAST, по умолчанию
+    PRIORITY_REPLY). Диспетчер выпускает запросы из очереди не чаще общего
+    лимита (~30 в секунду), самые важные первыми.
+
+    RetryAfter приостанавливает всю очередь на указанное Telegram время, после
+    чего запрос повторяется; сетевые ошибки до отправки повторяются с
+    нарастающей паузой. Запросы без chat_id (answerCallbackQuery, getMe)
+    выполняются сразу.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float = 3, max_retries: int = 3):
+        self.chat_rate = chat_rate
+        self.chat_burst = max(1, chat_burst)
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        # Через минуту простоя ведро всё равно полное, так что его можно забыть
+        self._chats = TTLCache(maxsize=10000, ttl=60)
+        self._queue = []  # куча (приоритет, порядковый номер, future)
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def initialize(self) -> None:
+        if self._dispatcher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        metrics.register_gauge("telegram.queue_depth", lambda: len(self._queue))
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for *_, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire(self, priority: int) -> None:
+        """Ждёт, пока диспетчер выпустит запрос с этим приоритетом."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._wakeup.set()
+        started = time.monotonic()
+        await future
+        metrics.observe(f"telegram.queue_wait.{PRIORITY_NAMES.get(priority, priority)}", time.monotonic() - started)
+
+    async def _dispatch(self) -> None:
+        while True:
+            # Отменённые запросы (обработчик прервали) не должны тратить общий лимит
+            while self._queue and self._queue[0][-1].done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            delay = self._global.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            # За время ожидания могли прийти более важные запросы — выпускаем первый в куче
+            while self._queue:
+                *_, future = heapq.heappop(self._queue)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                # Все ожидавшие запросы отменились, пока мы ждали токен
+                self._global.refund()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+        if self._dispatcher is None:
+            await self.initialize()
+        priority = PRIORITY_REPLY if rate_limit_args is None else rate_limit_args
+        metrics.increment(f"telegram.requests.{PRIORITY_NAMES.get(priority, priority)}")
+
+        for attempt in range(self.max_retries + 1):
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            await self._acquire(priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                metrics.increment("telegram.retry_after")
+                print(f"[DEBUG] Telegram просит подождать {retry_after} с ({endpoint}, чат {chat_id}), очередь приостановлена")
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            except (BadRequest, TimedOut):
+                # Ошибка запроса или таймаут (сообщение могло уже уйти) — не повторяем
+                raise
+            except NetworkError as e:
+                if attempt == self.max_retries:
+                    raise
+                metrics.increment("telegram.network_retry")
+                print(f"[DEBUG] Сетевая ошибка ({endpoint}, чат {chat_id}): {e}, повтор через {2 ** attempt} с")
+                await asyncio.sleep(2 ** attempt)
+
+async def fan_out(chat_ids, send) -> list:
+    """
+    Параллельно выполняет send(chat_id) для каждого чата (темп задаёт OutboundScheduler).
+
+    :return: Результаты в порядке chat_ids; на месте неудачных отправок — исключение.
+    """
+    return await asyncio.gather(*(send(chat_id) for chat_id in chat_ids), return_exceptions=True)
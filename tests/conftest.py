@@ -0,0 +1,8 @@
+import os
+import sys
+
+# config.py читает обязательные переменные при импорте; соединение с БД в тестах не открывается
+os.environ.setdefault("TELEGRAM_TOKEN", "test-token")
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
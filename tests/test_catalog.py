@@ -0,0 +1,16 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from catalog import ServiceCatalog
+
+def test_catalog_is_invalidated_again_only_at_outer_commit():
+    catalog = ServiceCatalog()
+    session = Session(create_engine("sqlite://"))
+    session.execute(text("SELECT 1"))
+    catalog.invalidate_on_commit(session)
+    version = catalog.version
+    with session.begin_nested():
+        session.execute(text("SELECT 1"))
+    assert catalog.version == version
+    session.commit()
+    assert catalog.version == version + 1
@@ -0,0 +1,41 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from database import on_transaction_end
+
+def make_session():
+    return Session(create_engine("sqlite://"))
+
+def track(session):
+    calls = []
+    on_transaction_end(session, on_commit=lambda: calls.append("commit"), on_rollback=lambda: calls.append("rollback"))
+    return calls
+
+def test_savepoint_release_does_not_count_as_commit():
+    session = make_session()
+    calls = track(session)
+    session.execute(text("SELECT 1"))
+    with session.begin_nested():
+        session.execute(text("SELECT 1"))
+    assert calls == []
+    session.rollback()
+    assert calls == ["rollback"]
+
+def test_savepoint_rollback_does_not_count_as_rollback():
+    session = make_session()
+    calls = track(session)
+    session.execute(text("SELECT 1"))
+    savepoint = session.begin_nested()
+    savepoint.rollback()
+    assert calls == []
+    session.commit()
+    assert calls == ["commit"]
+
+def test_fires_once():
+    session = make_session()
+    calls = track(session)
+    session.execute(text("SELECT 1"))
+    session.commit()
+    session.execute(text("SELECT 1"))
+    session.rollback()
+    assert calls == ["commit"]
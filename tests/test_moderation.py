@@ -0,0 +1,34 @@
+import pytest
+
+from moderation import ModerationEngine, normalize_text
+
+@pytest.fixture(scope="module")
+def engine():
+    return ModerationEngine.from_file()
+
+@pytest.mark.parametrize("message", [
+    "покрою с лаком",
+    "Макет с напечатанным текстом",
+    "Подпись до тупого угла",
+    "Отдам клинка эскиз завтра",
+])
+def test_neighbouring_words_do_not_form_keywords(engine, message):
+    assert "suspicious_keywords" not in engine.classify(message).rules
+
+@pytest.mark.parametrize("message", [
+    "Напишите мне в телеграм",
+    "т е л е г р а м",
+    "т3л3грам",
+    "в1бер",
+    "пиши в лс",
+    "в контакте",
+])
+def test_keyword_evasions_are_flagged(engine, message):
+    assert "suspicious_keywords" in engine.classify(message).rules
+
+@pytest.mark.parametrize("message", ["миллион", "Миллион", "2 миллиона", "тр1", "д в а"])
+def test_russian_numbers_survive_normalization(engine, message):
+    assert "russian_numbers" in engine.classify(message).rules
+
+def test_digit_one_becomes_cyrillic():
+    assert normalize_text("тр1") == "три"
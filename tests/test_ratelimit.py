@@ -0,0 +1,29 @@
+import asyncio
+
+from ratelimit import OutboundScheduler, PRIORITY_REPLY, TokenBucket
+
+def test_chat_burst_is_not_throttled():
+    bucket = TokenBucket(1, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() > 0
+
+def test_cancelled_requests_do_not_spend_global_tokens():
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=1, chat_rate=100, chat_burst=100)
+        await scheduler.initialize()
+        try:
+            # Диспетчер просыпается, когда в очереди только отменённые запросы
+            loop = asyncio.get_running_loop()
+            for _ in range(5):
+                future = loop.create_future()
+                future.cancel()
+                scheduler._queue.append((PRIORITY_REPLY, next(scheduler._sequence), future))
+            scheduler._wakeup.set()
+            await asyncio.sleep(0.05)
+            # Единственный токен (global_rate=1) должен остаться живому запросу
+            await asyncio.wait_for(scheduler._acquire(PRIORITY_REPLY), timeout=0.5)
+            return scheduler.queue_depth
+        finally:
+            await scheduler.shutdown()
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+import bot
+
+def make_info(telegram_id):
+    return bot.RoleInfo(bot.ROLE_CLIENT, 1, telegram_id, "client")
+
+def test_role_is_not_cached_when_update_rolls_back_after_savepoint():
+    session = Session(create_engine("sqlite://"))
+    session.execute(text("SELECT 1"))
+    bot.cache_user_role_on_commit(session, make_info(101))
+    with session.begin_nested():
+        session.execute(text("SELECT 1"))
+    assert bot.role_cache.get(101) is None
+    session.rollback()
+    assert bot.role_cache.get(101) is None
+
+def test_role_is_cached_after_commit():
+    session = Session(create_engine("sqlite://"))
+    session.execute(text("SELECT 1"))
+    bot.cache_user_role_on_commit(session, make_info(102))
+    with session.begin_nested():
+        session.execute(text("SELECT 1"))
+    session.commit()
+    assert bot.role_cache.get(102) == make_info(102)
+
+def test_manager_ids_are_cleared_again_at_outer_commit():
+    session = Session(create_engine("sqlite://"))
+    session.execute(text("SELECT 1"))
+    bot.invalidate_manager_ids_on_commit(session)
+    with session.begin_nested():
+        session.execute(text("SELECT 1"))
+    # Параллельный обработчик успел загрузить старый список до commit
+    bot.manager_ids_cache.set("managers", [1])
+    session.commit()
+    assert bot.manager_ids_cache.get("managers") is None
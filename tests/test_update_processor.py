@@ -0,0 +1,55 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from update_processor import PerChatUpdateProcessor
+
+def make_update(chat_id, seq):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), seq=seq)
+
+async def run(coroutines_by_update, limit=4):
+    async with PerChatUpdateProcessor(limit) as processor:
+        results = await asyncio.wait_for(asyncio.gather(
+            *(processor.process_update(update, coroutine) for update, coroutine in coroutines_by_update),
+            return_exceptions=True,
+        ), timeout=5)
+        return results, processor.queued_chats
+
+def test_updates_keep_order_within_chat():
+    rng = random.Random(1)
+    seen = {}
+
+    async def handle(update):
+        # Поздние обновления чата "быстрее" ранних: без блокировки чата они бы обогнали их
+        await asyncio.sleep(0.01 * (5 - update.seq) * rng.uniform(0.5, 1.5))
+        seen.setdefault(update.effective_chat.id, []).append(update.seq)
+
+    updates = [make_update(chat_id, seq) for seq in range(5) for chat_id in range(4)]
+    _, queued = asyncio.run(run([(update, handle(update)) for update in updates]))
+    assert seen == {chat_id: [0, 1, 2, 3, 4] for chat_id in range(4)}
+    assert queued == 0
+
+def test_failing_update_does_not_block_chat():
+    seen = []
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("ошибка обработчика")
+
+    async def record(seq):
+        seen.append(seq)
+
+    results, queued = asyncio.run(run([
+        (make_update(1, 0), fail()),
+        (make_update(1, 1), record(1)),
+        (make_update(1, 2), record(2)),
+    ]))
+    assert isinstance(results[0], RuntimeError)
+    assert seen == [1, 2]
+    assert queued == 0
+
+def test_rejects_non_positive_limit():
+    with pytest.raises(ValueError):
+        PerChatUpdateProcessor(0)
@@ -0,0 +1,67 @@
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+# Лимит родительского семафора: он захватывается раньше блокировки чата,
+# поэтому не должен становиться узким местом (см. PerChatUpdateProcessor)
+_UNBOUNDED = 2 ** 31 - 1
+
+def chat_key(update: object):
+    """Чат, в пределах которого важен порядок обновлений (None — порядок не важен)."""
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений разных чатов со строгим порядком внутри чата.
+
+    Многошаговые сценарии (добавление услуги в заказ, изменение заказа,
+    правка сообщения модерации) хранят состояние по чату и рассчитывают на
+    то, что следующее сообщение чата обрабатывается после предыдущего.
+
+    Сначала берётся блокировка чата (asyncio.Lock будит ожидающих по
+    очереди), затем общий лимит concurrency_limit. В обратном порядке
+    обновления одного чата занимали бы общие слоты, ожидая друг друга, и
+    могли бы обогнать друг друга в очереди семафора. Поэтому семафор
+    родительского класса сделан недостижимым, а лимит держит свой.
+    """
+
+    def __init__(self, concurrency_limit: int):
+        if concurrency_limit < 1:
+            raise ValueError("concurrency_limit должен быть положительным")
+        super().__init__(_UNBOUNDED)
+        self.concurrency_limit = concurrency_limit
+        self._limit = None
+        self._chats = {}  # chat_id -> [Lock, число обновлений чата в работе и в очереди]
+
+    async def initialize(self) -> None:
+        # Семафор создаём в работающем цикле событий
+        self._limit = asyncio.Semaphore(self.concurrency_limit)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    @property
+    def queued_chats(self) -> int:
+        """Число чатов, у которых есть обновления в работе или в очереди."""
+        return len(self._chats)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if self._limit is None:
+            await self.initialize()
+        chat_id = chat_key(update)
+        if chat_id is None:
+            async with self._limit:
+                await coroutine
+            return
+
+        slot = self._chats.get(chat_id)
+        if slot is None:
+            slot = self._chats[chat_id] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        try:
+            async with slot[0], self._limit:
+                await coroutine
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._chats[chat_id]